@@ -0,0 +1,127 @@
+"""
+事件循环的基准测试。
+
+分别使用 asyncio 默认事件循环和 uvloop 运行：
+    - 抓取吞吐量：使用 aio_scrapy 的 Crawler 请求本地 HTTP 服务，统计每秒完成的请求数；
+    - API 延迟：抓取的同时请求 uvicorn 运行的 FastAPI 接口，统计延迟的 p50 / p95 。
+没有安装 uvloop 时只运行 asyncio 。
+
+usage:
+    python benchmarks/event_loop.py -n 2000 -c 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import typing
+
+import httpx
+from fastapi import FastAPI
+from uvicorn import Config, Server
+
+from crawlerstack_proxypool.aio_scrapy.crawler import Crawler
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
+from crawlerstack_proxypool.aio_scrapy.spider import Spider
+from crawlerstack_proxypool.utils import setup_event_loop
+
+
+class BenchSpider(Spider):
+    """只下载，不解析"""
+
+    async def parse(self, response: httpx.Response) -> typing.Any:
+        return None
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """keep-alive 的本地 HTTP 服务"""
+    body = b'{"origin": "127.0.0.1"}'
+    try:
+        while True:
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_api() -> tuple[Server, str]:
+    """启动 uvicorn"""
+    app = FastAPI()
+
+    @app.get('/ping')
+    async def ping():
+        return {'ping': 'pong'}
+
+    server = Server(Config(app, host='127.0.0.1', port=0, log_level='error', lifespan='off'))
+    # 由外部控制退出
+    server.install_signal_handlers = lambda: None
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    host, port = server.servers[0].sockets[0].getsockname()[:2]
+    return server, f'http://{host}:{port}/ping'
+
+
+async def request_api(url: str, done: asyncio.Event) -> list[float]:
+    """抓取期间持续请求 API ，返回每次请求的延迟，单位 ms"""
+    latencies = []
+    async with httpx.AsyncClient() as client:
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get(url)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def bench(number: int, concurrency: int) -> dict[str, float]:
+    """运行一次基准测试"""
+    http_server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    host, port = http_server.sockets[0].getsockname()[:2]
+    api_server, api_url = await start_api()
+
+    done = asyncio.Event()
+    api_task = asyncio.create_task(request_api(api_url, done))
+    crawler = Crawler(BenchSpider, Settings(concurrent_requests=concurrency))
+    start = time.perf_counter()
+    stats = await crawler.crawl(
+        name='bench',
+        start_urls=[f'http://{host}:{port}/{i}' for i in range(number)],
+    )
+    elapsed = time.perf_counter() - start
+    done.set()
+    latencies = await api_task
+
+    api_server.should_exit = True
+    http_server.close()
+    await http_server.wait_closed()
+    await asyncio.sleep(0.2)
+    return {
+        'requests/s': stats.get_value('downloader/response_count', 0) / elapsed,
+        'api p50 ms': statistics.median(latencies) if latencies else float('nan'),
+        'api p95 ms': statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else float('nan'),
+    }
+
+
+def main():
+    """main"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=2000, help='Request number')
+    parser.add_argument('-c', '--concurrency', type=int, default=100, help='Concurrent requests')
+    args = parser.parse_args()
+
+    results = {}
+    for loop in ('asyncio', 'uvloop'):
+        if setup_event_loop(loop) != loop:
+            print(f'{loop} is not installed, skipped.')
+            continue
+        results[loop] = asyncio.run(bench(args.number, args.concurrency))
+    setup_event_loop('asyncio')
+
+    for loop, result in results.items():
+        print(f'{loop:<8} ' + '  '.join(f'{k}: {v:8.2f}' for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+SSLContext 缓存的微基准测试。
+
+对比每个 client 新建 SSLContext 和使用共享 SSLContext 时，创建 httpx.AsyncClient 消耗的 CPU 时间。
+
+usage:
+    python benchmarks/ssl_context.py -n 500
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from crawlerstack_proxypool.aio_scrapy.tls import get_ssl_context
+
+
+async def create_clients(number: int, shared: bool) -> float:
+    """
+    创建并关闭 number 个 client ，返回每个 client 消耗的 CPU 时间，单位 ms
+    :param number:
+    :param shared:
+    :return:
+    """
+    start = time.process_time()
+    for _ in range(number):
+        verify = get_ssl_context() if shared else True
+        client = httpx.AsyncClient(verify=verify, proxies='http://127.0.0.1:1080')
+        await client.aclose()
+    return (time.process_time() - start) * 1000 / number
+
+
+def main():
+    """main"""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=200, help='Client number')
+    args = parser.parse_args()
+
+    new_context = asyncio.run(create_clients(args.number, shared=False))
+    shared_context = asyncio.run(create_clients(args.number, shared=True))
+    print(f'New SSLContext per client:    {new_context:.3f} ms CPU / client')
+    print(f'Shared SSLContext per client: {shared_context:.3f} ms CPU / client')
+    print(f'Saved:                        {new_context - shared_context:.3f} ms CPU / client')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,13 @@
 使其更加独立。
 """
 import dataclasses
+from concurrent.futures import Executor
 from typing import Type
 
 from crawlerstack_proxypool.aio_scrapy.engine import ExecuteEngine
 from crawlerstack_proxypool.aio_scrapy.settings import Settings
 from crawlerstack_proxypool.aio_scrapy.spider import Spider
+from crawlerstack_proxypool.aio_scrapy.stats import StatsCollector
 
 
 @dataclasses.dataclass
@@ -17,7 +19,10 @@ class Crawler:
     Crawler
     """
     spider_kls: Type[Spider]
-    settings: Settings = Settings()
+    settings: Settings = dataclasses.field(default_factory=Settings)
+    stats: StatsCollector = dataclasses.field(default_factory=StatsCollector)
+    # 多个 crawler 共用的解析执行器，由调用方负责关闭
+    executor: Executor | None = None
     _engine: ExecuteEngine = None
 
     def __post_init__(self):
@@ -27,12 +32,23 @@ class Crawler:
     def engine(self):
         return self._engine
 
-    async def crawl(self, **kwargs):
+    async def crawl(self, **kwargs) -> StatsCollector:
         """
         crawl
+
+        settings.keep_alive 为 True 时，可以多次调用 crawl ，每次使用新的 spider ，
+        复用下载器的连接等资源，不再使用时需要调用 close 。
         :param kwargs:
-        :return:
+        :return: 本次抓取的统计，下一次 crawl 开始时会被清空
         """
         obj = self.spider_kls(**kwargs)  # noqa
         await self.engine.open_spider(obj)
         await self.engine.start()
+        return self.stats
+
+    async def close(self):
+        """
+        释放 crawler 的资源
+        :return:
+        """
+        await self.engine.shutdown()
@@ -0,0 +1,182 @@
+"""
+DNS cache
+
+缓存直连请求的域名解析结果。使用代理时由代理服务器解析目标域名，不经过这里。
+"""
+import asyncio
+import dataclasses
+import functools
+import logging
+import socket
+import time
+
+import httpcore
+from httpcore.backends.auto import AutoBackend
+from httpcore.backends.base import AsyncNetworkBackend, AsyncNetworkStream
+
+from crawlerstack_proxypool.aio_scrapy.req_resp import current_timing
+from crawlerstack_proxypool.aio_scrapy.stats import StatsCollector
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class DNSCache:
+    """
+    DNS 缓存
+
+    getaddrinfo 不返回记录的 TTL ，所以使用固定的缓存时间。
+    解析失败的结果缓存 negative_ttl 秒，避免失效的域名被反复解析。
+    同一个域名同时只会解析一次，其他请求等待解析结果。
+    """
+    ttl: float = 300
+    negative_ttl: float = 30
+    max_size: int = 10000
+    # key: (host, port) ，value: (过期时间, 解析结果或解析异常)
+    _cache: dict[tuple[str, int], tuple[float, list[str] | OSError]] = dataclasses.field(
+        default_factory=dict, init=False
+    )
+    _resolving: dict[tuple[str, int], asyncio.Future] = dataclasses.field(default_factory=dict, init=False)
+
+    def __len__(self):
+        return len(self._cache)
+
+    async def resolve(self, host: str, port: int, stats: StatsCollector | None = None) -> list[str]:
+        """
+        解析域名，返回 IP 地址列表
+        :param host:
+        :param port:
+        :param stats:
+        :return:
+        """
+        stats = stats or StatsCollector()
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            result = cached[1]
+            if isinstance(result, OSError):
+                stats.inc_value('dns/negative_hit_count')
+                raise result
+            stats.inc_value('dns/hit_count')
+            return result
+
+        resolving = self._resolving.get(key)
+        if resolving is not None:
+            stats.inc_value('dns/wait_count')
+            try:
+                return await asyncio.shield(resolving)
+            except asyncio.CancelledError:
+                # 发起解析的请求被取消，而当前请求并没有被取消
+                if resolving.cancelled():
+                    raise OSError(f'Resolve {host} cancelled.') from None
+                raise
+
+        stats.inc_value('dns/miss_count')
+        future = asyncio.get_running_loop().create_future()
+        self._resolving[key] = future
+        start = time.monotonic()
+        try:
+            addresses = await self._getaddrinfo(host, port)
+        except OSError as ex:
+            stats.inc_value('dns/error_count')
+            self._set(key, ex, self.negative_ttl)
+            future.set_exception(ex)
+            # 没有其他请求等待时，避免 "Future exception was never retrieved" 警告
+            future.exception()
+            raise
+        except BaseException:
+            # 解析被取消时，等待中的请求也一起取消，避免一直等待
+            future.cancel()
+            raise
+        else:
+            self._set(key, addresses, self.ttl)
+            future.set_result(addresses)
+            return addresses
+        finally:
+            stats.observe('dns/resolve_time', time.monotonic() - start)
+            del self._resolving[key]
+
+    @staticmethod
+    async def _getaddrinfo(host: str, port: int) -> list[str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = []
+        for *_, sockaddr in infos:
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        return addresses
+
+    def _set(self, key: tuple[str, int], value: list[str] | OSError, ttl: float):
+        if len(self._cache) >= self.max_size:
+            now = time.monotonic()
+            for expired in [k for k, v in self._cache.items() if v[0] <= now]:
+                del self._cache[expired]
+            if len(self._cache) >= self.max_size:
+                # 删除最早加入的一个
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (time.monotonic() + ttl, value)
+
+    def clear(self):
+        """
+        清空缓存
+        :return:
+        """
+        self._cache.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_dns_cache(ttl: float = 300, negative_ttl: float = 30) -> DNSCache:
+    """
+    获取进程内共享的 DNS 缓存，相同配置的下载器使用同一个缓存。
+    :param ttl:
+    :param negative_ttl:
+    :return:
+    """
+    return DNSCache(ttl=ttl, negative_ttl=negative_ttl)
+
+
+class CachingNetworkBackend(AsyncNetworkBackend):
+    """
+    使用 DNSCache 解析域名的 httpcore 网络后端
+
+    依次尝试解析到的 IP 地址，直到连接成功。TLS 握手时仍然使用原始域名校验证书。
+    解析耗时记录在当前请求的 Timing.dns 中。
+    """
+
+    def __init__(self, cache: DNSCache, stats: StatsCollector | None = None):
+        self.cache = cache
+        self.stats = stats
+        self._backend = AutoBackend()
+
+    async def connect_tcp(
+            self, host: str, port: int, timeout: float = None, local_address: str = None
+    ) -> AsyncNetworkStream:
+        start = time.monotonic()
+        try:
+            addresses = await asyncio.wait_for(self.cache.resolve(host, port, self.stats), timeout)
+        except asyncio.TimeoutError as ex:
+            raise httpcore.ConnectTimeout(f'Resolve {host} timeout.') from ex
+        except OSError as ex:
+            # 转换为 httpcore 的异常，httpx 会再转换为 httpx.ConnectError
+            raise httpcore.ConnectError(f'Resolve {host} error. {ex}') from ex
+        finally:
+            timing = current_timing.get()
+            if timing is not None:
+                timing.dns = time.monotonic() - start
+        error = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address
+                )
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.debug('Connect %s(%s):%d error. %r', host, address, port, ex)
+                error = ex
+        if error is None:
+            raise httpcore.ConnectError(f'No address found for {host}')
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: float = None) -> AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout=timeout)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
@@ -2,16 +2,27 @@
 下载器
 """
 import asyncio
+import contextlib
 import dataclasses
 import logging
+import time
+from collections import Counter, OrderedDict, deque
+from collections.abc import AsyncIterator
 
 import httpx
 from httpx import Response
 
+from crawlerstack_proxypool.aio_scrapy.dns import (CachingNetworkBackend,
+                                                   get_dns_cache)
+from crawlerstack_proxypool.aio_scrapy.exceptions import (
+    DownloadTimeoutError, ResponseTooLargeError)
 from crawlerstack_proxypool.aio_scrapy.middlewares import \
     DownloadMiddlewareManager
-from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.req_resp import (RequestProxy, Timing,
+                                                        current_timing)
 from crawlerstack_proxypool.aio_scrapy.settings import Settings
+from crawlerstack_proxypool.aio_scrapy.stats import StatsCollector
+from crawlerstack_proxypool.aio_scrapy.tls import get_ssl_context
 
 logger = logging.getLogger(__name__)
 
@@ -37,37 +48,309 @@ class BaseDownloadHandler:
         raise NotImplementedError()
 
 
+@dataclasses.dataclass
+class PooledClient:
+    """
+    连接池中的 client
+    """
+    client: httpx.AsyncClient
+    last_used: float = dataclasses.field(default_factory=time.monotonic)
+    in_use: int = 0
+
+
+@dataclasses.dataclass
 class DownloadHandler(BaseDownloadHandler):
     """
     下载处理类，封装下载库
+
+    按代理缓存 httpx.AsyncClient ，使同一个代理（或直连）的请求可以复用 keep-alive 连接。
+    client 数量达到 max_clients 时，新的代理需要等待：有空闲的 client 时按 LRU 顺序关闭最久未使用的，
+    否则等待正在使用的 client 空闲后将其关闭。空闲超过 idle_timeout 的 client 也会被关闭。
+    总连接数不超过 max_clients * max_connections_per_client 。
+    所有 client 共享同一个 SSLContext 。
+    直连的 client 使用进程内共享的 DNS 缓存，dns_cache_ttl 为 0 时不缓存。
     """
+    verify: bool = True
+    max_clients: int = 256
+    max_connections_per_client: int = 10
+    idle_timeout: float = 60.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 10.0
+    timeout: float | None = 20.0
+    max_body_size: int = 10 * 1024 * 1024
+    dns_cache_ttl: float = 300
+    dns_cache_negative_ttl: float = 30
+    stats: StatsCollector = dataclasses.field(default_factory=StatsCollector)
+    _clients: dict[str, PooledClient] = dataclasses.field(default_factory=dict, init=False)
+    # 空闲的 client ，按变为空闲的先后排列，最久未使用的在前
+    _idle: OrderedDict[str, PooledClient] = dataclasses.field(default_factory=OrderedDict, init=False)
+    # client 数量的上限，每个 client 占用一个
+    _client_slots: asyncio.Semaphore = dataclasses.field(init=False)
+    # 等待创建 client 的请求数
+    _waiting: int = dataclasses.field(default=0, init=False)
+
+    def __post_init__(self):
+        self._client_slots = asyncio.Semaphore(self.max_clients)
+
+    @classmethod
+    def from_settings(cls, settings: Settings, stats: StatsCollector | None = None):
+        """
+        from settings
+        :param settings:
+        :param stats:
+        :return:
+        """
+        return cls(
+            stats=stats or StatsCollector(),
+            dns_cache_ttl=settings.dns_cache_ttl,
+            dns_cache_negative_ttl=settings.dns_cache_negative_ttl,
+            verify=settings.download_verify,
+            max_clients=settings.download_max_clients,
+            max_connections_per_client=settings.download_max_connections_per_client,
+            idle_timeout=settings.download_client_idle_timeout,
+            connect_timeout=settings.download_connect_timeout,
+            read_timeout=settings.download_read_timeout,
+            timeout=settings.download_timeout,
+            max_body_size=settings.download_max_size,
+        )
+
+    def __len__(self):
+        return len(self._clients)
+
+    def _create_client(self, proxy) -> httpx.AsyncClient:
+        """
+        创建 client
+        :param proxy:
+        :return:
+        """
+        limits = httpx.Limits(
+            max_connections=self.max_connections_per_client,
+            max_keepalive_connections=self.max_connections_per_client,
+            keepalive_expiry=self.idle_timeout,
+        )
+        if not proxy and self.dns_cache_ttl:
+            # 使用代理时由代理解析目标域名，所以只有直连时才使用 DNS 缓存
+            transport = httpx.AsyncHTTPTransport(verify=get_ssl_context(self.verify), limits=limits)
+            # httpx 没有提供设置 network_backend 的参数
+            transport._pool._network_backend = CachingNetworkBackend(  # pylint: disable=protected-access
+                get_dns_cache(self.dns_cache_ttl, self.dns_cache_negative_ttl),
+                self.stats,
+            )
+            return httpx.AsyncClient(transport=transport)
+        return httpx.AsyncClient(
+            proxies=proxy,
+            verify=get_ssl_context(self.verify),
+            limits=limits,
+        )
+
+    async def _close_client(self, key: str):
+        """
+        关闭 client 并释放其占用的数量
+        :param key:
+        :return:
+        """
+        pooled = self._clients.pop(key)
+        self._idle.pop(key, None)
+        self._client_slots.release()
+        logger.debug('Close idle download client: "%s"', key)
+        await pooled.client.aclose()
+
+    async def _evict(self):
+        """
+        关闭空闲超过 idle_timeout 的 client 。
+        空闲队列按变为空闲的先后排列，只需要检查队列头部。
+        :return:
+        """
+        now = time.monotonic()
+        while self._idle:
+            key, pooled = next(iter(self._idle.items()))
+            if now - pooled.last_used <= self.idle_timeout:
+                break
+            await self._close_client(key)
+
+    async def _acquire_client_slot(self):
+        """
+        获取创建 client 的数量，已经达到 max_clients 时先关闭最久未使用的空闲 client ，
+        没有空闲的 client 时等待正在使用的 client 空闲。
+        :return:
+        """
+        self._waiting += 1
+        try:
+            while self._client_slots.locked() and self._idle:
+                await self._close_client(next(iter(self._idle)))
+            await self._client_slots.acquire()
+        finally:
+            self._waiting -= 1
+
+    @contextlib.asynccontextmanager
+    async def client(self, proxy) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        获取代理对应的 client ，没有则创建。
+        :param proxy:
+        :return:
+        """
+        key = str(proxy) if proxy else ''
+        await self._evict()
+        pooled = self._clients.get(key)
+        if pooled is None:
+            await self._acquire_client_slot()
+            # 等待时其他请求可能已经创建了该代理的 client
+            pooled = self._clients.get(key)
+            if pooled is None:
+                pooled = PooledClient(self._create_client(proxy))
+                self._clients[key] = pooled
+            else:
+                self._client_slots.release()
+        self._idle.pop(key, None)
+        pooled.in_use += 1
+        try:
+            yield pooled.client
+        finally:
+            pooled.in_use -= 1
+            pooled.last_used = time.monotonic()
+            if not pooled.in_use:
+                if self._waiting:
+                    # 有请求在等待创建 client ，直接关闭，让出数量
+                    await self._close_client(key)
+                else:
+                    self._idle[key] = pooled
+
+    def _timeout(self, request: RequestProxy) -> httpx.Timeout:
+        """
+        构建 httpx 超时配置，请求上没有配置时使用默认值
+        :param request:
+        :return:
+        """
+        connect = self.connect_timeout if request.connect_timeout is None else request.connect_timeout
+        read = self.read_timeout if request.read_timeout is None else request.read_timeout
+        return httpx.Timeout(read, connect=connect)
 
     async def download(self, request: RequestProxy) -> Response:
         """
         下载
+
+        流式读取响应体，超过最大限制时抛出 ResponseTooLargeError 。
+        如果请求配置了 body_consumer ，其返回 True 时停止读取，并设置 response.extensions['aborted'] 。
+        各阶段耗时记录在 response.extensions['timing'] 中。
         :param request:
         :return:
         """
-        async with httpx.AsyncClient(
-                proxies=request.proxy,
-        ) as client:
-            return await client.request(
+        timeout = self.timeout if request.timeout is None else request.timeout
+        timing = Timing()
+        try:
+            response = await asyncio.wait_for(self._download(request, timing), timeout)
+        except asyncio.TimeoutError as ex:
+            raise DownloadTimeoutError(
+                f'Download {request.url} with proxy {request.proxy} timeout after {timeout}s.'
+            ) from ex
+        timing.finish()
+        response.extensions['timing'] = timing
+        return response
+
+    async def _download(self, request: RequestProxy, timing: Timing) -> Response:
+        # 在 wait_for 创建的任务中运行，不会影响其他请求
+        current_timing.set(timing)
+        async with self.client(request.proxy) as client:
+            httpx_request = client.build_request(
                 method=request.method,
                 url=request.url,
                 content=request.content,
                 data=request.data,
                 files=request.files,
-                json=request.files,
+                json=request.json,
                 params=request.params,
                 headers=request.headers,
                 cookies=request.cookies,
+                timeout=self._timeout(request),
+                extensions={'proxy': request.proxy, 'trace': timing.trace}
+            )
+            response = await client.send(
+                httpx_request,
                 auth=request.auth,
                 follow_redirects=request.follow_redirects,
-                extensions={'proxy': request.proxy}
+                stream=True,
             )
+            try:
+                await self._read(request, response)
+            finally:
+                await response.aclose()
+            return response
+
+    async def _read(self, request: RequestProxy, response: Response):
+        """
+        流式读取响应体
+        :param request:
+        :param response:
+        :return:
+        """
+        max_size = self.max_body_size if request.max_body_size is None else request.max_body_size
+        content_length = response.headers.get('content-length', '')
+        if max_size and content_length.isdigit() and int(content_length) > max_size:
+            raise ResponseTooLargeError(
+                f'Response of {request.url} content-length {content_length} is larger than {max_size}.'
+            )
+
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if max_size and size > max_size:
+                raise ResponseTooLargeError(f'Response of {request.url} is larger than {max_size}.')
+            chunks.append(chunk)
+            if request.body_consumer and request.body_consumer(response, chunk):
+                logger.debug('Abort reading response of %s after %d bytes.', request.url, size)
+                response.extensions['aborted'] = True
+                break
+        # 和 httpx.Response.aread 一样，将读取的内容缓存在 _content 中
+        response._content = b''.join(chunks)  # pylint: disable=protected-access
 
     async def close(self):
-        pass
+        """
+        关闭所有 client
+        :return:
+        """
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._idle.clear()
+        self._client_slots = asyncio.Semaphore(self.max_clients)
+        for pooled in clients:
+            await pooled.client.aclose()
+
+
+@dataclasses.dataclass
+class Slots:
+    """
+    按 key 限制并发的下载槽。
+
+    每个 key 一个信号量，在没有请求使用时释放，避免大量代理 IP 导致信号量堆积。
+    """
+    concurrency: int
+    _semaphores: dict[str, asyncio.Semaphore] = dataclasses.field(default_factory=dict, init=False)
+    _users: Counter = dataclasses.field(default_factory=Counter, init=False)
+
+    def __len__(self):
+        return len(self._semaphores)
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, key: str | None) -> AsyncIterator[None]:
+        """
+        获取 key 对应的下载槽，如果没有限制并发或者 key 为空，则直接通过。
+        :param key:
+        :return:
+        """
+        if not self.concurrency or key is None:
+            yield
+            return
+        semaphore = self._semaphores.setdefault(key, asyncio.Semaphore(self.concurrency))
+        self._users[key] += 1
+        try:
+            async with semaphore:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._semaphores[key]
 
 
 @dataclasses.dataclass
@@ -77,13 +360,37 @@ class Downloader:
     """
     settings: Settings
     loop: asyncio.AbstractEventLoop = dataclasses.field(default_factory=asyncio.get_running_loop)
+    stats: StatsCollector = dataclasses.field(default_factory=StatsCollector)
     _queue: asyncio.Queue = dataclasses.field(init=False)
-    handler: DownloadHandler = dataclasses.field(default_factory=DownloadHandler, init=False)
+    handler: DownloadHandler = dataclasses.field(init=False)
     _middleware: DownloadMiddlewareManager = dataclasses.field(init=False)
+    _host_slots: Slots = dataclasses.field(init=False)
+    _proxy_slots: Slots = dataclasses.field(init=False)
+    _latencies: deque[float] = dataclasses.field(default_factory=lambda: deque(maxlen=1000), init=False)
 
     def __post_init__(self):
-        self._queue = asyncio.Queue(5)
+        self._queue = asyncio.Queue(self.settings.downloader_queue_size)
+        self.handler = DownloadHandler.from_settings(self.settings, self.stats)
         self._middleware = DownloadMiddlewareManager.from_settings(self.settings)
+        self._host_slots = Slots(self.settings.concurrent_requests_per_host)
+        self._proxy_slots = Slots(self.settings.concurrent_requests_per_proxy)
+
+    def open_spider(self, spider):
+        """
+        通知下载中间件 spider 已打开
+        :param spider:
+        :return:
+        """
+        self._middleware.open_spider(spider)
+
+    def request_delay(self, request, spider) -> float:
+        """
+        请求需要推迟的秒数，由下载中间件决定，例如限速
+        :param request:
+        :param spider:
+        :return:
+        """
+        return self._middleware.request_delay(request, spider)
 
     @property
     def queue(self):
@@ -101,15 +408,39 @@ class Downloader:
         :return:
         """
         logger.debug('Enqueue request: %s', request)
+        start = self.loop.time()
         await self.queue.put(request)
+        self.stats.observe('downloader/enqueue_wait', self.loop.time() - start)
         logger.debug(
             'Current downloader queue size: %d, enqueued request: %s',
             self.queue.qsize(),
             request
         )
-        task = self.loop.create_task(self._middleware.download(self.downloading, request, spider))
+        task = self.loop.create_task(self._download(request, spider))
         return task
 
+    async def _download(self, request, spider) -> Response | None:
+        """
+        通过下载中间件下载，完成后从队列中移除。
+        中间件可能会重试，多次调用 downloading ，所以不能在 downloading 中移除。
+        :param request:
+        :param spider:
+        :return:
+        """
+        try:
+            response = await self._middleware.download(self.downloading, request, spider)
+        except Exception as ex:
+            self.stats.inc_value('downloader/exception_count')
+            self.stats.inc_value(f'downloader/exception_type_count/{type(ex).__name__}')
+            raise
+        else:
+            if response is not None:
+                self.stats.inc_value('downloader/response_count')
+                self.stats.inc_value(f'downloader/response_status_count/{response.status_code}')
+            return response
+        finally:
+            await self.queue.get()
+
     def should_pass(self) -> bool:
         """
         判断是否需要跳过
@@ -124,24 +455,103 @@ class Downloader:
         """
         return self.queue.empty()
 
+    def slot_keys(self, request: RequestProxy) -> tuple[str | None, str | None]:
+        """
+        获取请求对应的 host 和 proxy 下载槽 key ，没有限制并发时返回 None
+        :param request:
+        :return:
+        """
+        host = None
+        proxy = None
+        if self.settings.concurrent_requests_per_host:
+            host = httpx.URL(request.url).host
+        if self.settings.concurrent_requests_per_proxy and request.proxy:
+            proxy = str(request.proxy)
+        return host, proxy
+
+    def hedge_delay(self) -> float | None:
+        """
+        对冲请求的等待时间，即历史下载耗时的 hedge_percentile 百分位数。
+        没有启用或者样本不足时返回 None 。
+        :return:
+        """
+        percentile = self.settings.hedge_percentile
+        if percentile is None or len(self._latencies) < self.settings.hedge_min_samples:
+            return None
+        samples = sorted(self._latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
     async def downloading(self, request, spider) -> Response | None:
         """
         下载中
+
+        如果启用了对冲请求，并且 spider 提供了备用请求，请求超过 hedge_delay 没有响应时，
+        同时发起备用请求，使用先成功返回的响应。
         :param request:
         :param spider:
         :return:
         """
-        try:
+        delay = self.hedge_delay()
+        alternate = spider.alternate_request(request) if delay is not None else None
+        if alternate is None:
+            resp = await self.fetch(request)
+        else:
+            resp = await self.hedged_fetch(request, alternate, delay)
+        logger.debug('Downloaded request %s.', request)
+        return resp
+
+    async def fetch(self, request: RequestProxy) -> Response:
+        """
+        获取下载槽后下载，并记录下载耗时
+        :param request:
+        :return:
+        """
+        host, proxy = self.slot_keys(request)
+        start = self.loop.time()
+        async with self._host_slots.acquire(host), self._proxy_slots.acquire(proxy):
+            self.stats.observe('downloader/slot_wait', self.loop.time() - start)
+            self.stats.inc_value('downloader/request_count')
             resp = await self.handler.download(request)
-            logger.debug('Downloaded request %s.', request)
-            return resp
-        except Exception as ex:
-            raise ex
+        timing = resp.extensions.get('timing')
+        if isinstance(timing, Timing):
+            self.stats.observe('downloader/latency', timing.total)
+            if timing.ttfb is not None:
+                self.stats.observe('downloader/ttfb', timing.ttfb)
+            if self.settings.hedge_percentile is not None:
+                self._latencies.append(timing.total)
+        return resp
+
+    async def hedged_fetch(self, request: RequestProxy, alternate: RequestProxy, delay: float) -> Response:
+        """
+        对冲下载
+        :param request:
+        :param alternate: 备用请求
+        :param delay: 发起备用请求前的等待时间
+        :return:
+        """
+        first = self.loop.create_task(self.fetch(request))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        logger.debug('Request %s not response after %.3fs, send hedged request %s', request, delay, alternate)
+        pending = {first, self.loop.create_task(self.fetch(alternate))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
         finally:
-            await self.queue.get()
+            for task in pending:
+                task.cancel()
 
     async def close(self):
         """
         关闭下载
         :return:
         """
+        await self.handler.close()
@@ -0,0 +1,204 @@
+"""
+Dupe filter
+
+过滤起始请求中重复的请求，避免同一次抓取中重复下载。
+"""
+import abc
+import dataclasses
+import hashlib
+import logging
+import math
+import typing
+from collections.abc import AsyncGenerator, AsyncIterator
+
+from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
+from crawlerstack_proxypool.aio_scrapy.stats import StatsCollector
+
+logger = logging.getLogger(__name__)
+
+
+def request_fingerprint(request: RequestProxy) -> bytes:
+    """
+    请求指纹，由请求方法、url、代理和请求体计算得到的 16 字节摘要。
+    请求设置了 fingerprint 时，由请求方法和 fingerprint 计算。
+    :param request:
+    :return:
+    """
+    fingerprint = hashlib.blake2b(digest_size=16)
+    fingerprint.update(request.method.upper().encode())
+    if request.fingerprint is not None:
+        fingerprint.update(b'\1' + request.fingerprint.encode())
+        return fingerprint.digest()
+    fingerprint.update(b'\0' + str(request.url).encode())
+    fingerprint.update(b'\0' + str(request.proxy or '').encode())
+    content = request.content
+    if isinstance(content, str):
+        content = content.encode()
+    if isinstance(content, bytes):
+        fingerprint.update(b'\0' + content)
+    return fingerprint.digest()
+
+
+class BloomFilter:
+    """
+    布隆过滤器
+
+    根据预计容量和误判率计算位数组大小和哈希函数个数，使用双重哈希生成多个位置。
+    超过预计容量后误判率会升高，但不会漏判。
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        :param capacity: 预计元素数量
+        :param error_rate: 误判率
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray(math.ceil(self.size / 8))
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _indexes(self, value: bytes) -> typing.Iterator[int]:
+        digest = hashlib.blake2b(value, digest_size=16).digest()
+        hash1 = int.from_bytes(digest[:8], 'little')
+        hash2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (hash1 + i * hash2) % self.size
+
+    def add(self, value: bytes) -> bool:
+        """
+        添加元素
+        :param value:
+        :return: 元素已经存在（或误判为存在）时返回 True
+        """
+        exists = True
+        for index in self._indexes(value):
+            byte, bit = divmod(index, 8)
+            if not self._bits[byte] & (1 << bit):
+                exists = False
+                self._bits[byte] |= 1 << bit
+        if not exists:
+            self._count += 1
+        return exists
+
+    def __contains__(self, value: bytes) -> bool:
+        return all(self._bits[index // 8] & (1 << index % 8) for index in self._indexes(value))
+
+
+@dataclasses.dataclass
+class DupeFilter(metaclass=abc.ABCMeta):
+    """
+    去重过滤器基类
+    """
+    stats: StatsCollector = dataclasses.field(default_factory=StatsCollector)
+
+    @classmethod
+    def from_settings(cls, settings: Settings, stats: StatsCollector):
+        """
+        从配置中构建对象
+        :param settings:
+        :param stats:
+        :return:
+        """
+        return cls(stats=stats)
+
+    @abc.abstractmethod
+    def request_seen(self, request: RequestProxy) -> bool:
+        """
+        请求是否已经出现过，没有出现过时记录该请求
+        :param request:
+        :return:
+        """
+        raise NotImplementedError()
+
+    async def filter(self, requests: AsyncIterator[RequestProxy]) -> AsyncGenerator[RequestProxy, None]:
+        """
+        过滤重复的请求，设置了 dont_filter 的请求不过滤
+        :param requests:
+        :return:
+        """
+        async for request in requests:
+            if not request.dont_filter and self.request_seen(request):
+                logger.debug('Filtered duplicate request: %s', request)
+                self.stats.inc_value('dupefilter/filtered')
+                continue
+            yield request
+        filtered = self.stats.get_value('dupefilter/filtered', 0)
+        if filtered:
+            logger.info('Filtered %d duplicate requests.', filtered)
+
+
+@dataclasses.dataclass
+class NoDupeFilter(DupeFilter):
+    """
+    不去重
+    """
+
+    def request_seen(self, request: RequestProxy) -> bool:
+        return False
+
+
+@dataclasses.dataclass
+class SetDupeFilter(DupeFilter):
+    """
+    使用集合精确去重，每个请求占用一个 16 字节的指纹
+    """
+    _fingerprints: set[bytes] = dataclasses.field(default_factory=set, init=False)
+
+    def request_seen(self, request: RequestProxy) -> bool:
+        fingerprint = request_fingerprint(request)
+        if fingerprint in self._fingerprints:
+            return True
+        self._fingerprints.add(fingerprint)
+        return False
+
+
+@dataclasses.dataclass
+class BloomDupeFilter(DupeFilter):
+    """
+    使用布隆过滤器去重，内存占用固定，适合数百万请求的场景。
+    误判时会丢弃一个没有重复的请求，误判率由 dupefilter_error_rate 控制。
+    """
+    capacity: int = 1_000_000
+    error_rate: float = 0.001
+    _bloom: BloomFilter = dataclasses.field(init=False)
+
+    def __post_init__(self):
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+
+    @classmethod
+    def from_settings(cls, settings: Settings, stats: StatsCollector):
+        return cls(
+            stats=stats,
+            capacity=settings.dupefilter_capacity,
+            error_rate=settings.dupefilter_error_rate,
+        )
+
+    def request_seen(self, request: RequestProxy) -> bool:
+        return self._bloom.add(request_fingerprint(request))
+
+
+DUPEFILTERS: dict[str, typing.Type[DupeFilter]] = {
+    'none': NoDupeFilter,
+    'set': SetDupeFilter,
+    'bloom': BloomDupeFilter,
+}
+
+
+def load_dupefilter(settings: Settings, stats: StatsCollector) -> DupeFilter:
+    """
+    根据配置加载去重过滤器，配置可以是名称，也可以是 DupeFilter 的子类
+    :param settings:
+    :param stats:
+    :return:
+    """
+    kls = settings.dupefilter
+    if isinstance(kls, str):
+        kls = DUPEFILTERS[kls]
+    logger.debug('Use dupefilter: %s', kls.__name__)
+    return kls.from_settings(settings, stats)
@@ -3,12 +3,18 @@ Crawler engine
 """
 import asyncio
 import dataclasses
+import heapq
+import itertools
 import logging
 import typing
 from collections.abc import AsyncGenerator
 
 from crawlerstack_proxypool.aio_scrapy.downloader import Downloader
+from crawlerstack_proxypool.aio_scrapy.dupefilter import (DupeFilter,
+                                                          load_dupefilter)
 from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.scheduler import (Scheduler,
+                                                         load_scheduler)
 from crawlerstack_proxypool.aio_scrapy.scraper import Scraper
 from crawlerstack_proxypool.aio_scrapy.spider import Spider
 from crawlerstack_proxypool.signals import spider_closed, spider_opened
@@ -30,14 +36,37 @@ class ExecuteEngine:
     _closed: asyncio.Future = dataclasses.field(default=None, init=False)
     _next_request_task: asyncio.Task | None = dataclasses.field(default=None, init=False)
     _downloader: Downloader = dataclasses.field(init=False)
-    _scraper: Scraper = dataclasses.field(default_factory=Scraper, init=False)
+    _scraper: Scraper = dataclasses.field(init=False)
+    _scheduler: Scheduler = dataclasses.field(init=False)
+    _dupefilter: DupeFilter = dataclasses.field(init=False)
     _start_requests: AsyncGenerator[RequestProxy, None] | None = dataclasses.field(default=None, init=False)
     _processing_requests_queue: asyncio.Queue = dataclasses.field(init=False)
+    _workers: list[asyncio.Task] = dataclasses.field(default_factory=list, init=False)
+    _active_workers: int = dataclasses.field(default=0, init=False)
+    _start_requests_lock: asyncio.Lock = dataclasses.field(default_factory=asyncio.Lock, init=False)
+    # 被限速推迟的请求，按到期时间排序的堆：(到期时间, 序号, 请求)
+    _deferred: list[tuple[float, int, RequestProxy]] = dataclasses.field(default_factory=list, init=False)
+    _deferred_seq: typing.Iterator[int] = dataclasses.field(default_factory=itertools.count, init=False)
 
     def __post_init__(self):
         self._closed = asyncio.Future()
-        self._processing_requests_queue = asyncio.Queue(10)
-        self._downloader = Downloader(self.crawler.settings)
+        self._processing_requests_queue = asyncio.Queue(self.crawler.settings.engine_queue_size)
+        self._downloader = Downloader(self.crawler.settings, stats=self.crawler.stats)
+        self._scraper = Scraper(
+            self.crawler.settings,
+            stats=self.crawler.stats,
+            shared_executor=self.crawler.executor,
+        )
+        self._scheduler = load_scheduler(self.crawler.settings)
+        self._dupefilter = load_dupefilter(self.crawler.settings, self.crawler.stats)
+
+    @property
+    def stats(self):
+        """
+        Get crawler stats
+        :return:
+        """
+        return self.crawler.stats
 
     @property
     def loop(self) -> asyncio.AbstractEventLoop:
@@ -74,6 +103,7 @@ class ExecuteEngine:
         await self.close_spider()
         # set closed result.
         if not self._closed.done():
+            self.stats.close_spider()
             self._closed.set_result('Closed.')
         logger.debug('Stopped execution engine.')
 
@@ -84,10 +114,123 @@ class ExecuteEngine:
         :return:
         """
         logger.info('Open spider: %s', spider.name)
+        if self._closed.done():
+            # keep_alive 模式下复用引擎，重置上一次运行的状态
+            self._closed = asyncio.Future()
+            self._next_request_task = None
+            self._workers = []
+            self._deferred = []
+            self._dupefilter = load_dupefilter(self.crawler.settings, self.crawler.stats)
+        self.stats.clear()
         self._spider = spider
-        self._start_requests = self._spider.start_requests()
+        self._start_requests = self._scheduler.schedule(
+            self._dupefilter.filter(self._spider.start_requests())
+        )
+        self.stats.open_spider(spider.name)
+        self._downloader.open_spider(spider)
+        self._scraper.open_spider(spider)
         await spider_opened.send(sender=self._spider)
-        self._next_request_task = self.loop.create_task(self.loop_call(5))
+        if self.crawler.settings.engine_mode == 'worker':
+            self.start_workers()
+        else:
+            self._next_request_task = self.loop.create_task(self.loop_call(5))
+
+    def start_workers(self):
+        """
+        启动常驻的工作协程。
+        每个工作协程处理完一个请求后立即拉取下一个请求，吞吐量只受并发数和网络限制。
+        :return:
+        """
+        workers = self.crawler.settings.concurrent_requests
+        self._active_workers = workers
+        self._workers = [self.loop.create_task(self.worker()) for _ in range(workers)]
+        logger.debug('Started %d engine workers.', workers)
+
+    async def worker(self):
+        """
+        工作协程。
+        循环从起始请求中获取请求并处理，起始请求耗尽后退出。
+        最后一个退出的工作协程负责关闭引擎。
+        :return:
+        """
+        try:
+            while not self._closed.done():
+                request = await self.pull_request()
+                if request is None:
+                    break
+                try:
+                    await self.process_request(request)
+                except Exception as ex:  # pylint: disable=broad-except
+                    logger.warning('Process request %s error. %s', request, ex)
+        except Exception as ex:  # pylint: disable=broad-except
+            # 起始请求生成器异常时，不再继续获取请求
+            logger.exception(ex)
+            self._start_requests = None
+        finally:
+            self._active_workers -= 1
+        if self._active_workers == 0 and self._start_requests is None:
+            logger.debug('All engine workers finished, to close...')
+            await spider_closed.send(sender=self._spider)
+            await self.stop()
+
+    async def pull_request(self) -> RequestProxy | None:
+        """
+        工作协程获取下一个请求。
+        优先返回已经到期的推迟请求；起始请求需要限速等待时将其推迟，继续获取下一个，不占用工作协程。
+        推迟的请求达到 rate_limit_max_deferred 或者起始请求已经取完时，等待最早到期的推迟请求。
+        起始请求和推迟的请求都已经取完时返回 None 。
+        :return:
+        """
+        while True:
+            request = self.pop_deferred()
+            if request is not None:
+                return request
+            if self._start_requests is not None \
+                    and len(self._deferred) < self.crawler.settings.rate_limit_max_deferred:
+                request = await self.next_start_request()
+                if request is not None and not self.defer(request):
+                    return request
+                continue
+            if not self._deferred:
+                return None
+            await asyncio.sleep(max(0.0, self._deferred[0][0] - self.loop.time()))
+
+    def defer(self, request: RequestProxy) -> bool:
+        """
+        请求需要限速等待时推迟该请求
+        :param request:
+        :return: 是否推迟
+        """
+        delay = self._downloader.request_delay(request, self._spider)
+        if delay <= 0:
+            return False
+        heapq.heappush(self._deferred, (self.loop.time() + delay, next(self._deferred_seq), request))
+        self.stats.inc_value('engine/deferred_count')
+        return True
+
+    def pop_deferred(self) -> RequestProxy | None:
+        """
+        取出已经到期的推迟请求，没有时返回 None
+        :return:
+        """
+        if self._deferred and self._deferred[0][0] <= self.loop.time():
+            return heapq.heappop(self._deferred)[2]
+        return None
+
+    async def next_start_request(self) -> RequestProxy | None:
+        """
+        从起始请求中获取下一个请求，如果已经没有请求，返回 None 。
+        异步生成器不能并发迭代，所以需要加锁。
+        :return:
+        """
+        async with self._start_requests_lock:
+            if self._start_requests is None:
+                return None
+            try:
+                return await self._start_requests.__anext__()
+            except StopAsyncIteration:
+                self._start_requests = None
+                return None
 
     async def loop_call(self, delay: float):
         """
@@ -104,25 +247,45 @@ class ExecuteEngine:
     async def close_spider(self):
         """
         Close spider.
+        keep_alive 模式下保留下载器的连接和解析执行器，由 shutdown 释放。
         :return:
         """
-        await self._downloader.close()
+        await self._scraper.close_spider()
+        if not self.crawler.settings.keep_alive:
+            await self.shutdown()
         if self._next_request_task:
             self._next_request_task.cancel('close.')
+        current_task = asyncio.current_task()
+        for worker in self._workers:
+            if worker is not current_task and not worker.done():
+                worker.cancel('close.')
         logger.debug('Closed spider.')
 
+    async def shutdown(self):
+        """
+        释放下载器和解析器的资源
+        :return:
+        """
+        await self._downloader.close()
+        await self._scraper.close()
+        logger.debug('Shutdown engine.')
+
     async def next_request(self):
         """
         Next request.
         :return:
         """
-        if self._start_requests is not None and not self.should_pass() and not self._start_requests.ag_running:
+        request = None if self.should_pass() else self.pop_deferred()
+        if request is not None:
+            await self.crawl(request)
+        elif self._start_requests is not None and not self.should_pass() and not self._start_requests.ag_running:
             try:
                 request = await self._start_requests.__anext__()
             except StopAsyncIteration:
                 self._start_requests = None
             else:
-                await self.crawl(request)
+                if not self.defer(request):
+                    await self.crawl(request)
 
         await self.spider_idle()
 
@@ -143,17 +306,24 @@ class ExecuteEngine:
         :return:
         """
         try:
-            download_task = await self._downloader.enqueue(request, self._spider)
-            response = await download_task
-
-            if response:
-                scrap_task = await self._scraper.enqueue(response, self._spider)
-                await scrap_task
-
+            await self.process_request(request)
             self.loop.create_task(self.next_request())
         finally:
             await self._processing_requests_queue.get()
 
+    async def process_request(self, request: RequestProxy):
+        """
+        下载请求，然后将响应交给 scraper 解析。
+        :param request:
+        :return:
+        """
+        download_task = await self._downloader.enqueue(request, self._spider)
+        response = await download_task
+
+        if response:
+            scrap_task = await self._scraper.enqueue(response, self._spider)
+            await scrap_task
+
     def should_pass(self):
         """
         下此次操作是否跳过
@@ -179,6 +349,8 @@ class ExecuteEngine:
             return False
         if self._start_requests is not None:
             return False
+        if self._deferred:
+            return False
         return True
 
     async def spider_idle(self):
@@ -0,0 +1,27 @@
+"""
+exceptions
+"""
+
+
+class AioScrapyError(Exception):
+    """
+    aio_scrapy 异常基类
+    """
+
+
+class DownloadTimeoutError(AioScrapyError):
+    """
+    下载超过请求的总超时时间
+    """
+
+
+class NotConfigured(AioScrapyError):
+    """
+    组件没有启用，在 from_settings 中抛出后，该组件会被忽略
+    """
+
+
+class ResponseTooLargeError(AioScrapyError):
+    """
+    响应体超过最大限制
+    """
@@ -1,13 +1,20 @@
 """middleware"""
 import abc
 import asyncio
+import dataclasses
 import logging
+import random
+import time
 from collections import defaultdict, deque
 from collections.abc import Callable
 from typing import Generic, TypeVar
 
+import httpx
 from httpx import Response
 
+from crawlerstack_proxypool.aio_scrapy.exceptions import (DownloadTimeoutError,
+                                                          NotConfigured)
+from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
 from crawlerstack_proxypool.aio_scrapy.settings import Settings
 
 logger = logging.getLogger(__name__)
@@ -59,6 +66,16 @@ class DownloadMiddleware(BaseMiddleware):
     Download middleware
     """
 
+    def request_delay(self, request, spider) -> float:
+        """
+        引擎调度请求前调用，返回请求需要推迟的秒数，0 表示可以立即下载。
+        中间件可以在这里预约资源（例如限速的令牌），推迟的请求到期后直接下载，不会再次调用。
+        :param request:
+        :param spider:
+        :return:
+        """
+        return 0
+
     async def process_request(self, request, spider):
         """
         process request
@@ -75,7 +92,193 @@ class DownloadMiddleware(BaseMiddleware):
         :param spider:
         :return:
         """
+        return response
+
+
+@dataclasses.dataclass
+class TokenBucket:
+    """
+    令牌桶
+
+    以 rate 的速度生成令牌，最多保存 burst 个令牌。
+    没有令牌时预约之后生成的令牌（令牌数为负数），返回需要等待的时间，按预约的先后顺序获取令牌。
+    预约不需要加锁，多个等待者各自等待，互不阻塞。
+    """
+    rate: float
+    burst: int = 1
+    _tokens: float = dataclasses.field(init=False)
+    _updated: float = dataclasses.field(default_factory=time.monotonic, init=False)
+
+    def __post_init__(self):
+        self._tokens = self.burst
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        预约一个令牌
+        :return: 需要等待的秒数，为 0 时可以直接使用
+        """
+        self._refill()
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0
+        return -self._tokens / self.rate
+
+    async def acquire(self):
+        """
+        获取一个令牌，没有令牌时等待
+        :return:
+        """
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class RateLimitMiddleware(DownloadMiddleware):
+    """
+    按目标 host 限速的下载中间件
+
+    每个 host 使用一个令牌桶。引擎调度请求前通过 request_delay 预约令牌，
+    没有令牌时引擎推迟该请求，继续处理其他请求，被限速的 host 不会占用工作协程和下载队列。
+    重试的请求已经在下载中，在 process_request 中等待令牌。
+    """
+
+    def __init__(self, rate: float, burst: int = 1, hosts: dict[str, float] | None = None):
+        self.rate = rate
+        self.burst = burst
+        self.hosts = hosts or {}
+        self._buckets: dict[str, TokenBucket] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        """
+        from settings
+        :param settings:
+        :return:
+        """
+        if not settings.rate_limit and not settings.rate_limit_hosts:
+            raise NotConfigured()
+        return cls(settings.rate_limit, settings.rate_limit_burst, settings.rate_limit_hosts)
+
+    def get_bucket(self, host: str) -> TokenBucket | None:
+        """
+        获取 host 对应的令牌桶，不限速的 host 返回 None
+        :param host:
+        :return:
+        """
+        if host not in self._buckets:
+            rate = self.hosts.get(host, self.rate)
+            if not rate:
+                return None
+            self._buckets[host] = TokenBucket(rate, self.burst)
+        return self._buckets[host]
+
+    def request_delay(self, request, spider) -> float:
+        bucket = self.get_bucket(httpx.URL(request.url).host)
+        if bucket:
+            return bucket.reserve()
+        return 0
+
+    async def process_request(self, request, spider):
+        if request.retry_times:
+            bucket = self.get_bucket(httpx.URL(request.url).host)
+            if bucket:
+                await bucket.acquire()
+
+
+class RetryMiddleware(DownloadMiddleware):
+    """
+    下载重试中间件
+
+    网络异常时使用带随机抖动的指数退避重试，并通过重试预算限制重试总量。
+    重试预算按每次运行统计，spider 打开时重置。
+    """
+    RETRY_EXCEPTIONS = (httpx.TransportError, DownloadTimeoutError)
+
+    def __init__(
+            self,
+            max_retry_times: int,
+            backoff_base: float = 0.5,
+            backoff_max: float = 10.0,
+            budget_ratio: float = 0.1,
+            budget_min: int = 10,
+    ):
+        self.max_retry_times = max_retry_times
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.requests = 0
+        self.retries = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        """
+        from settings
+        :param settings:
+        :return:
+        """
+        if not settings.retry_times:
+            raise NotConfigured()
+        return cls(
+            max_retry_times=settings.retry_times,
+            backoff_base=settings.retry_backoff_base,
+            backoff_max=settings.retry_backoff_max,
+            budget_ratio=settings.retry_budget_ratio,
+            budget_min=settings.retry_budget_min,
+        )
+
+    def open_spider(self, spider):
+        """
+        重置重试预算的计数，keep_alive 模式下不累计上一次运行的请求和重试
+        :param spider:
+        :return:
+        """
+        self.requests = 0
+        self.retries = 0
 
+    def has_budget(self) -> bool:
+        """
+        是否还有重试预算
+        :return:
+        """
+        return self.retries < self.requests * self.budget_ratio + self.budget_min
+
+    def backoff(self, retry_times: int) -> float:
+        """
+        计算退避时间，full jitter
+        :param retry_times:
+        :return:
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry_times))
+
+    async def process_request(self, request, spider):
+        if not request.retry_times:
+            self.requests += 1
+
+    async def process_exception(self, exception, request, spider):
+        if not isinstance(exception, self.RETRY_EXCEPTIONS):
+            return None
+        if request.retry_times >= self.max_retry_times:
+            logger.debug('Gave up retrying %s (failed %d times): %s', request, request.retry_times + 1, exception)
+            return None
+        if not self.has_budget():
+            logger.debug('Retry budget exhausted, gave up retrying %s: %s', request, exception)
+            return None
+        self.retries += 1
+        await asyncio.sleep(self.backoff(request.retry_times))
+        logger.debug('Retrying %s (failed %d times): %s', request, request.retry_times + 1, exception)
+        return dataclasses.replace(request, retry_times=request.retry_times + 1)
+
+
+BUILTIN_DOWNLOAD_MIDDLEWARES = [
+    RateLimitMiddleware,
+    RetryMiddleware,
+]
 
 MiddlewareType = TypeVar('MiddlewareType', bound=BaseMiddleware)
 
@@ -103,8 +306,14 @@ class MiddlewareManager(Generic[MiddlewareType]):
         mws_kls = cls._get_mws_kls(settings)
         mws = []
         for mw_kls in mws_kls:
-            mws.append(mw_kls())
-        logger.info('Enable %s: %s', cls.NAME, mws_kls)
+            try:
+                if hasattr(mw_kls, 'from_settings'):
+                    mws.append(mw_kls.from_settings(settings))
+                else:
+                    mws.append(mw_kls())
+            except NotConfigured:
+                logger.debug('%s %s not configured, skip it.', cls.NAME, mw_kls)
+        logger.info('Enable %s: %s', cls.NAME, mws)
         return cls(mws)
 
     @classmethod
@@ -114,11 +323,20 @@ class MiddlewareManager(Generic[MiddlewareType]):
 
     def _add_mws(self, mws: list[MiddlewareType]):
         for middleware in mws:
-            if getattr(middleware, 'open_spider'):
+            if getattr(middleware, 'open_spider', None):
                 self.methods['open_spider'].append(middleware.open_spider)
-            if getattr(middleware, 'close_spider'):
+            if getattr(middleware, 'close_spider', None):
                 self.methods['close_spider'].append(middleware.close_spider)
 
+    def open_spider(self, spider):
+        """
+        open spider
+        :param spider:
+        :return:
+        """
+        for method in self.methods['open_spider']:
+            method(spider)
+
     async def process_exception(self, exception, request, spider):
         """
         process exception
@@ -140,10 +358,13 @@ class DownloadMiddlewareManager(MiddlewareManager[DownloadMiddleware]):
 
     @classmethod
     def _get_mws_kls(cls, settings: Settings):
-        return settings.download_middlewares
+        return [*BUILTIN_DOWNLOAD_MIDDLEWARES, *settings.download_middlewares]
 
     def _add_mws(self, mws: list[MiddlewareType]):
+        super()._add_mws(mws)
         for middleware in mws:
+            if getattr(middleware, 'request_delay'):
+                self.methods['request_delay'].append(middleware.request_delay)
             if getattr(middleware, 'process_request'):
                 self.methods['process_request'].append(middleware.process_request)
             if getattr(middleware, 'process_response'):
@@ -152,16 +373,50 @@ class DownloadMiddlewareManager(MiddlewareManager[DownloadMiddleware]):
                 self.methods['process_exception'].appendleft(middleware.process_exception)
 
     async def download(self, download_func, request, spider):
-        """download"""
-        try:
-            response = await self.process_request(request, spider)
-            if isinstance(response, Response):
-                return response
-            response = await download_func(request=request, spider=spider)
-        except Exception as ex:
-            return await self.process_exception(ex, request, spider)
-
-        return await self.process_response(response, request, spider)
+        """
+        download
+
+        如果 process_exception 返回新的请求，则重新下载该请求。
+        """
+        while True:
+            try:
+                response = await self.process_request(request, spider)
+                if isinstance(response, Response):
+                    return response
+                response = await download_func(request=request, spider=spider)
+            except Exception as ex:
+                result = await self.process_exception(ex, request, spider)
+                if isinstance(result, RequestProxy):
+                    request = result
+                    continue
+                return result
+
+            return await self.process_response(response, request, spider)
+
+    async def process_exception(self, exception, request, spider):
+        """
+        process exception
+
+        如果有中间件返回 Response 或 RequestProxy ，则停止后续处理并返回该结果，否则抛出异常。
+        :param exception:
+        :param request:
+        :param spider:
+        :return:
+        """
+        for method in self.methods['process_exception']:
+            result = await method(exception, request, spider)
+            if result is not None:
+                return result
+        raise exception
+
+    def request_delay(self, request, spider) -> float:
+        """
+        请求需要推迟的秒数，取所有中间件中的最大值
+        :param request:
+        :param spider:
+        :return:
+        """
+        return max((method(request, spider) for method in self.methods['request_delay']), default=0)
 
     async def process_request(self, request, spider):
         """
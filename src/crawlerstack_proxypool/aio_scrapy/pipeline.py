@@ -0,0 +1,135 @@
+"""
+Item pipeline
+"""
+import asyncio
+import dataclasses
+import logging
+import typing
+
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
+from crawlerstack_proxypool.aio_scrapy.stats import StatsCollector
+
+logger = logging.getLogger(__name__)
+
+# 关闭 pipeline 的标记
+_CLOSE = object()
+
+
+@dataclasses.dataclass
+class ItemPipeline:
+    """
+    批量处理解析结果
+
+    解析结果先放入有界队列，后台任务按 batch_size 或者 flush_interval 将一批结果交给 handler 处理，
+    例如一次事务写入数据库。队列满时 process_item 会等待，从而对引擎形成背压。
+    """
+    handler: typing.Callable[[list], typing.Awaitable[typing.Any]]
+    batch_size: int = 100
+    # 一批中第一个结果最多等待的时间（秒）
+    flush_interval: float = 1.0
+    queue_size: int = 1000
+    stats: StatsCollector = dataclasses.field(default_factory=StatsCollector)
+    _queue: asyncio.Queue = dataclasses.field(init=False)
+    _task: asyncio.Task | None = dataclasses.field(default=None, init=False)
+
+    def __post_init__(self):
+        self._queue = asyncio.Queue(self.queue_size)
+
+    @classmethod
+    def from_settings(
+            cls,
+            handler: typing.Callable[[list], typing.Awaitable[typing.Any]],
+            settings: Settings,
+            stats: StatsCollector,
+    ):
+        """
+        从配置中构建对象
+        :param handler:
+        :param settings:
+        :param stats:
+        :return:
+        """
+        return cls(
+            handler=handler,
+            batch_size=settings.item_batch_size,
+            flush_interval=settings.item_flush_interval,
+            queue_size=settings.item_queue_size,
+            stats=stats,
+        )
+
+    def open(self):
+        """
+        启动后台批处理任务
+        :return:
+        """
+        self._task = asyncio.get_running_loop().create_task(self.consume())
+
+    async def process_item(self, item: typing.Any):
+        """
+        将结果放入队列，队列满时等待
+        :param item:
+        :return:
+        """
+        await self._queue.put(item)
+
+    async def consume(self):
+        """
+        从队列中按批次获取结果并处理，收到关闭标记后处理完剩余结果再退出。
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        closed = False
+        while not closed:
+            item = await self._queue.get()
+            if item is _CLOSE:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _CLOSE:
+                    closed = True
+                    break
+                batch.append(item)
+            await self.flush(batch)
+
+    async def flush(self, batch: list):
+        """
+        处理一批结果。整批处理失败时逐个重试，一个结果的异常（例如代理已经被并发删除）
+        不会导致同一批中的其他结果丢失。异常时记录日志，不影响后续批次。
+        :param batch:
+        :return:
+        """
+        logger.debug('Flush %d items to pipeline.', len(batch))
+        try:
+            await self.handler(batch)
+        except Exception as ex:  # pylint: disable=broad-except
+            if len(batch) == 1:
+                logger.exception(ex)
+                self.stats.inc_value('pipeline/exception_count')
+                return
+            logger.warning('Flush batch of %d items failed, retry item by item. Error: %s', len(batch), ex)
+            self.stats.inc_value('pipeline/batch_retry_count')
+            for item in batch:
+                await self.flush([item])
+        else:
+            self.stats.inc_value('pipeline/batch_count')
+            self.stats.inc_value('pipeline/item_count', len(batch))
+
+    async def close(self):
+        """
+        处理完队列中剩余的结果后关闭
+        :return:
+        """
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.put(_CLOSE)
+            await self._task
+        self._task = None
@@ -1,8 +1,10 @@
 """request response proxy"""
+import contextvars
 import dataclasses
+import time
 import typing
 
-from httpx import URL
+from httpx import URL, Response
 from httpx._client import UseClientDefault
 from httpx._types import (AuthTypes, CookieTypes, HeaderTypes, ProxiesTypes,
                           QueryParamTypes, RequestContent, RequestData,
@@ -28,3 +30,69 @@ class RequestProxy:
     proxy: ProxiesTypes = None
     auth: typing.Union[AuthTypes, UseClientDefault] = None
     follow_redirects: typing.Union[bool, UseClientDefault] = True
+    # 超时时间，单位秒。为 None 时使用下载器的默认配置
+    connect_timeout: float | None = None
+    read_timeout: float | None = None
+    # 总超时时间，从发起请求到读取完响应
+    timeout: float | None = None
+    # 已经重试的次数
+    retry_times: int = 0
+    # 调度优先级，越大越先处理，需要配合 priority 调度器使用
+    priority: float = 0
+    # 为 True 时不经过去重过滤
+    dont_filter: bool = False
+    # 去重使用的键，设置后使用请求方法和该键计算请求指纹，不再使用 url 、代理和请求体
+    fingerprint: str | None = None
+    # 响应体最大字节数，为 None 时使用下载器的默认配置，0 表示不限制
+    max_body_size: int | None = None
+    # 流式读取响应体时，每读取一块数据调用一次，返回 True 时停止读取并关闭连接
+    body_consumer: typing.Callable[[Response, bytes], bool] | None = None
+
+
+@dataclasses.dataclass
+class Timing:
+    """
+    请求各阶段耗时，单位秒。
+
+    通过 httpcore 的 trace 扩展采集，复用连接时没有 connect 和 tls 阶段，值为 None 。
+    dns 由 DNS 缓存的网络后端记录，只有直连请求才有。
+    """
+    start: float = dataclasses.field(default_factory=time.monotonic)
+    dns: float | None = None
+    connect: float | None = None
+    tls: float | None = None
+    ttfb: float | None = None
+    total: float | None = None
+    _started: dict[str, float] = dataclasses.field(default_factory=dict, init=False, repr=False)
+
+    async def trace(self, event_name: str, _info: dict):
+        """
+        httpcore trace 回调
+        :param event_name: 例如 connection.connect_tcp.started
+        :param _info:
+        :return:
+        """
+        name, _, status = event_name.rpartition('.')
+        now = time.monotonic()
+        if status == 'started':
+            self._started[name] = now
+        elif status == 'complete':
+            elapsed = now - self._started.pop(name, now)
+            if name == 'connection.connect_tcp':
+                self.connect = elapsed
+            elif name == 'connection.start_tls':
+                # 通过 https 代理访问 https 网站时，会有两次 TLS 握手
+                self.tls = (self.tls or 0) + elapsed
+            elif name.endswith('.receive_response_headers'):
+                self.ttfb = now - self.start
+
+    def finish(self):
+        """
+        请求完成，记录总耗时
+        :return:
+        """
+        self.total = time.monotonic() - self.start
+
+
+# 当前正在下载的请求的 Timing ，用于在 httpcore 网络后端等拿不到请求对象的地方记录耗时
+current_timing: contextvars.ContextVar[Timing | None] = contextvars.ContextVar('current_timing', default=None)
@@ -0,0 +1,96 @@
+"""
+Scheduler
+
+位于 Spider.start_requests 和下载器之间，决定请求的处理顺序。
+"""
+import abc
+import dataclasses
+import heapq
+import itertools
+import logging
+import typing
+from collections.abc import AsyncGenerator, AsyncIterator
+
+from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler(metaclass=abc.ABCMeta):
+    """
+    调度器基类
+    """
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        """
+        从配置中构建对象
+        :param settings:
+        :return:
+        """
+        return cls()
+
+    @abc.abstractmethod
+    def schedule(self, requests: AsyncIterator[RequestProxy]) -> AsyncGenerator[RequestProxy, None]:
+        """
+        将起始请求转换为按调度顺序输出的异步生成器
+        :param requests:
+        :return:
+        """
+        raise NotImplementedError()
+
+
+class FifoScheduler(Scheduler):
+    """
+    按起始请求的迭代顺序调度
+    """
+
+    async def schedule(self, requests: AsyncIterator[RequestProxy]) -> AsyncGenerator[RequestProxy, None]:
+        async for request in requests:
+            yield request
+
+
+@dataclasses.dataclass
+class PriorityScheduler(Scheduler):
+    """
+    按 RequestProxy.priority 从高到低调度，优先级相同时保持迭代顺序。
+
+    最多预读 lookahead 个请求放入堆中，每预读满一次就输出当前优先级最高的请求。
+    这样不需要先消费完起始请求（起始请求可能来自消息队列，数量未知），
+    内存占用也有上限。lookahead 大于等于请求总数时为全局有序。
+    """
+    lookahead: int = 1000
+
+    @classmethod
+    def from_settings(cls, settings: Settings):
+        return cls(lookahead=settings.scheduler_lookahead)
+
+    async def schedule(self, requests: AsyncIterator[RequestProxy]) -> AsyncGenerator[RequestProxy, None]:
+        heap: list[tuple[float, int, RequestProxy]] = []
+        counter = itertools.count()
+        async for request in requests:
+            heapq.heappush(heap, (-request.priority, next(counter), request))
+            if len(heap) >= self.lookahead:
+                yield heapq.heappop(heap)[-1]
+        while heap:
+            yield heapq.heappop(heap)[-1]
+
+
+SCHEDULERS: dict[str, typing.Type[Scheduler]] = {
+    'fifo': FifoScheduler,
+    'priority': PriorityScheduler,
+}
+
+
+def load_scheduler(settings: Settings) -> Scheduler:
+    """
+    根据配置加载调度器，配置可以是调度器名称，也可以是 Scheduler 的子类
+    :param settings:
+    :return:
+    """
+    kls = settings.scheduler
+    if isinstance(kls, str):
+        kls = SCHEDULERS[kls]
+    logger.debug('Use scheduler: %s', kls.__name__)
+    return kls.from_settings(settings)
@@ -4,22 +4,71 @@ Scraper
 import asyncio
 import dataclasses
 import logging
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
 
+from crawlerstack_proxypool.aio_scrapy.pipeline import ItemPipeline
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
 from crawlerstack_proxypool.aio_scrapy.spider import Spider
+from crawlerstack_proxypool.aio_scrapy.stats import StatsCollector
 
 logger = logging.getLogger(__name__)
 
 
+def create_executor(settings: Settings) -> Executor | None:
+    """
+    根据 scraper_executor 配置创建解析使用的线程池或进程池，inline 模式下返回 None
+    :param settings:
+    :return:
+    """
+    workers = settings.scraper_executor_workers
+    if settings.scraper_executor == 'thread':
+        return ThreadPoolExecutor(workers, thread_name_prefix='scraper')
+    if settings.scraper_executor == 'process':
+        return ProcessPoolExecutor(workers)
+    return None
+
+
 @dataclasses.dataclass
 class Scraper:
     """
     Scraper
     """
+    settings: Settings = dataclasses.field(default_factory=Settings)
     loop: asyncio.AbstractEventLoop = dataclasses.field(default_factory=asyncio.get_running_loop)
+    stats: StatsCollector = dataclasses.field(default_factory=StatsCollector)
+    # 外部传入的执行器，由外部负责关闭，为 None 时根据配置创建
+    shared_executor: Executor | None = None
     _queue: asyncio.Queue = dataclasses.field(init=False)
+    _executor: Executor | None = dataclasses.field(default=None, init=False)
+    _pipeline: ItemPipeline | None = dataclasses.field(default=None, init=False)
 
     def __post_init__(self):
-        self._queue = asyncio.Queue(5)
+        self._queue = asyncio.Queue(self.settings.scraper_queue_size)
+        if self.shared_executor is not None:
+            self._executor = self.shared_executor
+        else:
+            self._executor = create_executor(self.settings)
+
+    @property
+    def executor(self) -> Executor | None:
+        """
+        解析使用的线程池或进程池，inline 模式下为 None
+        :return:
+        """
+        return self._executor
+
+    def open_spider(self, spider: Spider):
+        """
+        将执行器绑定到 spider 上，spider 通过 run_in_executor 使用。
+        启动 pipeline ，将解析结果批量交给 spider.process_items ，spider 通过 send_items 直接放入的结果也一起处理。
+        :param spider:
+        :return:
+        """
+        spider.executor = self._executor
+        spider.item_processor = self.process_items
+        self._pipeline = ItemPipeline.from_settings(spider.process_items, self.settings, self.stats)
+        self._pipeline.open()
 
     @property
     def queue(self):
@@ -36,7 +85,9 @@ class Scraper:
         :param spider:
         :return:
         """
+        start = self.loop.time()
         await self._queue.put(response)
+        self.stats.observe('scraper/enqueue_wait', self.loop.time() - start)
         logger.debug('Current scraper queue size: %d, enqueued response: %s', self.queue.qsize(), response)
         task = self.loop.create_task(self.parse(response, spider))
         return task
@@ -67,14 +118,45 @@ class Scraper:
             logger.debug('Parse %s', response)
             result = await spider.parse(response)
             logger.debug(result)
+            self.stats.inc_value('scraper/response_count')
+            if result is not None:
+                items = list(result) if isinstance(result, (list, tuple, set)) else [result]
+                self.stats.inc_value('scraper/item_scraped_count', len(items))
+                await self.process_items(items)
         except Exception as ex:
             logger.exception(ex)
+            self.stats.inc_value('scraper/exception_count')
+            self.stats.inc_value(f'scraper/exception_type_count/{type(ex).__name__}')
             # 增加异常处理逻辑
         finally:
             await self._queue.get()
 
+    async def process_items(self, items: list):
+        """
+        将结果放入 pipeline ，没有打开 spider 时丢弃
+        :param items:
+        :return:
+        """
+        if self._pipeline is None:
+            return
+        for item in items:
+            await self._pipeline.process_item(item)
+
+    async def close_spider(self):
+        """
+        处理完 pipeline 中剩余的结果
+        :return:
+        """
+        if self._pipeline is not None:
+            await self._pipeline.close()
+            self._pipeline = None
+
     async def close(self):
         """
         Close.
         :return:
         """
+        await self.close_spider()
+        if self._executor is not None and self._executor is not self.shared_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
@@ -4,13 +4,122 @@ import typing
 from typing import Type
 
 if typing.TYPE_CHECKING:
+    from crawlerstack_proxypool.aio_scrapy.dupefilter import DupeFilter
     from crawlerstack_proxypool.aio_scrapy.middlewares import \
         DownloadMiddleware
+    from crawlerstack_proxypool.aio_scrapy.scheduler import Scheduler
 
 
 @dataclasses.dataclass
 class Settings:
     download_middlewares: list[Type['DownloadMiddleware']] = dataclasses.field(default_factory=list)
+    # 引擎运行模式：
+    #   worker: 启动 concurrent_requests 个常驻工作协程，由请求完成驱动拉取下一个请求；
+    #   polling: 旧模式，间隔 5 秒轮询 next_request 。
+    engine_mode: typing.Literal['worker', 'polling'] = 'worker'
+    # 调度器，决定起始请求的处理顺序：
+    #   fifo: 按 start_requests 的迭代顺序；
+    #   priority: 按 RequestProxy.priority 从高到低，最多预读 scheduler_lookahead 个请求。
+    # 也可以是 Scheduler 的子类。
+    scheduler: typing.Literal['fifo', 'priority'] | Type['Scheduler'] = 'fifo'
+    scheduler_lookahead: int = 1000
+    # 起始请求去重：
+    #   none: 不去重；
+    #   set: 使用集合精确去重；
+    #   bloom: 使用布隆过滤器去重，内存固定，按 dupefilter_capacity 和 dupefilter_error_rate 计算大小。
+    # 也可以是 DupeFilter 的子类。
+    dupefilter: typing.Literal['none', 'set', 'bloom'] | Type['DupeFilter'] = 'set'
+    dupefilter_capacity: int = 1_000_000
+    dupefilter_error_rate: float = 0.001
+    # crawl 结束后保留下载器的连接和解析执行器，同一个 Crawler 可以多次 crawl ，
+    # 需要调用 Crawler.close 释放资源
+    keep_alive: bool = False
+    # 全局并发数，worker 模式下即为工作协程的数量
+    concurrent_requests: int = 16
+    # 同一个目标 host 的最大并发数，0 表示不限制
+    concurrent_requests_per_host: int = 0
+    # 同一个代理的最大并发数，0 表示不限制
+    concurrent_requests_per_proxy: int = 0
+    # 队列深度，为 None 时使用 concurrent_requests
+    engine_queue_size: int | None = None
+    downloader_queue_size: int | None = None
+    scraper_queue_size: int | None = None
+    # 解析的执行方式，避免 CPU 密集的解析阻塞事件循环：
+    #   inline: 在事件循环中直接解析；
+    #   thread: 在线程池中解析；
+    #   process: 在进程池中解析，只有响应内容和可序列化的解析参数会传递到子进程。
+    scraper_executor: typing.Literal['inline', 'thread', 'process'] = 'inline'
+    # 线程池或进程池的大小，为 None 时使用标准库的默认值
+    scraper_executor_workers: int | None = None
+    # 解析结果按批次交给 Spider.process_items 处理，满 item_batch_size 个或者
+    # 等待 item_flush_interval 秒后处理一批。队列满 item_queue_size 时解析会等待。
+    item_batch_size: int = 100
+    item_flush_interval: float = 1.0
+    item_queue_size: int = 1000
+    # 下载器按代理缓存的 client 数量，每个 client 的最大连接数，以及 client 空闲关闭时间（秒）
+    download_max_clients: int = 256
+    download_max_connections_per_client: int = 10
+    download_client_idle_timeout: float = 60.0
+    # 直连请求的 DNS 缓存时间（秒），0 表示不缓存；解析失败的缓存时间
+    dns_cache_ttl: float = 300
+    dns_cache_negative_ttl: float = 30
+    # 是否校验 HTTPS 证书
+    download_verify: bool = True
+    # 默认超时时间（秒），可以被 RequestProxy 上的同名配置覆盖
+    download_connect_timeout: float = 5.0
+    download_read_timeout: float = 10.0
+    download_timeout: float | None = 20.0
+    # 响应体最大字节数，超过时中止下载，0 表示不限制
+    download_max_size: int = 10 * 1024 * 1024
+    # 每个目标 host 的限速，单位：请求/秒，0 表示不限速
+    rate_limit: float = 0
+    # 令牌桶容量，允许的突发请求数
+    rate_limit_burst: int = 1
+    # 单独配置某些 host 的限速，例如 {'httpbin.org': 10}
+    rate_limit_hosts: dict[str, float] = dataclasses.field(default_factory=dict)
+    # 被限速推迟的请求最多保留的数量，达到后不再获取新的起始请求，等待推迟的请求到期
+    rate_limit_max_deferred: int = 1000
+    # 下载异常时的最大重试次数，0 表示不重试
+    retry_times: int = 0
+    # 重试的指数退避时间（秒），第 n 次重试在 [0, min(retry_backoff_max, retry_backoff_base * 2 ** n)] 中随机等待
+    retry_backoff_base: float = 0.5
+    retry_backoff_max: float = 10.0
+    # 重试预算，重试次数不超过 请求数 * retry_budget_ratio + retry_budget_min ，避免大面积失败时重试放大请求量
+    retry_budget_ratio: float = 0.1
+    retry_budget_min: int = 10
+    # 对冲请求：请求超过历史耗时的该百分位数还没有响应时，向 spider 提供的备用请求再发起一次请求，
+    # 使用先返回的结果。None 表示不启用
+    hedge_percentile: float | None = None
+    # 至少有多少个耗时样本后才启用对冲请求
+    hedge_min_samples: int = 20
 
     def __post_init__(self):
         """"""
+        if self.engine_mode not in ('worker', 'polling'):
+            raise ValueError(f'Engine mode "{self.engine_mode}" has not implement.')
+        if isinstance(self.scheduler, str) and self.scheduler not in ('fifo', 'priority'):
+            raise ValueError(f'Scheduler "{self.scheduler}" has not implement.')
+        if isinstance(self.dupefilter, str) and self.dupefilter not in ('none', 'set', 'bloom'):
+            raise ValueError(f'Dupefilter "{self.dupefilter}" has not implement.')
+        if self.dupefilter_capacity <= 0 or not 0 < self.dupefilter_error_rate < 1:
+            raise ValueError('dupefilter_capacity must be greater than 0 and dupefilter_error_rate between 0 and 1.')
+        if self.scraper_executor not in ('inline', 'thread', 'process'):
+            raise ValueError(f'Scraper executor "{self.scraper_executor}" has not implement.')
+        if self.item_batch_size <= 0 or self.item_flush_interval < 0 or self.item_queue_size < 0:
+            raise ValueError('item_batch_size must be greater than 0, '
+                             'item_flush_interval and item_queue_size can not be negative.')
+        if self.scheduler_lookahead <= 0:
+            raise ValueError('scheduler_lookahead must be greater than 0.')
+        if self.concurrent_requests <= 0:
+            raise ValueError('concurrent_requests must be greater than 0.')
+        if self.concurrent_requests_per_host < 0 or self.concurrent_requests_per_proxy < 0:
+            raise ValueError('concurrent_requests_per_host and concurrent_requests_per_proxy can not be negative.')
+        if self.rate_limit < 0 or self.rate_limit_burst < 1:
+            raise ValueError('rate_limit can not be negative and rate_limit_burst must be greater than 0.')
+        if self.rate_limit_max_deferred <= 0:
+            raise ValueError('rate_limit_max_deferred must be greater than 0.')
+        if self.hedge_percentile is not None and not 0 < self.hedge_percentile < 100:
+            raise ValueError('hedge_percentile must be between 0 and 100.')
+        for name in ('engine_queue_size', 'downloader_queue_size', 'scraper_queue_size'):
+            if getattr(self, name) is None:
+                setattr(self, name, self.concurrent_requests)
@@ -2,10 +2,12 @@
 Spider
 """
 import abc
+import asyncio
 import inspect
 import logging
 import typing
 from collections.abc import AsyncGenerator, AsyncIterator, Iterator
+from concurrent.futures import Executor
 
 from httpx import URL, Response
 
@@ -27,6 +29,10 @@ class Spider(metaclass=abc.ABCMeta):
     ):
         self.name = name
         self.start_urls = start_urls
+        # 由 Scraper 根据 scraper_executor 配置设置
+        self.executor: Executor | None = None
+        # 由 Scraper 设置，将结果放入 pipeline 批量处理
+        self.item_processor: typing.Callable[[list], typing.Awaitable[None]] | None = None
         for k, v in kwargs.items():
             setattr(self, k, v)
 
@@ -57,6 +63,26 @@ class Spider(metaclass=abc.ABCMeta):
         req = RequestProxy(method='GET', url=url)
         return req
 
+    def alternate_request(self, request: RequestProxy) -> RequestProxy | None:  # noqa
+        """
+        对冲请求时使用的备用请求，返回 None 表示不发起对冲请求。
+        :param request:
+        :return:
+        """
+        return None
+
+    async def run_in_executor(self, func: typing.Callable[..., typing.Any], *args) -> typing.Any:
+        """
+        在 Scraper 的线程池或进程池中执行 CPU 密集的函数，没有执行器时直接调用。
+        使用进程池时 func 和参数都必须可以被 pickle 。
+        :param func:
+        :param args:
+        :return:
+        """
+        if self.executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
     @abc.abstractmethod
     async def parse(self, response: Response) -> typing.Any:
         """
@@ -66,6 +92,26 @@ class Spider(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError()
 
+    async def process_items(self, items: list) -> None:
+        """
+        批量处理 parse 返回的结果，例如在一个事务中写入数据库。
+        parse 返回列表时，列表中的每个元素为一个结果。
+        :param items:
+        :return:
+        """
+
+    async def send_items(self, items: list) -> None:
+        """
+        不经过下载和解析，直接将结果放入 pipeline ，和 parse 的结果一起批量处理。
+        没有打开 spider 时直接交给 process_items 。
+        :param items:
+        :return:
+        """
+        if self.item_processor is None:
+            await self.process_items(items)
+        else:
+            await self.item_processor(items)
+
     async def open_spider(self, **kwargs):
         """open spider"""
 
@@ -0,0 +1,182 @@
+"""
+Stats collector
+"""
+import bisect
+import dataclasses
+import logging
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+# 默认的耗时直方图桶上界（秒），最后一个桶为 +inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@dataclasses.dataclass
+class Histogram:
+    """
+    固定桶的直方图，用于统计耗时分布。
+
+    只记录每个桶的计数，内存占用与样本数量无关。百分位数按桶上界估算。
+    """
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    counts: list[int] = dataclasses.field(init=False)
+    count: int = dataclasses.field(default=0, init=False)
+    sum: float = dataclasses.field(default=0.0, init=False)
+    min: float | None = dataclasses.field(default=None, init=False)
+    max: float | None = dataclasses.field(default=None, init=False)
+
+    def __post_init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float):
+        """
+        记录一个样本
+        :param value:
+        :return:
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self) -> float | None:
+        """平均值"""
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, percentile: float) -> float | None:
+        """
+        估算百分位数，返回样本所在桶的上界，落在最后一个桶时返回最大值。
+        :param percentile: 0 - 100
+        :return:
+        """
+        if not self.count:
+            return None
+        rank = self.count * percentile / 100
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count:
+                if index < len(self.buckets):
+                    return min(self.buckets[index], self.max)
+                return self.max
+        return self.max
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        """
+        转换为 dict ，便于日志输出
+        :return:
+        """
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+@dataclasses.dataclass
+class StatsCollector:
+    """
+    抓取统计
+
+    类似 scrapy 的 StatsCollector ，key 使用 `组件/指标` 的格式，例如：
+        downloader/request_count
+        downloader/response_status_count/200
+        downloader/exception_type_count/ConnectTimeout
+        downloader/latency
+        scraper/item_scraped_count
+    """
+    _stats: dict[str, typing.Any] = dataclasses.field(default_factory=dict, init=False)
+    _histograms: dict[str, Histogram] = dataclasses.field(default_factory=dict, init=False)
+
+    def get_value(self, key: str, default: typing.Any = None) -> typing.Any:
+        """
+        获取统计值
+        :param key:
+        :param default:
+        :return:
+        """
+        return self._stats.get(key, default)
+
+    def set_value(self, key: str, value: typing.Any):
+        """
+        设置统计值
+        :param key:
+        :param value:
+        :return:
+        """
+        self._stats[key] = value
+
+    def inc_value(self, key: str, count: int = 1, start: int = 0):
+        """
+        增加计数
+        :param key:
+        :param count:
+        :param start:
+        :return:
+        """
+        self._stats[key] = self._stats.setdefault(key, start) + count
+
+    def observe(self, key: str, value: float):
+        """
+        向直方图中记录一个样本
+        :param key:
+        :param value:
+        :return:
+        """
+        self._histograms.setdefault(key, Histogram()).observe(value)
+
+    def get_histogram(self, key: str) -> Histogram | None:
+        """
+        获取直方图
+        :param key:
+        :return:
+        """
+        return self._histograms.get(key)
+
+    def get_stats(self) -> dict[str, typing.Any]:
+        """
+        获取全部统计，直方图转换为 dict
+        :return:
+        """
+        stats = dict(self._stats)
+        stats.update({key: histogram.to_dict() for key, histogram in self._histograms.items()})
+        return stats
+
+    def clear(self):
+        """
+        清空统计
+        :return:
+        """
+        self._stats.clear()
+        self._histograms.clear()
+
+    def open_spider(self, spider_name: str):
+        """
+        spider 开始时记录开始时间
+        :param spider_name:
+        :return:
+        """
+        self.set_value('spider_name', spider_name)
+        self.set_value('start_time', time.time())
+
+    def close_spider(self, reason: str = 'finished'):
+        """
+        spider 结束时记录结束时间和运行时长
+        :param reason:
+        :return:
+        """
+        finish_time = time.time()
+        self.set_value('finish_time', finish_time)
+        self.set_value('finish_reason', reason)
+        start_time = self.get_value('start_time')
+        if start_time is not None:
+            self.set_value('elapsed_time_seconds', finish_time - start_time)
+        logger.debug('Dumping crawler stats: %s', self.get_stats())
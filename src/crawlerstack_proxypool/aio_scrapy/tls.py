@@ -0,0 +1,27 @@
+"""
+TLS
+
+创建 SSLContext 需要加载 certifi 的证书文件，每个请求大约消耗数毫秒的 CPU 时间。
+SSLContext 是线程安全的，所以在进程内共享同一个对象。
+"""
+import functools
+import ssl
+
+import httpx
+from httpx._types import CertTypes, VerifyTypes
+
+
+def get_ssl_context(verify: VerifyTypes = True, cert: CertTypes = None) -> ssl.SSLContext:
+    """
+    获取共享的 SSLContext ，相同参数只会创建一次。
+    :param verify: 是否校验证书，或者 CA 证书文件路径
+    :param cert: 客户端证书
+    :return:
+    """
+    # lru_cache 会区分位置参数和关键字参数，统一使用位置参数调用
+    return _create_ssl_context(verify, cert)
+
+
+@functools.lru_cache(maxsize=None)
+def _create_ssl_context(verify: VerifyTypes, cert: CertTypes) -> ssl.SSLContext:
+    return httpx.create_ssl_context(verify=verify, cert=cert)
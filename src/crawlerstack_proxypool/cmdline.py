@@ -8,7 +8,8 @@ import click
 
 from crawlerstack_proxypool import __version__
 from crawlerstack_proxypool.config import settings
-from crawlerstack_proxypool.manage import ProxyPool
+from crawlerstack_proxypool.manage import ProxyPool, WorkerProcesses
+from crawlerstack_proxypool.utils import EVENT_LOOPS, setup_event_loop
 
 
 @click.group(invoke_without_command=True)
@@ -30,19 +31,58 @@ def main(ctx, version, verbose):
 @click.option('-p', '--port', default=8080, show_default=True, help='Port')
 @click.option('--level', help='Log level')
 @click.option('--file', help='logfile')
-def api(host, port, level, file):
+@click.option('--loop', type=click.Choice(EVENT_LOOPS), help='Event loop, default use `loop` in settings.')
+def api(host, port, level, file, loop):
     """Api cmd."""
     kwargs = {
         'LOGLEVEL': level,
         'LOGFILE': file,
         'HOST': host,
         'PORT': port,
+        'LOOP': loop,
     }
     for name, value in kwargs.items():
         if value:
             settings.set(name, value)
+    setup_event_loop(settings.get('LOOP', 'auto'))
     asyncio.run(ProxyPool(settings).start())
 
 
+@main.command()
+@click.option('-h', '--host', default='0.0.0.0', show_default=True, help='Host IP')
+@click.option('-p', '--port', default=8080, show_default=True, help='Port')
+@click.option('-n', '--processes', default=2, show_default=True, type=click.IntRange(min=1),
+              help='Number of task worker processes, must be 1 when using sqlite')
+@click.option('--level', help='Log level')
+@click.option('--file', help='logfile')
+@click.option('--loop', type=click.Choice(EVENT_LOOPS), help='Event loop, default use `loop` in settings.')
+def worker(host, port, processes, level, file, loop):
+    """
+    Run tasks in multiple worker processes, the main process only serves the api.
+    Worker processes share the database and trigger each other's tasks via redis,
+    sqlite does not support concurrent writes from multiple processes.
+    """
+    if processes > 1 and str(settings.DATABASE).startswith('sqlite'):
+        raise click.BadParameter('sqlite does not support multiple processes, use 1.', param_hint='--processes')
+    kwargs = {
+        'LOGLEVEL': level,
+        'LOGFILE': file,
+        'HOST': host,
+        'PORT': port,
+        'LOOP': loop,
+    }
+    overrides = {}
+    for name, value in kwargs.items():
+        if value:
+            settings.set(name, value)
+            overrides[name] = value
+    if settings.get('VERBOSE'):
+        overrides['VERBOSE'] = True
+    loop = settings.get('LOOP', 'auto')
+    workers = WorkerProcesses(processes=processes, overrides=overrides, loop=loop)
+    setup_event_loop(loop)
+    asyncio.run(ProxyPool(settings, run_tasks=False, workers=workers).start())
+
+
 if __name__ == '__main__':
     main()  # pylint: disable=no-value-for-parameter
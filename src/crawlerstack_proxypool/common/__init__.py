@@ -1,8 +1,7 @@
 """common"""
 from typing import Type, cast
 
-from crawlerstack_proxypool.common.checker import (AnonymousChecker,
-                                                   KeywordChecker)
+from crawlerstack_proxypool.common.checker import get_checker
 from crawlerstack_proxypool.common.extractor import (BaseExtractor,
                                                      HtmlExtractor,
                                                      JsonExtractor)
@@ -74,8 +73,4 @@ class CheckParser(Parser):
     """
 
     def factory(self, name: str):
-        if name == 'keyword':
-            return KeywordChecker
-        if name == 'anonymous':
-            return AnonymousChecker
-        raise ValueError(f'Checker {name} has not implement.')
+        return get_checker(name)
@@ -0,0 +1,97 @@
+"""
+Anonymity
+
+根据校验地址回显的请求头判断代理IP的匿名等级。
+"""
+import enum
+import functools
+import json
+import re
+
+# 代理服务器可能添加的、会暴露客户端真实IP或者代理身份的请求头
+PROXY_HEADERS = (
+    'via',
+    'forwarded',
+    'forwarded-for',
+    'x-forwarded-for',
+    'x-forwarded-host',
+    'x-forwarded-proto',
+    'x-real-ip',
+    'x-client-ip',
+    'client-ip',
+    'true-client-ip',
+    'x-originating-ip',
+    'x-proxy-id',
+    'proxy-connection',
+)
+
+
+class AnonymityLevel(enum.IntEnum):
+    """
+    匿名等级，值越大越匿名
+    """
+    # 目标服务器可以获取到本地公网IP
+    TRANSPARENT = 1
+    # 目标服务器获取不到本地公网IP，但是可以知道使用了代理
+    ANONYMOUS = 2
+    # 目标服务器无法知道使用了代理
+    ELITE = 3
+
+
+def parse_echoed_headers(content: bytes) -> dict[str, str] | None:
+    """
+    解析校验地址回显的请求头，支持内置的 judge 接口和 httpbin 的 /headers 、/anything 等接口：
+        {"origin": "...", "headers": {"Via": "1.1 squid"}}
+    没有回显请求头时返回 None 。
+    :param content:
+    :return: key 为小写的请求头名称
+    """
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+    headers = data.get('headers') if isinstance(data, dict) else None
+    if not isinstance(headers, dict):
+        return None
+    return {str(k).lower(): str(v) for k, v in headers.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def ip_pattern(ip: str) -> re.Pattern:
+    """
+    匹配完整IP的正则，IP前后不能紧挨着IP中可能出现的字符，避免 1.2.3.4 匹配到 11.2.3.45 。
+    IPv4 后面可以跟端口，例如 1.2.3.4:8080 。
+    :param ip:
+    :return:
+    """
+    chars = rb'[\w.:]' if ':' in ip else rb'[\w.]'
+    return re.compile(rb'(?<!' + chars + rb')' + re.escape(ip.encode()) + rb'(?!' + chars + rb')')
+
+
+def contains_ip(content: bytes, ip: str) -> bool:
+    """
+    内容中是否包含完整的IP
+    :param content:
+    :param ip:
+    :return:
+    """
+    return ip_pattern(ip).search(content) is not None
+
+
+def classify_anonymity(content: bytes, public_ip: str) -> AnonymityLevel:
+    """
+    判断代理IP的匿名等级：
+        响应中出现本地公网IP：透明
+        回显的请求头中有暴露代理的请求头：匿名
+        回显了请求头并且没有暴露代理的请求头：高匿
+    校验地址没有回显请求头时无法区分匿名和高匿，按匿名处理。
+    :param content: 校验地址的响应内容
+    :param public_ip: 本地公网IP
+    :return:
+    """
+    if public_ip and contains_ip(content, public_ip):
+        return AnonymityLevel.TRANSPARENT
+    headers = parse_echoed_headers(content)
+    if headers is None or any(name in headers for name in PROXY_HEADERS):
+        return AnonymityLevel.ANONYMOUS
+    return AnonymityLevel.ELITE
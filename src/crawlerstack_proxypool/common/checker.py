@@ -1,15 +1,25 @@
-import asyncio
+import codecs
 import dataclasses
-import random
-from typing import TypeVar
+import logging
+import re
+from typing import Any, Type, TypeVar
 
 from httpx import URL, Response
 
-from crawlerstack_proxypool.aio_scrapy.downloader import DownloadHandler
-from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.req_resp import Timing
 from crawlerstack_proxypool.aio_scrapy.spider import Spider
+from crawlerstack_proxypool.common.anonymity import (AnonymityLevel,
+                                                     classify_anonymity,
+                                                     ip_pattern)
 from crawlerstack_proxypool.common.extractor import (BaseExtractor,
                                                      ExtractorKwargs)
+from crawlerstack_proxypool.common.prefilter import Prefilter
+from crawlerstack_proxypool.common.public_ip import (DEFAULT_PUBLIC_IP_URLS,
+                                                     PublicIPService,
+                                                     get_public_ip_service)
+from crawlerstack_proxypool.signals import spider_closed, spider_opened
+
+logger = logging.getLogger(__name__)
 
 
 @dataclasses.dataclass
@@ -20,6 +30,10 @@ class CheckedProxy:
     url: URL
     alive: bool
     alive_status: int = dataclasses.field(default=None)
+    # 校验请求的耗时，单位秒
+    elapsed: float | None = None
+    # 匿名等级，只有匿名校验器会设置
+    anonymity: AnonymityLevel | None = None
 
     def __post_init__(self):
         if self.alive:
@@ -31,11 +45,100 @@ class CheckedProxy:
 class BaseChecker(BaseExtractor):
     """
     抽象校验器
+
+    支持流式检查的校验器将 STREAMING 设置为 True 并实现 feed 方法。
+    下载时每读取一块响应数据调用一次 feed ，得出结论后停止读取并关闭连接，
+    结论保存在 response.extensions 中，check 时可以通过 get_verdict 获取。
     """
+    # 是否支持流式检查
+    STREAMING = False
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        支持流式检查的校验器必须实现 feed 方法
+        :param kwargs:
+        :return:
+        """
+        super().__init_subclass__(**kwargs)
+        if cls.STREAMING and cls.feed is BaseChecker.feed:
+            raise TypeError(f'Streaming checker {cls.__name__} must implement feed.')
 
     async def parse(self, response: Response, **kwargs):
         return await self.check(response)
 
+    def feed(self, response: Response, chunk: bytes) -> bool | None:
+        """
+        流式检查一块响应数据，只有 STREAMING 为 True 的校验器需要实现。
+        需要保存的中间状态通过 get_state 、set_state 保存在 response 上，同一个校验器可以同时处理多个请求。
+        :param response:
+        :param chunk:
+        :return: 已经可以得出结论时返回是否可用，否则返回 None 继续读取
+        """
+        raise NotImplementedError()
+
+    def consume(self, response: Response, chunk: bytes) -> bool:
+        """
+        作为 RequestProxy.body_consumer 使用，得出结论时返回 True 停止读取。
+        不支持流式检查的校验器始终读取完整的响应。
+        :param response:
+        :param chunk:
+        :return:
+        """
+        if not self.STREAMING:
+            return False
+        verdict = self.feed(response, chunk)
+        if verdict is None:
+            return False
+        self.set_verdict(response, verdict)
+        return True
+
+    def get_verdict(self, response: Response) -> bool | None:
+        """
+        获取流式检查得出的结论，没有结论时返回 None
+        结论和中间状态都按校验器区分，组合多个校验器时互不影响。
+        :param response:
+        :return:
+        """
+        return response.extensions.get(('check_verdict', id(self)))
+
+    def set_verdict(self, response: Response, verdict: bool):
+        """
+        保存流式检查得出的结论
+        :param response:
+        :param verdict:
+        :return:
+        """
+        response.extensions[('check_verdict', id(self))] = verdict
+
+    @staticmethod
+    def get_elapsed(response: Response) -> float | None:
+        """
+        校验请求的耗时（秒），从下载器记录的 Timing 中获取。流式检查提前结束时，只包含已经读取部分的耗时。
+        :param response:
+        :return:
+        """
+        timing = response.extensions.get('timing')
+        if isinstance(timing, Timing):
+            return timing.total
+        return None
+
+    def get_state(self, response: Response) -> Any:
+        """
+        获取流式检查的中间状态
+        :param response:
+        :return:
+        """
+        return response.extensions.get(('check_state', id(self)))
+
+    def set_state(self, response: Response, state: Any):
+        """
+        保存流式检查的中间状态
+        :param response:
+        :param state:
+        :return:
+        """
+        response.extensions[('check_state', id(self))] = state
+
     async def check(self, response: Response) -> CheckedProxy:
         """
         检查逻辑
@@ -57,6 +160,118 @@ class KeywordCheckKwargs(ExtractorKwargs):
     any: bool = False
 
 
+# 在 HTML 开头声明的编码，例如 <meta charset="gbk"> 或者 content="text/html; charset=gbk"
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def sniff_encoding(response: Response, content: bytes | None = None, default: str = 'utf-8') -> str:
+    """
+    获取响应内容的编码，不做字符集探测。
+    依次使用响应头中的 charset 、HTML 开头 meta 标签中的 charset ，都没有时使用 default 。
+    :param response:
+    :param content: 响应内容的开头部分，流式读取时使用，为 None 时使用 response.content
+    :param default:
+    :return:
+    """
+    encoding = response.charset_encoding
+    if not encoding:
+        if content is None:
+            content = response.content
+        match = _META_CHARSET.search(content[:1024])
+        if match:
+            encoding = match.group(1).decode('ascii')
+    try:
+        return codecs.lookup(encoding).name if encoding else default
+    except LookupError:
+        return default
+
+
+@dataclasses.dataclass
+class KeywordMatchState:
+    """
+    流式匹配的状态
+    """
+    # 还没有匹配到的关键词
+    remaining: set[bytes]
+    # 上一块数据的末尾
+    tail: bytes = b''
+
+
+class KeywordMatcher:
+    """
+    多关键词匹配
+
+    将关键词按编码转换为字节后编译成一个正则，在原始响应内容上只扫描一遍。
+    any 模式找到第一个关键词就返回；all 模式找齐所有关键词就返回。
+
+    all 模式使用零宽的先行断言在每个位置匹配，关键词按长度从长到短排列，
+    每个位置匹配到的是以该位置开头的最长关键词，被它包含的关键词也一定出现过。
+    """
+
+    def __init__(self, keywords: list[str], encoding: str = 'utf-8', any_: bool = False):
+        """
+        :param keywords:
+        :param encoding: 响应内容的编码
+        :param any_: 是否只需要匹配任意一个关键词
+        """
+        self.any = any_
+        encoded = set()
+        # 当前编码无法表示的关键词不可能出现在响应中
+        self.unencodable = False
+        for keyword in keywords:
+            try:
+                encoded.add(keyword.encode(encoding))
+            except UnicodeEncodeError:
+                self.unencodable = True
+        self.keywords = sorted(encoded, key=len, reverse=True)
+        # 每个关键词包含的关键词（包括自身）
+        self._contains = {
+            keyword: {other for other in self.keywords if other in keyword}
+            for keyword in self.keywords
+        }
+        alternation = b'|'.join(re.escape(keyword) for keyword in self.keywords)
+        self._pattern = re.compile(alternation if any_ else b'(?=(' + alternation + b'))')
+        # 流式匹配时保留上一块数据末尾的字节数，用于匹配跨越两块数据的关键词
+        self._tail_size = max(map(len, self.keywords), default=1) - 1
+
+    def new_state(self) -> KeywordMatchState:
+        """
+        创建流式匹配的状态
+        :return:
+        """
+        return KeywordMatchState(remaining=set(self.keywords))
+
+    def match(self, content: bytes) -> bool:
+        """
+        检查内容是否匹配关键词
+        :param content:
+        :return:
+        """
+        return self.feed(self.new_state(), content)
+
+    def feed(self, state: KeywordMatchState, chunk: bytes) -> bool:
+        """
+        流式匹配一块数据，匹配状态保存在 state 中。
+        :param state:
+        :param chunk:
+        :return: 到目前为止已经匹配成功时返回 True
+        """
+        if not self.keywords:
+            # 与 any([]) 、all([]) 的结果一致
+            return not self.any and not self.unencodable
+        if not self.any and self.unencodable:
+            return False
+        buffer = state.tail + chunk
+        state.tail = buffer[max(0, len(buffer) - self._tail_size):] if self._tail_size else b''
+        if self.any:
+            return self._pattern.search(buffer) is not None
+        for match in self._pattern.finditer(buffer):
+            state.remaining.difference_update(self._contains[match.group(1)])
+            if not state.remaining:
+                return True
+        return False
+
+
 class KeywordChecker(BaseChecker):
     """
     关键词校验器
@@ -65,30 +280,72 @@ class KeywordChecker(BaseChecker):
     请求的结果是否存在关键词。如果存在则说明代理IP请求正常，否则请求异常。
     """
     KWARGS_KLS = KeywordCheckKwargs
+    STREAMING = True
+
+    def __init__(self, spider: Spider):
+        super().__init__(spider)
+        # 按编码缓存编译好的关键词匹配器
+        self._matchers: dict[str, KeywordMatcher] = {}
 
     async def check(self, response: Response) -> CheckedProxy:
         alive = False
         if response.status_code == 200:
-            if self.check_keywords(response.text):
-                alive = True
+            verdict = self.get_verdict(response)
+            if verdict is None:
+                if self.get_state(response) is None:
+                    # 没有流式检查，检查完整的响应内容
+                    verdict = self.check_keywords(response.content, sniff_encoding(response))
+                else:
+                    # 流式检查已经读取了全部内容仍然没有匹配到关键词，不需要再检查一遍
+                    verdict = False
+            alive = verdict
 
-        return CheckedProxy(url=response.request.headers.get('proxy'), alive=alive)
+        return CheckedProxy(
+            url=response.request.headers.get('proxy'),
+            alive=alive,
+            elapsed=self.get_elapsed(response),
+        )
 
-    def check_keywords(self, text: str) -> bool:
+    def feed(self, response: Response, chunk: bytes) -> bool | None:
         """
-        检查文本中是否包含官监察。
-        :param text:
+        状态码不是 200 时直接得出结论，匹配到关键词后不再读取剩余内容。
+        关键词没有匹配完时需要读取到最后才能确定。
+        :param response:
+        :param chunk:
         :return:
         """
-        checked = []
-        for keyword in self.kwargs.keywords:
-            if keyword in text:
-                checked.append(True)
-            else:
-                checked.append(False)
-        if self.kwargs.any:
-            return any(checked)
-        return all(checked)
+        if response.status_code != 200:
+            return False
+        state = self.get_state(response)
+        if state is None:
+            matcher = self.get_matcher(sniff_encoding(response, chunk))
+            state = (matcher, matcher.new_state())
+            self.set_state(response, state)
+        matcher, match_state = state
+        if matcher.feed(match_state, chunk):
+            return True
+        return None
+
+    def get_matcher(self, encoding: str = 'utf-8') -> KeywordMatcher:
+        """
+        获取指定编码的关键词匹配器，每种编码只编译一次。
+        :param encoding:
+        :return:
+        """
+        matcher = self._matchers.get(encoding)
+        if matcher is None:
+            matcher = KeywordMatcher(self.kwargs.keywords, encoding, self.kwargs.any)
+            self._matchers[encoding] = matcher
+        return matcher
+
+    def check_keywords(self, content: bytes, encoding: str = 'utf-8') -> bool:
+        """
+        检查原始响应内容中是否包含关键词。
+        :param content:
+        :param encoding: 响应内容的编码
+        :return:
+        """
+        return self.get_matcher(encoding).match(content)
 
 
 @dataclasses.dataclass
@@ -97,6 +354,10 @@ class AnonymousKwargs(ExtractorKwargs):
     严格模式。
     """
     strict: bool = False
+    # 获取本地公网IP的地址，按顺序尝试，默认使用 DEFAULT_PUBLIC_IP_URLS
+    public_ip_urls: list[str] | None = None
+    # 本地公网IP的缓存时间（秒）
+    public_ip_ttl: float = 15
 
 
 class AnonymousChecker(BaseChecker):
@@ -109,33 +370,45 @@ class AnonymousChecker(BaseChecker):
         通过访问一些能返回公网IP地址的站点（自己搭建或互联网的页面），得到当前本地公网IP，然后再通过代理IP请求该
         网站。如果两者的IP一致，则说明代理IP并没有起到代理的作用；如果不一致，则使用代理IP时伪装了实际公网IP，
         则说明该代理为匿名。
+        再根据校验地址回显的请求头（例如 Via 、X-Forwarded-For ）区分匿名和高匿，见 classify_anonymity 。
         对于非静态IP的宽带，需要注意IP是由运营商随机分配的，而且不定时改变，所以后台需要有轮询任务，间隔一定时间
         更新本地公网IP的值。
+        公网IP由进程内共享的 PublicIPService 获取和刷新，多个校验任务同时运行时也只有一个轮询任务。
 
     """
     KWARGS_KLS = AnonymousKwargs
+    STREAMING = True
 
     def __init__(self, spider: Spider):
         """"""
         super().__init__(spider)
+        self._public_ip_service: PublicIPService | None = None
+        spider_opened.connect(self.open_spider, sender=self.spider)
+        spider_closed.connect(self.close_spider, sender=self.spider)
+
+    @property
+    def public_ip_service(self) -> PublicIPService:
+        """
+        进程内共享的公网IP服务，相同配置的校验器共用。
+        :return:
+        """
+        if self._public_ip_service is None:
+            urls = tuple(self.kwargs.public_ip_urls or DEFAULT_PUBLIC_IP_URLS)
+            self._public_ip_service = get_public_ip_service(urls, self.kwargs.public_ip_ttl)
+        return self._public_ip_service
 
-        self._download_handler = DownloadHandler()
-        self._public_ip = ''
-        self._refresh_ip_task: asyncio.Task | None = None
-        self._running = False
-        # 可以用信号绑定到 spider 上，也可以直接在 spider 的 open_spider 和 close_spider 中调用。
-        # spider_opened.connect(self.open_spider, sender=self.spider)
-        # spider_closed.connect(self.close_spider, sender=self.spider)
+    @property
+    def _public_ip(self) -> str:
+        return self.public_ip_service.ip
 
     async def open_spider(self, **_kwargs):
         """
         Run when spider opened.
+        订阅公网IP服务，由服务在后台定时刷新。
         :param _kwargs:
         :return:
         """
-        self._running = True
-        loop = asyncio.get_running_loop()
-        self._refresh_ip_task = loop.create_task(self.refresh_public_ip())
+        self.public_ip_service.subscribe(self)
 
     async def close_spider(self, **_kwargs):
         """
@@ -143,32 +416,31 @@ class AnonymousChecker(BaseChecker):
         :param _kwargs:
         :return:
         """
-        self._running = False
-        await asyncio.sleep(0)
-        self._refresh_ip_task.cancel()
-        await self._download_handler.close()
+        self.public_ip_service.unsubscribe(self)
 
-    async def refresh_public_ip(self):
+    async def get_public_ip(self) -> str:
         """
-        间隔 10-20 秒中的随机数更新本地公网IP地址，用来判断代理IP识别的公网IP和本地公网IP是否一致。
+        获取当前公网IP，只有第一次获取时需要等待，之后直接返回缓存的值。
         :return:
         """
-        while self._running:
-            await self.get_public_ip()
-            delay = random.randint(10, 20)
-            await asyncio.sleep(delay)
+        return await self.public_ip_service.get()
 
-    async def get_public_ip(self):
+    def feed(self, response: Response, chunk: bytes) -> bool | None:
         """
-        获取最新当前公网IP，并更新变量
+        在响应中发现本地公网IP时（透明代理）不再读取剩余内容，没有发现时需要读取到最后才能确定。
+        IP 在当前数据末尾时，需要下一块数据才能确定是否是完整的IP，所以保留末尾的 IP 长度 + 1 个字节。
+        :param response:
+        :param chunk:
         :return:
         """
-        request = RequestProxy(method='GET', url=URL('https://httpbin.iclouds.work/ip'))
-        # response: "{"origin": "100.247.100.254"}"
-        # response: "{"origin": "139.227.236.141, 123.13.247.40"}"
-        response = await self._download_handler.download(request)
-        self._public_ip = response.json().get('origin')
-        self.spider.logger.debug(f'Refresh public ip: "{self._public_ip}"')
+        if not self._public_ip:
+            return None
+        buffer = (self.get_state(response) or b'') + chunk
+        for match in ip_pattern(self._public_ip).finditer(buffer):
+            if match.end() < len(buffer):
+                return False
+        self.set_state(response, buffer[max(0, len(buffer) - len(self._public_ip) - 1):])
+        return None
 
     async def check(self, response: Response):
         """
@@ -177,14 +449,130 @@ class AnonymousChecker(BaseChecker):
         :param response:
         :return:
         """
-        if not self._public_ip:
-            await self.get_public_ip()
+        public_ip = await self.get_public_ip()
         alive = False
+        anonymity = None
         proxy: URL = response.request.extensions.get('proxy')
+        if self.get_verdict(response) is False:
+            # 流式检查时已经在响应中发现了本地公网IP
+            return CheckedProxy(
+                url=proxy,
+                alive=alive,
+                elapsed=self.get_elapsed(response),
+                anonymity=AnonymityLevel.TRANSPARENT,
+            )
         if response.status_code:
-            if self._public_ip not in response.text:
+            anonymity = classify_anonymity(response.content, public_ip)
+            if anonymity > AnonymityLevel.TRANSPARENT:
                 if self.kwargs.strict and proxy.host in response.text:
                     alive = True
                 else:
                     alive = True
-        return CheckedProxy(url=proxy, alive=alive)
+        return CheckedProxy(url=proxy, alive=alive, elapsed=self.get_elapsed(response), anonymity=anonymity)
+
+
+@dataclasses.dataclass
+class StagedKwargs(ExtractorKwargs):
+    """
+    分阶段校验参数
+
+    stages 中每一项是一个阶段的配置，name 为阶段名称，其余为该阶段的参数：
+        tcp: 只建立 TCP 连接，参数 timeout 、concurrency
+        connect: 建立连接后发送 CONNECT 请求，参数 target 、timeout 、concurrency
+        keyword 、anonymous: 对应校验器的参数
+    tcp 、connect 在发起 HTTP 请求前执行，必须配置在其他阶段之前。
+    """
+    stages: list[dict] = dataclasses.field(default_factory=list)
+
+
+class StagedChecker(BaseChecker):
+    """
+    分阶段校验器
+
+    按配置顺序执行多个阶段，代价低的阶段在前，某个阶段不通过时不再执行后面的阶段。
+    tcp 、connect 阶段转换为 Prefilter ，在发起 HTTP 请求前过滤掉无法连接的代理IP；
+    其余阶段共用同一个 HTTP 响应，流式检查时任意阶段得出不可用的结论就停止读取。
+    所有阶段都通过时，合并各阶段结果中不为 None 的 MERGE_FIELDS 字段，后面的阶段优先。
+    """
+    KWARGS_KLS = StagedKwargs
+    STREAMING = True
+    NETWORK_STAGES = ('tcp', 'connect')
+    MERGE_FIELDS = ('anonymity',)
+
+    def __init__(self, spider: Spider):
+        super().__init__(spider)
+        self.stages: list[BaseChecker] = []
+        self.prefilter: Prefilter | None = None
+
+    def init_kwargs(self, **kwargs):
+        super().init_kwargs(**kwargs)
+        prefilter_kwargs = {}
+        for config in self.kwargs.stages:
+            config = dict(config)
+            name = config.pop('name')
+            if name in self.NETWORK_STAGES:
+                if self.stages:
+                    raise ValueError(f'Stage "{name}" must be configured before http stages.')
+                if name == 'connect':
+                    prefilter_kwargs['connect_target'] = config.pop('target')
+                prefilter_kwargs.update(config)
+            elif name == 'staged':
+                raise ValueError('Stage "staged" can not be nested.')
+            else:
+                self.stages.append(get_checker(name).from_kwargs(self.spider, **config))
+        if prefilter_kwargs:
+            self.prefilter = Prefilter(**prefilter_kwargs)
+
+    def feed(self, response: Response, chunk: bytes) -> bool | None:
+        """
+        依次交给各个阶段检查，任意阶段不通过时返回 False ，所有阶段都通过时返回 True 。
+        :param response:
+        :param chunk:
+        :return:
+        """
+        decided = True
+        for stage in self.stages:
+            verdict = stage.get_verdict(response)
+            if verdict is None and stage.STREAMING:
+                verdict = stage.feed(response, chunk)
+                if verdict is not None:
+                    stage.set_verdict(response, verdict)
+            if verdict is False:
+                return False
+            if verdict is None:
+                decided = False
+        return True if decided else None
+
+    async def check(self, response: Response) -> CheckedProxy:
+        proxy: URL = response.request.extensions.get('proxy')
+        elapsed = self.get_elapsed(response)
+        result = CheckedProxy(url=proxy, alive=True, elapsed=elapsed)
+        for stage in self.stages:
+            checked = await stage.check(response)
+            if not checked.alive:
+                logger.debug('Proxy %s failed in stage %s.', proxy, type(stage).__name__)
+                # 保留不通过阶段的匿名等级，例如透明代理
+                return CheckedProxy(url=proxy, alive=False, elapsed=elapsed, anonymity=checked.anonymity)
+            for name in self.MERGE_FIELDS:
+                value = getattr(checked, name)
+                if value is not None:
+                    setattr(result, name, value)
+        return result
+
+
+CHECKERS: dict[str, Type[BaseChecker]] = {
+    'keyword': KeywordChecker,
+    'anonymous': AnonymousChecker,
+    'staged': StagedChecker,
+}
+
+
+def get_checker(name: str) -> Type[BaseChecker]:
+    """
+    根据名称获取校验器
+    :param name:
+    :return:
+    """
+    if name not in CHECKERS:
+        raise ValueError(f'Checker {name} has not implement.')
+    return CHECKERS[name]
@@ -121,42 +121,56 @@ class HtmlExtractor(BaseExtractor):
     KWARGS_KLS: Type[HtmlExtractorKwargs] = HtmlExtractorKwargs
 
     async def parse(self, response: Response, **kwargs):
-        html = etree.HTML(response.text)
+        return await self.spider.run_in_executor(self.extract, response.content, response.encoding, self.kwargs)
+
+    @classmethod
+    def extract(cls, content: bytes, encoding: str, kwargs: HtmlExtractorKwargs) -> list[str]:
+        """
+        解析 html 。
+        不依赖 extractor 实例和 response ，可以在进程池中执行。
+        :param content: 响应内容
+        :param encoding: 响应编码
+        :param kwargs:
+        :return:
+        """
+        html = etree.HTML(content.decode(encoding or 'utf-8', errors='replace'))
         items = []
-        rows = html.xpath(self._kwargs.rows_rule)[self._kwargs.row_start:]
-        if self._kwargs.row_end is not None:
-            rows = rows[:self._kwargs.row_end]
+        rows = html.xpath(kwargs.rows_rule)[kwargs.row_start:]
+        if kwargs.row_end is not None:
+            rows = rows[:kwargs.row_end]
 
         for row in rows:
             row_html = etree.tostring(row).decode()
             if '透明' in row_html or 'transparent' in row_html.lower():
                 continue
-            proxy_ip = self.parse_row(row=row)
+            proxy_ip = cls.parse_row(row, kwargs)
             if proxy_ip:
                 items.extend(proxy_ip)
         return items
 
-    def parse_row(self, row: Element) -> list[str] | None:
+    @staticmethod
+    def parse_row(row: Element, kwargs: HtmlExtractorKwargs) -> list[str] | None:
         """
         parse a row
         :param row:
+        :param kwargs:
         :return: 127.0.0.1:1080 / ''
         """
         row_html = etree.tostring(row).decode()
         try:
             proxy_ip = ''
-            if self._kwargs.columns_rule:
-                columns = row.xpath(self._kwargs.columns_rule)
+            if kwargs.columns_rule:
+                columns = row.xpath(kwargs.columns_rule)
                 if columns:
-                    _ip = columns[self._kwargs.ip_position]
+                    _ip = columns[kwargs.ip_position]
                     proxy_ip = _ip.text
-                    if self._kwargs.ip_rule:
-                        proxy_ip = _ip.xpath(self._kwargs.ip_rule)[0]
-                    if self._kwargs.port_position:
-                        port = columns[self._kwargs.port_position]
+                    if kwargs.ip_rule:
+                        proxy_ip = _ip.xpath(kwargs.ip_rule)[0]
+                    if kwargs.port_position:
+                        port = columns[kwargs.port_position]
                         port_str = port.text
-                        if self._kwargs.port_rule:
-                            port_str = port.xpath(self._kwargs.port_rule)[0]
+                        if kwargs.port_rule:
+                            port_str = port.xpath(kwargs.port_rule)[0]
                         proxy_ip = f'{proxy_ip}:{port_str}'
             else:
                 proxy_ip = row_html
@@ -193,12 +207,24 @@ class JsonExtractor(BaseExtractor):  # pylint: disable=too-few-public-methods
         :param response: scrapy response
         :return: ip infos
         """
-        infos = json.loads(response.text)
+        return await self.spider.run_in_executor(self.extract, response.content, response.encoding, self.kwargs)
+
+    @classmethod
+    def extract(cls, content: bytes, encoding: str, kwargs: JsonExtractorKwargs) -> list[str]:
+        """
+        解析 json 。
+        不依赖 extractor 实例和 response ，可以在进程池中执行。
+        :param content: 响应内容
+        :param encoding: 响应编码
+        :param kwargs:
+        :return: ip infos
+        """
+        infos = json.loads(content.decode(encoding or 'utf-8', errors='replace'))
         items = []
         for info in infos:
             try:
-                _ip = info.get(self._kwargs.ip_key)
-                port = info.get(self._kwargs.port_key)
+                _ip = info.get(kwargs.ip_key)
+                port = info.get(kwargs.port_key)
                 if not proxy_check(_ip, port):
                     continue
 
@@ -0,0 +1,103 @@
+"""
+Prefilter
+
+在完整的 HTTP 校验之前，使用 TCP 连接（可选 CONNECT 握手）快速过滤掉不可用的代理IP。
+"""
+import asyncio
+import dataclasses
+import logging
+from collections.abc import AsyncGenerator, AsyncIterable, Iterable
+
+from httpx import URL
+
+logger = logging.getLogger(__name__)
+
+# 代理 url 没有端口时，按协议使用的默认端口
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+@dataclasses.dataclass
+class Prefilter:
+    """
+    TCP 连接预过滤
+
+    只建立 TCP 连接，不发送 HTTP 请求，使用很短的超时时间和很高的并发快速过滤掉大部分失效的代理IP。
+    如果配置了 connect_target ，连接成功后再发送 CONNECT 请求，响应 2xx 才认为可用。
+    """
+    # 超时时间（秒），包含建立连接和 CONNECT 握手
+    timeout: float = 1.0
+    # 最大并发数
+    concurrency: int = 500
+    # CONNECT 握手的目标地址，例如 example.com:443 ，为 None 时只检查 TCP 连接
+    connect_target: str | None = None
+
+    def __post_init__(self):
+        if self.timeout <= 0 or self.concurrency <= 0:
+            raise ValueError('Prefilter timeout and concurrency must be greater than 0.')
+
+    async def check(self, url: URL | str) -> bool:
+        """
+        检查代理IP是否可以连接
+        :param url:
+        :return:
+        """
+        url = URL(url)
+        try:
+            return await asyncio.wait_for(self._check(url.host, url.port or DEFAULT_PORTS.get(url.scheme, 80)), self.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as ex:
+            logger.debug('Prefilter %s failed. %r', url, ex)
+            return False
+
+    async def _check(self, host: str, port: int) -> bool:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            if not self.connect_target:
+                return True
+            writer.write(
+                f'CONNECT {self.connect_target} HTTP/1.1\r\nHost: {self.connect_target}\r\n\r\n'.encode()
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            parts = status_line.split(maxsplit=2)
+            return len(parts) >= 2 and parts[0].startswith(b'HTTP/') and parts[1].startswith(b'2')
+        finally:
+            writer.close()
+
+    async def filter(
+            self,
+            urls: Iterable[URL | str] | AsyncIterable[URL | str]
+    ) -> AsyncGenerator[tuple[URL | str, bool], None]:
+        """
+        并发检查代理IP，按完成顺序返回检查结果。
+        最多同时检查 concurrency 个，不会一次性读取全部 urls 。
+        :param urls:
+        :return: (url, 是否可用)
+        """
+        pending: set[asyncio.Task] = set()
+        tasks: dict[asyncio.Task, URL | str] = {}
+        try:
+            async for url in self._iter(urls):
+                if len(pending) >= self.concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield tasks.pop(task), task.result()
+                task = asyncio.create_task(self.check(url))
+                tasks[task] = url
+                pending.add(task)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield tasks.pop(task), task.result()
+        finally:
+            # 提前结束迭代时取消还没有完成的检查
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def _iter(urls: Iterable[URL | str] | AsyncIterable[URL | str]) -> AsyncGenerator[URL | str, None]:
+        if isinstance(urls, AsyncIterable):
+            async for url in urls:
+                yield url
+        else:
+            for url in urls:
+                yield url
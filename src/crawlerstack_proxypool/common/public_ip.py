@@ -0,0 +1,184 @@
+"""
+Public IP
+
+进程内共享的本地公网IP服务，所有匿名校验器使用同一份缓存。
+"""
+import asyncio
+import dataclasses
+import functools
+import ipaddress
+import json
+import logging
+import random
+import time
+import typing
+
+from crawlerstack_proxypool.aio_scrapy.downloader import DownloadHandler
+from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.exceptions import PublicIPError
+
+logger = logging.getLogger(__name__)
+
+# 返回公网IP的地址，按顺序尝试，前一个失败时使用下一个
+DEFAULT_PUBLIC_IP_URLS = (
+    'https://httpbin.iclouds.work/ip',
+    'https://api.ipify.org?format=json',
+    'https://ifconfig.me/ip',
+)
+
+
+def parse_public_ip(content: bytes) -> str:
+    """
+    从响应中解析公网IP，支持以下格式：
+        {"origin": "100.247.100.254"}
+        {"origin": "139.227.236.141, 123.13.247.40"}
+        {"ip": "100.247.100.254"}
+        100.247.100.254
+    经过多层转发时使用第一个IP。
+    :param content:
+    :return:
+    """
+    text = content.decode(errors='ignore').strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = text
+    if isinstance(data, dict):
+        data = data.get('origin') or data.get('ip') or ''
+    value = str(data).split(',')[0].strip()
+    # 不是合法的IP时抛出 ValueError
+    ipaddress.ip_address(value)
+    return value
+
+
+@dataclasses.dataclass
+class PublicIPService:
+    """
+    本地公网IP服务
+
+    获取到的公网IP缓存 ttl 秒，同时只会有一个刷新请求，其他调用等待该请求的结果。
+    缓存过期后 get 直接返回旧的IP并在后台刷新，只有第一次获取时才需要等待。
+    有订阅者时在后台定时刷新，最后一个订阅者取消订阅后停止。
+    """
+    urls: tuple[str, ...] = DEFAULT_PUBLIC_IP_URLS
+    ttl: float = 15
+    timeout: float = 10
+    _ip: str = dataclasses.field(default='', init=False)
+    _expire_at: float = dataclasses.field(default=0, init=False)
+    _refreshing: asyncio.Task | None = dataclasses.field(default=None, init=False, repr=False)
+    _refresh_loop: asyncio.Task | None = dataclasses.field(default=None, init=False, repr=False)
+    _subscribers: set[int] = dataclasses.field(default_factory=set, init=False, repr=False)
+
+    @property
+    def ip(self) -> str:
+        """
+        当前缓存的公网IP，可能已经过期，还没有获取过时为空字符串
+        :return:
+        """
+        return self._ip
+
+    @property
+    def expired(self) -> bool:
+        """expired"""
+        return time.monotonic() >= self._expire_at
+
+    async def get(self) -> str:
+        """
+        获取公网IP。缓存过期时返回旧的IP并在后台刷新。
+        :return:
+        """
+        if not self._ip:
+            return await self.refresh()
+        if self.expired:
+            self._start_refresh()
+        return self._ip
+
+    async def refresh(self) -> str:
+        """
+        刷新公网IP，同时只有一个刷新请求
+        :return:
+        """
+        return await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        # 之前的刷新任务可能属于另一个已经关闭的事件循环
+        if self._refreshing is None or self._refreshing.done() or self._refreshing.get_loop() is not loop:
+            self._refreshing = loop.create_task(self._refresh())
+        return self._refreshing
+
+    async def _refresh(self) -> str:
+        try:
+            ip = await self.fetch()
+        except PublicIPError:
+            if not self._ip:
+                raise
+            # 刷新失败时继续使用旧的IP，稍后再试
+            logger.warning('Refresh public ip failed, keep using "%s".', self._ip)
+            self._expire_at = time.monotonic() + min(self.ttl, 5)
+            return self._ip
+        if ip != self._ip:
+            logger.info('Public ip changed: "%s" -> "%s".', self._ip, ip)
+        self._ip = ip
+        self._expire_at = time.monotonic() + self.ttl
+        return ip
+
+    async def fetch(self) -> str:
+        """
+        依次请求 urls ，返回第一个成功解析的公网IP。
+        :return:
+        """
+        download_handler = DownloadHandler(timeout=self.timeout)
+        try:
+            for url in self.urls:
+                try:
+                    response = await download_handler.download(RequestProxy(method='GET', url=url))
+                    response.raise_for_status()
+                    return parse_public_ip(response.content)
+                except Exception as ex:  # pylint: disable=broad-except
+                    logger.debug('Get public ip from %s error. %r', url, ex)
+        finally:
+            await download_handler.close()
+        raise PublicIPError(f'Can not get public ip from {self.urls}.')
+
+    def subscribe(self, subscriber: typing.Any):
+        """
+        订阅公网IP，有订阅者时在后台定时刷新
+        :param subscriber:
+        :return:
+        """
+        self._subscribers.add(id(subscriber))
+        loop = asyncio.get_running_loop()
+        if self._refresh_loop is None or self._refresh_loop.done() or self._refresh_loop.get_loop() is not loop:
+            self._refresh_loop = loop.create_task(self._run())
+
+    def unsubscribe(self, subscriber: typing.Any):
+        """
+        取消订阅，没有订阅者时停止后台刷新
+        :param subscriber:
+        :return:
+        """
+        self._subscribers.discard(id(subscriber))
+        if not self._subscribers and self._refresh_loop is not None:
+            self._refresh_loop.cancel()
+            self._refresh_loop = None
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                await self.refresh()
+            except PublicIPError as ex:
+                logger.warning(ex)
+            # 在过期前随机的时间刷新，避免多个进程同时请求
+            await asyncio.sleep(self.ttl * random.uniform(0.5, 0.9))
+
+
+@functools.lru_cache(maxsize=None)
+def get_public_ip_service(urls: tuple[str, ...] = DEFAULT_PUBLIC_IP_URLS, ttl: float = 15) -> PublicIPService:
+    """
+    获取进程内共享的公网IP服务，相同配置的校验器使用同一个服务。
+    :param urls:
+    :param ttl:
+    :return:
+    """
+    return PublicIPService(urls=urls, ttl=ttl)
@@ -39,3 +39,9 @@ class ObjectDoesNotExist(CrawlerStackProxyPoolError):
     """
     object does not exist.
     """
+
+
+class PublicIPError(CrawlerStackProxyPoolError):
+    """
+    无法获取本地公网IP
+    """
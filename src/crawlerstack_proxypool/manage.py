@@ -1,7 +1,10 @@
 """manage"""
 import asyncio
+import dataclasses
 import logging
+import multiprocessing
 import signal as system_signal
+from multiprocessing.process import BaseProcess
 
 from dynaconf.base import Settings
 
@@ -10,6 +13,7 @@ from crawlerstack_proxypool.exceptions import CrawlerStackProxyPoolError
 from crawlerstack_proxypool.log import configure_logging
 from crawlerstack_proxypool.rest_api import RestAPI
 from crawlerstack_proxypool.task import TaskManager
+from crawlerstack_proxypool.utils import setup_event_loop
 
 HANDLED_SIGNALS = (
     system_signal.SIGINT,  # Unix signal 2. Sent by Ctrl+C.
@@ -25,9 +29,25 @@ class ProxyPool:
     def __init__(
             self,
             settings: Settings,
+            run_api: bool = True,
+            run_tasks: bool = True,
+            shard_index: int = 0,
+            shard_count: int = 1,
+            workers: 'WorkerProcesses | None' = None,
     ):
+        """
+        :param settings:
+        :param run_api: 是否提供 REST API 服务
+        :param run_tasks: 是否运行抓取和校验任务
+        :param shard_index: 多进程运行任务时，当前进程负责的分片
+        :param shard_count: 分片数量
+        :param workers: 运行任务的子进程，随当前进程启动和停止
+        """
         configure_logging()
         self._settings = settings
+        self.run_api = run_api
+        self.run_tasks = run_tasks
+        self.workers = workers
 
         self._db = Database(settings)
 
@@ -37,7 +57,7 @@ class ProxyPool:
             port=self._settings.PORT,
         )
 
-        self.task_manager = TaskManager()
+        self.task_manager = TaskManager(shard_index=shard_index, shard_count=shard_count)
 
         self.should_exit = False
         self.force_exit = True
@@ -59,11 +79,15 @@ class ProxyPool:
 
     async def schedule(self):
         """调度任务"""
+        if self.run_tasks:
+            self.task_manager.load_task()
+            self.task_manager.start()
 
-        self.task_manager.load_task()
-        self.task_manager.start()
+        if self.workers:
+            self.workers.start()
 
-        self.rest_api.init()
+        if self.run_api:
+            self.rest_api.init()
 
     async def start(self):
         """Run"""
@@ -71,11 +95,16 @@ class ProxyPool:
         try:
             await self.schedule()
 
-            await self.rest_api.start()
+            if self.run_api:
+                await self.rest_api.start()
 
             self.install_signal_handlers()
+            loop = asyncio.get_running_loop()
+            next_check = loop.time()
             while not self.should_exit:
-                # 暂时不做任何处理。
+                if self.workers and loop.time() >= next_check:
+                    self.workers.check()
+                    next_check = loop.time() + self.workers.check_interval
                 await asyncio.sleep(0.001)
         except CrawlerStackProxyPoolError as ex:
             logger.exception(ex)
@@ -85,8 +114,13 @@ class ProxyPool:
     async def stop(self):
         """Stop spiderkeeper"""
         logger.debug('Stop proxypool server.')
-        self.task_manager.stop()
-        await self.rest_api.stop()
+        if self.workers:
+            await asyncio.get_running_loop().run_in_executor(None, self.workers.stop)
+        if self.run_tasks:
+            self.task_manager.stop()
+            await self.task_manager.close_tasks()
+        if self.run_api:
+            await self.rest_api.stop()
         await self.db.close()
 
     def install_signal_handlers(self) -> None:
@@ -107,3 +141,103 @@ class ProxyPool:
             self.force_exit = True
         else:
             self.should_exit = True
+
+
+def run_worker(
+        shard_index: int,
+        shard_count: int,
+        overrides: dict | None = None,
+        loop: str = 'auto',
+):
+    """
+    子进程入口，只运行属于当前分片的任务，不提供 REST API 。
+    子进程使用 spawn 方式启动，会重新加载配置，命令行中修改的配置通过 overrides 传入。
+    :param shard_index:
+    :param shard_count:
+    :param overrides:
+    :param loop:
+    :return:
+    """
+    # pylint: disable=import-outside-toplevel
+    from crawlerstack_proxypool.config import settings
+
+    for name, value in (overrides or {}).items():
+        settings.set(name, value)
+    setup_event_loop(loop)
+    asyncio.run(ProxyPool(
+        settings,
+        run_api=False,
+        shard_index=shard_index,
+        shard_count=shard_count,
+    ).start())
+
+
+@dataclasses.dataclass
+class WorkerProcesses:
+    """
+    运行校验和抓取任务的子进程
+
+    每个子进程负责一个分片，主进程退出时向子进程发送 SIGTERM ，
+    子进程按正常流程关闭任务和数据库连接，超时后强制结束。
+    """
+    processes: int
+    overrides: dict = dataclasses.field(default_factory=dict)
+    loop: str = 'auto'
+    # 等待子进程退出的时间（秒）
+    stop_timeout: float = 30
+    # 检查子进程是否退出的间隔（秒）
+    check_interval: float = 1
+    _children: list[BaseProcess] = dataclasses.field(default_factory=list, init=False)
+
+    def __post_init__(self):
+        if self.processes <= 0:
+            raise ValueError('Worker processes must be greater than 0.')
+
+    @property
+    def children(self) -> list[BaseProcess]:
+        """children processes"""
+        return self._children
+
+    def start(self):
+        """
+        启动子进程
+        :return:
+        """
+        ctx = multiprocessing.get_context('spawn')
+        for index in range(self.processes):
+            process = ctx.Process(
+                target=run_worker,
+                args=(index, self.processes, self.overrides, self.loop),
+                name=f'proxypool-worker-{index}',
+            )
+            process.start()
+            logger.info('Started worker %s, pid: %s', process.name, process.pid)
+            self._children.append(process)
+
+    def check(self) -> list[BaseProcess]:
+        """
+        检查意外退出的子进程，记录退出码后移除
+        :return: 退出的子进程
+        """
+        dead = [process for process in self._children if not process.is_alive()]
+        for process in dead:
+            logger.error('Worker %s exited unexpectedly with code %s.', process.name, process.exitcode)
+            self._children.remove(process)
+        return dead
+
+    def stop(self):
+        """
+        通知子进程退出并等待，超时后强制结束
+        :return:
+        """
+        for process in self._children:
+            if process.is_alive():
+                process.terminate()
+        for process in self._children:
+            process.join(self.stop_timeout)
+            if process.is_alive():
+                logger.warning('Worker %s did not exit in %ss, kill it.', process.name, self.stop_timeout)
+                process.kill()
+                process.join()
+            logger.info('Worker %s exited with code %s.', process.name, process.exitcode)
+        self._children.clear()
@@ -1,5 +1,6 @@
 """message"""
 import dataclasses
+from collections.abc import AsyncGenerator
 
 import aioredis
 
@@ -30,3 +31,21 @@ class Message(metaclass=SingletonMeta):
         client = await self.client()
         result = await client.spop(name, count)
         return result
+
+    async def publish(self, channel: str, message: str):
+        """publish message to all subscribers"""
+        client = await self.client()
+        await client.publish(channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncGenerator[str, None]:
+        """subscribe channel, yield received messages"""
+        client = await self.client()
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    yield message['data']
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
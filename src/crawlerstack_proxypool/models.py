@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import TypeVar
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
 from sqlalchemy.orm import declarative_base, relationship
 
 
@@ -43,7 +43,10 @@ class SceneProxyModel(BaseModel):
     proxy_id = Column(Integer, ForeignKey('ip_proxy.id', ondelete='CASCADE'))
     name = Column(String(255))
     alive_count = Column(Integer, comment='存活计数。可用加一，不可用减一')
-    # elapse_time = Column(Integer, comment="返回响应的消耗的时间，单位 ms")
+    latency_ewma = Column(Float, comment='校验请求耗时的指数加权移动平均，单位 ms')
+    latency_p95 = Column(Float, comment='最近 N 次校验请求耗时的 p95 ，单位 ms')
+    latency_samples = Column(String(255), comment='最近 N 次校验请求的耗时，单位 ms ，逗号分隔')
+    anonymity = Column(Integer, comment='匿名等级。1 透明，2 匿名，3 高匿')
     update_time = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment='最近一次更新时间')
 
     # 在父表中使用 backref 存在一个 BUG，暂时未通过 DEMO 复现，并反馈。
@@ -12,6 +12,7 @@ from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
 
 from crawlerstack_proxypool import models
+from crawlerstack_proxypool.common.anonymity import AnonymityLevel
 from crawlerstack_proxypool.exceptions import ObjectDoesNotExist
 from crawlerstack_proxypool.models import ModelT, SceneProxyModel
 from crawlerstack_proxypool.schema import SceneIpProxy
@@ -181,13 +182,48 @@ class SceneProxyRepository(BaseRepository[SceneProxyModel]):
         """model"""
         return SceneProxyModel
 
-    async def get_with_ip(self, /, limit: int = 10, offset: int = 0, **kwargs) -> list[SceneIpProxy]:
-        """get with ip"""
+    async def get_with_ip(
+            self,
+            /,
+            limit: int = 10,
+            offset: int = 0,
+            order_by: str = 'alive',
+            max_latency: float | None = None,
+            min_anonymity: int | None = None,
+            **kwargs
+    ) -> list[SceneIpProxy]:
+        """
+        get with ip
+        :param limit:
+        :param offset:
+        :param order_by: alive 按存活计数从高到低；latency 按耗时从低到高，没有耗时记录的排在最后
+        :param max_latency: 只返回耗时指数加权移动平均不超过该值（ms）的代理
+        :param min_anonymity: 只返回匿名等级不低于该值的代理，没有匿名等级记录的不返回
+        :param kwargs:
+        :return:
+        """
         if not limit:
             limit = 10
         if not offset:
             offset = 0
         and_condition = [getattr(self.model, k) == v for k, v in kwargs.items()]
+        if max_latency is not None:
+            and_condition.append(self.model.latency_ewma <= max_latency)
+        if min_anonymity is not None:
+            and_condition.append(self.model.anonymity >= int(min_anonymity))
+        if order_by == 'latency':
+            ordering = [
+                self.model.latency_ewma.is_(None),
+                self.model.latency_ewma.asc(),
+                self.model.alive_count.desc(),
+            ]
+        elif order_by == 'alive':
+            ordering = [
+                self.model.alive_count.desc(),
+                self.model.update_time.desc(),
+            ]
+        else:
+            raise ValueError(f'Unsupported order by "{order_by}".')
         stmt = select(
             self.model
         ).filter(
@@ -197,8 +233,7 @@ class SceneProxyRepository(BaseRepository[SceneProxyModel]):
         ).offset(
             offset
         ).order_by(
-            self.model.alive_count.desc(),
-            self.model.update_time.desc(),
+            *ordering
         ).options(
             joinedload(self.model.ip_proxy)
         )
@@ -212,6 +247,8 @@ class SceneProxyRepository(BaseRepository[SceneProxyModel]):
                 ip=obj.ip_proxy.ip,
                 port=obj.ip_proxy.port,
                 protocol=obj.ip_proxy.protocol,
+                latency=obj.latency_ewma,
+                anonymity=AnonymityLevel(obj.anonymity).name.lower() if obj.anonymity else None,
             ))
         return data
 
@@ -1,7 +1,7 @@
 """routers"""
 from fastapi import APIRouter, FastAPI
 
-from crawlerstack_proxypool.rest_api.routers import scene
+from crawlerstack_proxypool.rest_api.routers import judge, scene
 
 
 def router_v1():
@@ -9,6 +9,7 @@ def router_v1():
     router = APIRouter()
 
     router.include_router(scene.router, tags=['scene'], prefix='/scenes')
+    router.include_router(judge.router, tags=['judge'], prefix='/judge')
 
     return router
 
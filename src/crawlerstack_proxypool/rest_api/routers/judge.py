@@ -0,0 +1,28 @@
+"""judge route"""
+from fastapi import APIRouter, Request
+
+from crawlerstack_proxypool.common.anonymity import PROXY_HEADERS
+
+router = APIRouter()
+
+
+@router.get('')
+@router.get('/', include_in_schema=False)
+async def get(request: Request):
+    """
+    Echo client ip and proxy headers.
+
+    返回格式与 httpbin 的 /ip 兼容，可以直接作为 AnonymousChecker 的校验地址，
+    通过代理访问时，origin 是代理服务器的出口IP，headers 中是代理服务器添加的请求头。
+    注册了不带 / 和带 / 两个地址，避免重定向增加一次经过代理的请求。
+    :param request:
+    :return:
+    """
+    return {
+        'origin': request.client.host if request.client else '',
+        'headers': {
+            name: request.headers[name]
+            for name in PROXY_HEADERS
+            if name in request.headers
+        },
+    }
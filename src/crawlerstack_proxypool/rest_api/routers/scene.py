@@ -1,6 +1,9 @@
 """scene route"""
+from typing import Literal
+
 from fastapi import APIRouter, Depends
 
+from crawlerstack_proxypool.common.anonymity import AnonymityLevel
 from crawlerstack_proxypool.rest_api.utils import service_depend
 from crawlerstack_proxypool.schema import SceneProxyUpdate
 from crawlerstack_proxypool.service import SceneProxyService
@@ -13,18 +16,27 @@ async def get(
         *,
         name: str = None,
         limit: int = 1,
+        order_by: Literal['alive', 'latency'] = 'alive',
+        max_latency: float = None,
+        min_anonymity: Literal['transparent', 'anonymous', 'elite'] = None,
         service: service_depend(SceneProxyService) = Depends(),
 ):
     """
     Get ip proxy
     :param name:
     :param limit:
+    :param order_by: alive 优先返回存活计数高的代理，latency 优先返回耗时低的代理
+    :param max_latency: 只返回耗时不超过该值（ms）的代理
+    :param min_anonymity: 只返回匿名等级不低于该等级的代理
     :param service:
     :return:
     """
     return await service.get_with_ip(
         limit=limit,
-        name=name
+        name=name,
+        order_by=order_by,
+        max_latency=max_latency,
+        min_anonymity=AnonymityLevel[min_anonymity.upper()] if min_anonymity else None,
     )
 
 
@@ -9,6 +9,10 @@ class SceneIpProxy(BaseModel):
     ip: str
     protocol: str
     port: int
+    # 校验请求耗时的指数加权移动平均，单位 ms ，没有记录时为 None
+    latency: float | None = None
+    # 匿名等级：transparent 、anonymous 、elite ，没有记录时为 None
+    anonymity: str | None = None
 
 
 class SceneProxyUpdate(BaseModel):
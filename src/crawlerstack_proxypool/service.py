@@ -1,6 +1,9 @@
 """service"""
 import dataclasses
 import logging
+import math
+import typing
+from datetime import datetime
 from typing import AsyncIterable, Iterable
 
 from httpx import URL
@@ -99,6 +102,11 @@ class SceneProxyService(BaseService, CRUDMixin):
     _proxy_status_repo: SceneProxyRepository = dataclasses.field(default=None, init=False)
     _ip_proxy_repo: IpProxyRepository = dataclasses.field(default=None, init=False)
 
+    # 耗时指数加权移动平均的权重，越大越偏向最近一次的耗时
+    LATENCY_EWMA_ALPHA: typing.ClassVar[float] = 0.3
+    # 计算 p95 时保留的最近校验次数
+    LATENCY_SAMPLE_SIZE: typing.ClassVar[int] = 20
+
     def __post_init__(self):
         self._proxy_status_repo = SceneProxyRepository(self._session)
 
@@ -111,9 +119,24 @@ class SceneProxyService(BaseService, CRUDMixin):
         """proxy status repo"""
         return self._proxy_status_repo
 
-    async def get_with_ip(self, limit: int = 10, offset: int = 0, **kwargs):
+    async def get_with_ip(
+            self,
+            limit: int = 10,
+            offset: int = 0,
+            order_by: str = 'alive',
+            max_latency: float | None = None,
+            min_anonymity: int | None = None,
+            **kwargs
+    ):
         """get with ip"""
-        return await self.repository.get_with_ip(limit=limit, offset=offset, **kwargs)
+        return await self.repository.get_with_ip(
+            limit=limit,
+            offset=offset,
+            order_by=order_by,
+            max_latency=max_latency,
+            min_anonymity=min_anonymity,
+            **kwargs
+        )
 
     @property
     def ip_proxy_repo(self) -> IpProxyRepository:
@@ -126,26 +149,62 @@ class SceneProxyService(BaseService, CRUDMixin):
         """get by names"""
         return await self.repository.get_by_names(*names)
 
-    async def update_proxy_status(self, pk: int, update_count: int) -> SceneProxyModel | None:
+    async def update_proxy_status(
+            self,
+            pk: int,
+            update_count: int,
+            elapsed: float | None = None,
+            anonymity: int | None = None,
+    ) -> SceneProxyModel | None:
         """
         更新 ProxyStatusModel 对象的状态。
         如果计算后的 alive_count 值 > 0 将会更新；如果 alive_count <= 0 ，将其删除
         :param pk:
         :param update_count:
+        :param elapsed: 本次校验的耗时（秒），代理可用时才记录
+        :param anonymity: 本次校验的匿名等级，代理不可用时也会记录，例如透明代理；记录被删除时一起丢弃
         :return:
         """
         # TODO 优化，当 http/https 不可用，直接删除 IpProxy ，级联删除所有关联对象
         proxy_status = await self.scene_proxy_repo.get_by_id(pk)
         alive_count = proxy_status.alive_count + update_count
         if alive_count > 0:
+            latency = {}
+            if update_count > 0 and elapsed is not None:
+                latency = self.compute_latency(proxy_status, elapsed)
+            if anonymity is not None:
+                latency['anonymity'] = int(anonymity)
             return await self.scene_proxy_repo.update(
                 proxy_status.id,
                 alive_count=alive_count,
+                **latency,
             )
         # 当计算后的 alive_count 小于0，则删除
         logger.debug('"%s" is dead, so delete it.', proxy_status)
         await self.scene_proxy_repo.delete(proxy_status.id)
 
+    def compute_latency(self, proxy_status: SceneProxyModel, elapsed: float) -> dict[str, typing.Any]:
+        """
+        根据本次校验的耗时，计算新的耗时指数加权移动平均和最近 LATENCY_SAMPLE_SIZE 次的 p95 。
+        :param proxy_status:
+        :param elapsed: 单位秒
+        :return: 需要更新的字段
+        """
+        latency = round(elapsed * 1000)
+        if proxy_status.latency_ewma is None:
+            ewma = float(latency)
+        else:
+            ewma = self.LATENCY_EWMA_ALPHA * latency + (1 - self.LATENCY_EWMA_ALPHA) * proxy_status.latency_ewma
+        samples = [int(i) for i in (proxy_status.latency_samples or '').split(',') if i]
+        samples = [*samples, latency][-self.LATENCY_SAMPLE_SIZE:]
+        # nearest-rank 法计算 p95
+        p95 = sorted(samples)[math.ceil(len(samples) * 0.95) - 1]
+        return {
+            'latency_ewma': round(ewma, 2),
+            'latency_p95': float(p95),
+            'latency_samples': ','.join(map(str, samples)),
+        }
+
     async def save_scene_proxy(self, proxy: CheckedProxy, name: str):
         """
         将校验后的代理保存到数据库中。
@@ -169,7 +228,7 @@ class SceneProxyService(BaseService, CRUDMixin):
             name=name,
             proxy_id=ip_proxy.id,
         )
-        await self.update_proxy_status(scene_proxy.id, proxy.alive_status)
+        await self.update_proxy_status(scene_proxy.id, proxy.alive_status, proxy.elapsed, proxy.anonymity)
 
     async def decrease(self, proxy: URL, name: str):
         """
@@ -193,6 +252,8 @@ class ValidateSpiderService(SceneProxyService):
 
     _message: Message = dataclasses.field(default=Message(), init=False)
 
+    PRIORITY_STALE_SECONDS: typing.ClassVar[float] = 600
+
     @property
     def message(self):
         """
@@ -214,11 +275,27 @@ class ValidateSpiderService(SceneProxyService):
         :param sources:
         :return:
         """
+        seeds, _ = await self.get_seeds(dest, sources)
+        return seeds
+
+    async def get_seeds(
+            self,
+            dest: str,
+            sources: list[str] | None = None
+    ) -> tuple[AsyncIterable[URL] | Iterable[URL], dict[str, float]]:
+        """
+        获取种子和校验优先级。
+        从数据库中获取时，种子和优先级来自同一次查询；从消息队列中获取时没有优先级。
+        :param dest:
+        :param sources:
+        :return:
+        """
         if sources:
             # 返回结果，不能返回生成器对象，要不然会超出 session 范围
-            return await self.get_from_repository(sources)
+            priorities = await self.get_priorities(sources)
+            return [URL(url) for url in priorities], priorities
         # 返回生成器对象
-        return self.get_from_message(dest)
+        return self.get_from_message(dest), {}
 
     async def get_from_repository(self, sources: list[str]) -> list[URL]:
         """
@@ -226,14 +303,26 @@ class ValidateSpiderService(SceneProxyService):
         :param sources:
         :return:
         """
+        return [URL(url) for url in await self.get_priorities(sources)]
+
+    async def get_priorities(self, sources: list[str]) -> dict[str, float]:
+        """
+        从数据库中获取代理IP，并计算校验优先级，优先校验存活计数高的，以及最久没有更新的代理IP。
+        每过期 PRIORITY_STALE_SECONDS 秒，优先级增加 1 ，相当于存活计数加一。
+        同一个代理IP在多个场景中时，取最大值。
+        :param sources:
+        :return: key 为代理 url ，顺序与查询结果一致
+        """
         proxies = await self.scene_proxy_repo.get_by_names(*sources)
         logger.debug('Get %d proxy from db.', len(proxies))
-        result = []
+        now = datetime.now()
+        result: dict[str, float] = {}
         for status in proxies:
             proxy = status.ip_proxy
-            result.append(
-                URL(scheme=proxy.protocol, host=proxy.ip, port=proxy.port)
-            )
+            url = str(URL(scheme=proxy.protocol, host=proxy.ip, port=proxy.port))
+            stale = (now - status.update_time).total_seconds() if status.update_time else 0
+            priority = (status.alive_count or 0) + max(stale, 0) / self.PRIORITY_STALE_SECONDS
+            result[url] = max(priority, result.get(url, priority))
         if not result:
             logger.debug('No proxy in db, to trigger validate proxy task with "%s"', sources)
             await start_validate_proxy.send(sources=sources)
@@ -1,14 +1,22 @@
 """Spider"""
+import dataclasses
+import inspect
+import logging
 import random
 import typing
-from collections.abc import AsyncIterator, Iterator
+from collections.abc import AsyncGenerator, AsyncIterator, Iterator
 from typing import Type
 
 from httpx import URL, Response
 
 from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
 from crawlerstack_proxypool.aio_scrapy.spider import Spider as ScrapySpider
+from crawlerstack_proxypool.common.checker import (BaseChecker, CheckedProxy,
+                                                   StagedChecker)
 from crawlerstack_proxypool.common.extractor import ExtractorType
+from crawlerstack_proxypool.common.prefilter import Prefilter
+
+logger = logging.getLogger(__name__)
 
 
 class Spider(ScrapySpider, typing.Generic[ExtractorType]):
@@ -27,8 +35,15 @@ class Spider(ScrapySpider, typing.Generic[ExtractorType]):
         self.pipeline = pipeline
 
     async def parse(self, response: Response) -> typing.Any:
-        result = await self.parser.parse(response)
-        await self.pipeline(result)
+        return await self.parser.parse(response)
+
+    async def process_items(self, items: list) -> None:
+        """
+        将一批结果交给 pipeline 处理
+        :param items:
+        :return:
+        """
+        await self.pipeline(items)
 
 
 class ValidateSpider(Spider):
@@ -37,7 +52,6 @@ class ValidateSpider(Spider):
 
     使用配置中的 check_urls 来校验已有的代理IP。
     """
-
     def __init__(
             self,
             *,
@@ -46,6 +60,8 @@ class ValidateSpider(Spider):
             check_urls: list[str],
             parser_kls: Type[ExtractorType],
             pipeline: typing.Callable,
+            priorities: dict[str, float] | None = None,
+            prefilter: Prefilter | None = None,
             **kwargs
     ):
         """
@@ -54,26 +70,98 @@ class ValidateSpider(Spider):
         :param check_urls:  校验URL
         :param parser_kls:
         :param pipeline:
+        :param priorities:  代理IP的校验优先级，key 为代理 url
+        :param prefilter:  TCP 连接预过滤，只有连接成功的代理IP才会发起 HTTP 校验
         :param kwargs:
         """
         super().__init__(name=name, start_urls=start_urls, parser_kls=parser_kls, pipeline=pipeline, **kwargs)
         self.check_urls = check_urls
+        self.priorities = priorities or {}
+        self.prefilter = prefilter
+        if isinstance(self.parser, StagedChecker) and self.parser.prefilter is not None:
+            if self.prefilter is None:
+                # 分阶段校验器中的 tcp 、connect 阶段
+                self.prefilter = self.parser.prefilter
+            else:
+                logger.warning(
+                    'Spider "%s" has prefilter configured, ignore tcp/connect stages of staged checker.',
+                    name,
+                )
+        self.body_consumer = None
+        if isinstance(self.parser, BaseChecker) and self.parser.STREAMING:
+            self.body_consumer = self.parser.consume
+
+    async def start_requests(self) -> AsyncGenerator[RequestProxy, None]:
+        """
+        配置了预过滤时，先检查代理IP能否连接，连接失败的直接保存为不可用，不再发起 HTTP 校验。
+        预过滤前先按代理IP去重，重复的代理IP只检查一次。
+        连接失败的结果通过 send_items 放入 pipeline ，由 pipeline 批量保存，不在获取请求时写数据库。
+        :return:
+        """
+        if self.prefilter is None:
+            async for request in super().start_requests():
+                yield request
+            return
+
+        total = 0
+        dead_count = 0
+        async for url, alive in self.prefilter.filter(self.unique_start_urls()):
+            total += 1
+            if alive:
+                yield self._make_request(url)
+                continue
+            dead_count += 1
+            await self.send_items([CheckedProxy(url=URL(url), alive=False)])
+        logger.info('Prefilter dropped %d of %d proxies in "%s".', dead_count, total, self.name)
+
+    async def unique_start_urls(self) -> AsyncGenerator[URL | str, None]:
+        """
+        按代理IP去重后的起始 url ，和请求的 fingerprint 一致
+        :return:
+        """
+        seen: set[str] = set()
+        if inspect.isasyncgen(self.start_urls):
+            async for url in self.start_urls:
+                if str(url) not in seen:
+                    seen.add(str(url))
+                    yield url
+        else:
+            for url in self.start_urls:
+                if str(url) not in seen:
+                    seen.add(str(url))
+                    yield url
 
     def random_check_url(self) -> str:
         """随机选择一个URL"""
         return random.choice(self.check_urls)
 
+    def alternate_request(self, request: RequestProxy) -> RequestProxy | None:
+        """
+        使用另一个校验 url 构建备用请求，只有一个校验 url 时不发起对冲请求。
+        :param request:
+        :return:
+        """
+        urls = [url for url in self.check_urls if url != str(request.url)]
+        if not urls:
+            return None
+        return dataclasses.replace(request, url=random.choice(urls))
+
     def _make_request(self, url: URL | str) -> RequestProxy:
         """
         构建 request
 
         随机选择一个校验 url，然后使用代理IP访问该地址。
+        校验 url 是随机的，所以按代理IP去重。
+        校验器支持流式检查时，下载过程中得出结论后就不再读取剩余的响应内容。
         :param url:
         :return:
         """
         req = RequestProxy(
             method='GET',
             url=self.random_check_url(),
-            proxy=url
+            proxy=url,
+            priority=self.priorities.get(str(url), 0),
+            body_consumer=self.body_consumer,
+            fingerprint=str(url),
         )
         return req
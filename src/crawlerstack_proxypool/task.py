@@ -3,7 +3,9 @@ Task
 """
 import asyncio
 import dataclasses
+import json
 import logging
+from concurrent.futures import Executor
 from datetime import datetime, timedelta
 from typing import Type
 
@@ -14,18 +16,26 @@ from httpx import URL
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from crawlerstack_proxypool.aio_scrapy.crawler import Crawler
+from crawlerstack_proxypool.aio_scrapy.scraper import create_executor
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
 from crawlerstack_proxypool.common import BaseExtractor, ParserFactory
 from crawlerstack_proxypool.common.checker import CheckedProxy
+from crawlerstack_proxypool.common.prefilter import Prefilter
 from crawlerstack_proxypool.config import settings
 from crawlerstack_proxypool.db import session_provider
+from crawlerstack_proxypool.message import Message
 from crawlerstack_proxypool.service import (FetchSpiderService,
                                             ValidateSpiderService)
 from crawlerstack_proxypool.signals import (start_fetch_proxy,
                                             start_validate_proxy)
 from crawlerstack_proxypool.spiders import Spider, ValidateSpider
+from crawlerstack_proxypool.utils import in_shard
 
 logger = logging.getLogger(__name__)
 
+# 多进程运行时，通过该 Redis 频道将触发任务的事件广播到所有进程
+TRIGGER_CHANNEL = 'proxypool:trigger'
+
 
 class TaskManager:
     """
@@ -36,16 +46,31 @@ class TaskManager:
     让 apscheduler 立即调度对应的任务。
     """
 
-    def __init__(self):
-        """"""
+    def __init__(self, shard_index: int = 0, shard_count: int = 1):
+        """
+        多进程运行时，每个进程只负责一部分任务：
+        抓取任务按顺序分配到各个进程；校验任务在每个进程中都会运行，从数据库获取的代理IP按分片校验，
+        从消息队列中获取的代理IP由各个进程共同消费。
+        触发任务的事件只在当前进程中传递，所以多进程运行时通过 Redis 广播，每个进程触发自己负责的任务。
+        :param shard_index: 当前进程的序号
+        :param shard_count: 进程数量
+        """
+        self.shard_index = shard_index
+        self.shard_count = shard_count
         self.scheduler = AsyncIOScheduler(timezone=pytz.timezone('Asia/Shanghai'))
 
+        self.tasks: list[FetchSpiderTask | ValidateSpiderTask] = []
         self.fetch_jobs: list[tuple[str, Job]] = []
         self.validate_fetch_jobs: list[tuple[str, Job]] = []
         self.validate_scene_jobs: list[tuple[str, Job]] = []
+        self._trigger_listener: asyncio.Task | None = None
 
-        start_fetch_proxy.connect(self.trigger_fetch_job)
-        start_validate_proxy.connect(self.trigger_validate_job)
+        if self.shard_count > 1:
+            start_fetch_proxy.connect(self.publish_fetch_trigger)
+            start_validate_proxy.connect(self.publish_validate_trigger)
+        else:
+            start_fetch_proxy.connect(self.trigger_fetch_job)
+            start_validate_proxy.connect(self.trigger_validate_job)
 
     def load_task(self):
         """
@@ -69,7 +94,9 @@ class TaskManager:
         :param fetch_config:
         :return:
         """
-        for config in fetch_config:
+        for index, config in enumerate(fetch_config):
+            if index % self.shard_count != self.shard_index:
+                continue
             name = config['name']
             parser = config['extractor']
             schedule = config['schedule']
@@ -77,8 +104,10 @@ class TaskManager:
                 name=name,
                 urls=config['urls'],
                 parser_kls=ParserFactory(**parser).get_extractor(),
-                dest=config['dest']
+                dest=config['dest'],
+                crawler_settings=merge_crawler_settings(config),
             )
+            self.tasks.append(spider)
             task = self.scheduler.add_job(
                 func=spider.start,
                 name=name,
@@ -100,7 +129,12 @@ class TaskManager:
                 check_urls=config['urls'],
                 parser_kls=ParserFactory(**checker).get_checker(),
                 sources=sources,
+                crawler_settings=merge_crawler_settings(config),
+                prefilter=load_prefilter_config(config),
+                shard_index=self.shard_index,
+                shard_count=self.shard_count,
             )
+            self.tasks.append(spider)
             task = self.scheduler.add_job(
                 func=spider.start,
                 name=name,
@@ -134,15 +168,69 @@ class TaskManager:
             for _, job in self.validate_fetch_jobs:
                 trigger_job_run_now(job)
 
+    async def publish_fetch_trigger(self, **_kwargs):
+        """
+        广播触发抓取任务的事件
+        :return:
+        """
+        await Message().publish(TRIGGER_CHANNEL, json.dumps({'event': 'fetch'}))
+
+    async def publish_validate_trigger(self, sources: list[str] = None, **_kwargs):
+        """
+        广播触发校验任务的事件
+        :param sources:
+        :return:
+        """
+        await Message().publish(TRIGGER_CHANNEL, json.dumps({'event': 'validate', 'sources': sources}))
+
+    def dispatch_trigger(self, message: str):
+        """
+        处理广播的触发事件，触发当前进程中对应的任务
+        :param message:
+        :return:
+        """
+        data = json.loads(message)
+        if data.get('event') == 'fetch':
+            self.trigger_fetch_job()
+        elif data.get('event') == 'validate':
+            self.trigger_validate_job(sources=data.get('sources'))
+        else:
+            logger.warning('Unknown trigger message: %s', message)
+
+    async def listen_triggers(self):
+        """
+        订阅触发事件的广播，订阅中断后重新订阅
+        :return:
+        """
+        while True:
+            try:
+                async for message in Message().subscribe(TRIGGER_CHANNEL):
+                    self.dispatch_trigger(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:  # pylint: disable=broad-except
+                logger.exception(ex)
+                await asyncio.sleep(1)
+
     def start(self):
         """start task manager"""
         logger.info('Starting task manage.')
         self.scheduler.start()
+        if self.shard_count > 1:
+            self._trigger_listener = asyncio.get_running_loop().create_task(self.listen_triggers())
 
     def stop(self):
         """stop task manager"""
         logger.info('Stopping task manage.')
         self.scheduler.shutdown()
+        if self._trigger_listener is not None:
+            self._trigger_listener.cancel()
+            self._trigger_listener = None
+
+    async def close_tasks(self):
+        """close tasks, release reused crawlers"""
+        for task in self.tasks:
+            await task.close()
 
 
 def trigger_job_run_now(job: Job):
@@ -155,8 +243,79 @@ def trigger_job_run_now(job: Job):
     job.modify(next_run_time=datetime.now() + timedelta(seconds=3))
 
 
+def merge_crawler_settings(config: dict) -> dict:
+    """
+    合并爬虫配置。
+    任务中的 crawler 配置会覆盖全局的 crawler 配置。
+    :param config: 任务配置
+    :return:
+    """
+    result = {}
+    for crawler_config in (settings.get('crawler'), config.get('crawler')):
+        if crawler_config:
+            result.update({k.lower(): v for k, v in crawler_config.items()})
+    return result
+
+
+def load_prefilter_config(config: dict) -> dict | None:
+    """
+    获取校验任务的预过滤配置。
+    配置为 true 时使用默认参数，为空或者 false 时不启用。
+    :param config:
+    :return:
+    """
+    prefilter = config.get('prefilter')
+    if not prefilter:
+        return None
+    if prefilter is True:
+        return {}
+    return {k.lower(): v for k, v in prefilter.items()}
+
+
+class CrawlerReuseMixin:  # noqa
+    """
+    复用 crawler 。
+
+    crawler 配置 keep_alive 为 true 时，任务每次运行都使用同一个 crawler ，
+    保留下载器的连接、DNS 缓存和下载耗时等状态，每次运行的统计单独输出。
+    没有开启 keep_alive 时，每次运行的 crawler 共用任务的解析执行器，避免每次运行都创建进程池。
+    """
+    crawler_settings: dict
+    _crawler: Crawler | None
+    _executor: Executor | None
+
+    def get_crawler(self, spider_kls: Type[Spider], crawler_settings: dict) -> Crawler:
+        """
+        获取 crawler ，没有开启 keep_alive 时每次创建新的 crawler
+        :param spider_kls:
+        :param crawler_settings:
+        :return:
+        """
+        if self._crawler is not None:
+            return self._crawler
+        config = Settings(**crawler_settings)
+        if config.keep_alive:
+            self._crawler = Crawler(spider_kls, config)
+            return self._crawler
+        if self._executor is None:
+            self._executor = create_executor(config)
+        return Crawler(spider_kls, config, executor=self._executor)
+
+    async def close(self):
+        """
+        关闭复用的 crawler 和解析执行器
+        :return:
+        """
+        if self._crawler is not None:
+            await self._crawler.close()
+            self._crawler = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
 @dataclasses.dataclass
-class FetchSpiderTask:
+class FetchSpiderTask(CrawlerReuseMixin):
     """
     Fetch spider task
     """
@@ -164,6 +323,9 @@ class FetchSpiderTask:
     urls: list[str]
     dest: list[str]
     parser_kls: Type[BaseExtractor] | None = None
+    crawler_settings: dict = dataclasses.field(default_factory=dict)
+    _crawler: Crawler | None = dataclasses.field(default=None, init=False, repr=False)
+    _executor: Executor | None = dataclasses.field(default=None, init=False, repr=False)
 
     async def start_urls(self):
         """start urls"""
@@ -172,62 +334,82 @@ class FetchSpiderTask:
 
     @session_provider(auto_commit=True)
     async def save(self, proxy: list[URL], session: AsyncSession):
-        """save"""
+        """save a batch of proxies in one session"""
         service = FetchSpiderService(session)
         await service.save(proxy, self.dest)
 
     async def start(self):
         """start task"""
-        crawler = Crawler(Spider)
-        await crawler.crawl(
+        crawler = self.get_crawler(Spider, self.crawler_settings)
+        stats = await crawler.crawl(
             name=self.name,
             start_urls=self.start_urls(),
             parser_kls=self.parser_kls,
             pipeline=self.save
         )
+        logger.info('Task "%s" finished. Stats: %s', self.name, stats.get_stats())
 
 
 @dataclasses.dataclass
-class ValidateSpiderTask:
+class ValidateSpiderTask(CrawlerReuseMixin):
     """Validate spider task"""
     name: str
     dest: str
     check_urls: list[str]
     parser_kls: Type[BaseExtractor] | None = None
     sources: list[str] | None = dataclasses.field(default_factory=list)
+    crawler_settings: dict = dataclasses.field(default_factory=dict)
+    # Prefilter 的参数，为 None 时不启用预过滤
+    prefilter: dict | None = None
+    # 多进程运行时，只校验从数据库中获取的属于当前分片的代理IP
+    shard_index: int = 0
+    shard_count: int = 1
+    _crawler: Crawler | None = dataclasses.field(default=None, init=False, repr=False)
+    _executor: Executor | None = dataclasses.field(default=None, init=False, repr=False)
 
     @session_provider(auto_commit=True)
-    async def start_urls(self, session: AsyncSession):
+    async def get_seeds(self, session: AsyncSession):
         """
+        获取种子和校验优先级，从消息队列中获取代理IP时没有优先级。
         :param session:
         :return:
         """
         service = ValidateSpiderService(session)
-        return await service.start_urls(self.dest, self.sources)
+        return await service.get_seeds(self.dest, self.sources)
 
     @session_provider(auto_commit=True)
-    async def save(self, proxy: CheckedProxy, session: AsyncSession):
+    async def save(self, proxies: list[CheckedProxy], session: AsyncSession):
         """
         不需要将 service = ValidateService(session) 提取出来。因为 save 任务传递到
         ValidateSpider 会放到一个 task 中运行，使用 session_provider 自动管理该 task 中的 session 生命周期。
-        :param proxy:
+        一批校验结果在同一个 session 中保存，保存失败时 ItemPipeline 会逐个重试。
+        :param proxies:
         :param session:
         :return:
         """
         service = ValidateSpiderService(session)
-        await service.save(proxy, self.dest)
+        for proxy in proxies:
+            await service.save(proxy, self.dest)
 
     async def start(self):
         """start task"""
-        seeds = await self.start_urls()
-        crawler = Crawler(ValidateSpider)
-        await crawler.crawl(
+        seeds, priorities = await self.get_seeds()
+        if self.sources and self.shard_count > 1:
+            seeds = [seed for seed in seeds if in_shard(str(seed), self.shard_index, self.shard_count)]
+        # 从数据库获取代理IP时有优先级，默认使用优先级调度器，可以通过 crawler 配置覆盖
+        crawler_settings = {'scheduler': 'priority'} if self.sources else {}
+        crawler_settings.update(self.crawler_settings)
+        crawler = self.get_crawler(ValidateSpider, crawler_settings)
+        stats = await crawler.crawl(
             name=self.name,
             start_urls=seeds,
             check_urls=self.check_urls,
             parser_kls=self.parser_kls,
-            pipeline=self.save
+            pipeline=self.save,
+            priorities=priorities,
+            prefilter=Prefilter(**self.prefilter) if self.prefilter is not None else None,
         )
+        logger.info('Task "%s" finished. Stats: %s', self.name, stats.get_stats())
 
 
 async def main():
@@ -1,6 +1,13 @@
 """
 Utils.
 """
+import asyncio
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOPS = ('auto', 'asyncio', 'uvloop')
 
 
 class SingletonMeta(type):
@@ -27,3 +34,40 @@ def update_db_settings(settings, db_file: str = 'proxypool.db'):
         local_path = settings.LOCALPATH
         db_file = local_path / db_file
         settings.DATABASE = f'sqlite+aiosqlite:///{db_file}'
+
+
+def setup_event_loop(loop: str = 'auto') -> str:
+    """
+    设置事件循环的实现，需要在 asyncio.run 之前调用。
+        auto: 安装了 uvloop 时使用 uvloop ，否则使用 asyncio ；
+        asyncio: 使用标准库的事件循环；
+        uvloop: 使用 uvloop ，没有安装时记录警告并使用 asyncio 。
+    :param loop:
+    :return: 实际使用的事件循环
+    """
+    if loop not in EVENT_LOOPS:
+        raise ValueError(f'Event loop "{loop}" has not implement, should be one of {EVENT_LOOPS}.')
+    if loop == 'asyncio':
+        asyncio.set_event_loop_policy(None)
+        return 'asyncio'
+    try:
+        import uvloop  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        if loop == 'uvloop':
+            logger.warning('uvloop is not installed, fallback to asyncio event loop.')
+        asyncio.set_event_loop_policy(None)
+        return 'asyncio'
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return 'uvloop'
+
+
+def in_shard(key: str, index: int, count: int) -> bool:
+    """
+    判断 key 是否属于第 index 个分片。
+    使用 crc32 而不是 hash ，保证不同进程中的结果一致。
+    :param key:
+    :param index:
+    :param count: 分片数量
+    :return:
+    """
+    return count <= 1 or zlib.crc32(key.encode()) % count == index
@@ -0,0 +1,59 @@
+"""test anonymity"""
+import json
+
+import pytest
+
+from crawlerstack_proxypool.common.anonymity import (AnonymityLevel,
+                                                     classify_anonymity,
+                                                     contains_ip,
+                                                     parse_echoed_headers)
+
+
+@pytest.mark.parametrize(
+    'content, expect_value',
+    [
+        (b'1.2.3.4', None),
+        (b'{"origin": "1.2.3.4"}', None),
+        (b'{"headers": {"Via": "1.1 squid", "Host": "example.com"}}', {'via': '1.1 squid', 'host': 'example.com'}),
+    ]
+)
+def test_parse_echoed_headers(content, expect_value):
+    """test parse echoed headers"""
+    assert parse_echoed_headers(content) == expect_value
+
+
+@pytest.mark.parametrize(
+    'data, expect_value',
+    [
+        ({'origin': '1.2.3.4'}, AnonymityLevel.TRANSPARENT),
+        ({'origin': '5.6.7.8', 'headers': {'X-Forwarded-For': '1.2.3.4'}}, AnonymityLevel.TRANSPARENT),
+        ({'origin': '5.6.7.8'}, AnonymityLevel.ANONYMOUS),
+        ({'origin': '5.6.7.8', 'headers': {'Via': '1.1 squid'}}, AnonymityLevel.ANONYMOUS),
+        ({'origin': '5.6.7.8', 'headers': {'forwarded': 'for=unknown'}}, AnonymityLevel.ANONYMOUS),
+        ({'origin': '5.6.7.8', 'headers': {}}, AnonymityLevel.ELITE),
+        ({'origin': '5.6.7.8', 'headers': {'Host': 'example.com'}}, AnonymityLevel.ELITE),
+        ({'origin': '11.2.3.45'}, AnonymityLevel.ANONYMOUS),
+        ({'origin': '5.6.7.8', 'headers': {'Forwarded': 'for="1.2.3.4:8080"'}}, AnonymityLevel.TRANSPARENT),
+    ]
+)
+def test_classify_anonymity(data, expect_value):
+    """test classify anonymity"""
+    assert classify_anonymity(json.dumps(data).encode(), '1.2.3.4') == expect_value
+
+
+@pytest.mark.parametrize(
+    'content, ip, expect_value',
+    [
+        (b'1.2.3.4', '1.2.3.4', True),
+        (b'"1.2.3.4, 5.6.7.8"', '1.2.3.4', True),
+        (b'::ffff:1.2.3.4', '1.2.3.4', True),
+        (b'11.2.3.45', '1.2.3.4', False),
+        (b'1.2.3.40', '1.2.3.4', False),
+        (b'2001:db8::1', '2001:db8::1', True),
+        (b'2001:db8::12', '2001:db8::1', False),
+        (b'2001:db8::1:5', '2001:db8::1', False),
+    ]
+)
+def test_contains_ip(content, ip, expect_value):
+    """test contains ip only match the whole ip"""
+    assert contains_ip(content, ip) == expect_value
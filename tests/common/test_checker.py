@@ -0,0 +1,352 @@
+"""test checker"""
+import pytest
+from httpx import URL, Request, Response
+
+from crawlerstack_proxypool.aio_scrapy.req_resp import Timing
+from crawlerstack_proxypool.aio_scrapy.spider import Spider
+from crawlerstack_proxypool.common import CheckParser
+from crawlerstack_proxypool.common.anonymity import AnonymityLevel
+from crawlerstack_proxypool.common.checker import (AnonymousChecker,
+                                                   BaseChecker, CheckedProxy,
+                                                   KeywordChecker,
+                                                   KeywordMatcher,
+                                                   StagedChecker,
+                                                   sniff_encoding)
+from crawlerstack_proxypool.common.prefilter import Prefilter
+from crawlerstack_proxypool.spiders import ValidateSpider
+
+
+class Foo(Spider):
+    """foo spider"""
+
+    async def parse(self, response: Response):
+        pass
+
+
+@pytest.mark.parametrize(
+    'keywords, any_, content, expect_value',
+    [
+        ([], False, b'foo', True),
+        ([], True, b'foo', False),
+        (['foo', 'bar'], False, b'foo bar', True),
+        (['foo', 'bar'], False, b'foo', False),
+        (['foo', 'bar'], True, b'bar', True),
+        (['foo', 'bar'], True, b'baz', False),
+        # 关键词互相包含、重叠
+        (['abc', 'bc'], False, b'abc', True),
+        (['ab', 'abc', 'c'], False, b'xabcx', True),
+        (['aba', 'bab'], False, b'abab', True),
+        (['aba', 'bab'], False, b'aba', False),
+        # 正则特殊字符
+        (['a.c', '[x]'], False, b'abc [x]', False),
+        (['a.c', '[x]'], False, b'a.c [x]', True),
+        (['备案号'], False, '京ICP备案号'.encode(), True),
+    ]
+)
+def test_keyword_matcher(keywords, any_, content, expect_value):
+    """test keyword matcher"""
+    assert KeywordMatcher(keywords, any_=any_).match(content) is expect_value
+
+
+@pytest.mark.parametrize(
+    'any_, expect_value',
+    [
+        (False, False),
+        (True, True),
+    ]
+)
+def test_keyword_matcher_unencodable(any_, expect_value):
+    """test keywords that can not be encoded in the response encoding"""
+    matcher = KeywordMatcher(['备案号', 'foo'], encoding='latin-1', any_=any_)
+    assert matcher.match(b'foo') is expect_value
+
+
+@pytest.mark.parametrize(
+    'headers, content, expect_value',
+    [
+        ({}, b'foo', 'utf-8'),
+        ({'content-type': 'text/html; charset=GBK'}, b'foo', 'gbk'),
+        ({}, b'<html><meta charset="gb2312"></html>', 'gb2312'),
+        ({}, b'<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">', 'iso8859-1'),
+        ({'content-type': 'text/html; charset=foo'}, b'foo', 'utf-8'),
+    ]
+)
+def test_sniff_encoding(headers, content, expect_value):
+    """test sniff encoding"""
+    assert sniff_encoding(Response(200, headers=headers, content=content)) == expect_value
+
+
+@pytest.mark.parametrize(
+    'status_code, content, expect_value',
+    [
+        (200, '<meta charset="gbk">京ICP备案号 foo'.encode('gbk'), True),
+        (200, '<meta charset="gbk">foo'.encode('gbk'), False),
+        (500, '<meta charset="gbk">京ICP备案号 foo'.encode('gbk'), False),
+    ]
+)
+@pytest.mark.asyncio
+async def test_keyword_checker(status_code, content, expect_value):
+    """test keyword checker matches raw bytes in the response encoding"""
+    spider = Foo(name='foo', start_urls=[])
+    checker = KeywordChecker.from_kwargs(spider, keywords=['备案号', 'foo'])
+    response = Response(
+        status_code,
+        content=content,
+        request=Request('GET', 'https://example.com', headers={'proxy': 'http://127.0.0.1:1080'}),
+    )
+    checked = await checker.check(response)
+    assert checked.alive is expect_value
+    # pylint: disable=protected-access
+    assert list(checker._matchers) == (['gbk'] if status_code == 200 else [])
+
+
+@pytest.mark.parametrize(
+    'keywords, any_',
+    [
+        (['foo', 'bar'], False),
+        (['foo', 'bar'], True),
+        (['abc', 'bc', 'cab'], False),
+    ]
+)
+def test_keyword_matcher_feed(keywords, any_):
+    """test keywords across chunk boundaries are matched"""
+    matcher = KeywordMatcher(keywords, any_=any_)
+    content = b'xx' + b'-'.join(keyword.encode() for keyword in keywords) + b'yy'
+    for size in range(1, len(content) + 1):
+        state = matcher.new_state()
+        chunks = [content[i:i + size] for i in range(0, len(content), size)]
+        assert any(matcher.feed(state, chunk) for chunk in chunks)
+
+
+def test_non_streaming_checker_consume():
+    """test non streaming checker always read the whole response"""
+
+    class NonStreamingChecker(BaseChecker):
+        """non streaming checker"""
+
+        async def check(self, response: Response) -> CheckedProxy:
+            return CheckedProxy(url=URL('http://127.0.0.1:1080'), alive=True)
+
+    checker = NonStreamingChecker.from_kwargs(Foo(name='foo', start_urls=[]))
+    response = Response(200)
+    assert not checker.consume(response, b'foo')
+    assert checker.get_verdict(response) is None
+    with pytest.raises(NotImplementedError):
+        checker.feed(response, b'foo')
+
+
+
+def test_streaming_checker_without_feed():
+    """test streaming checker must implement feed"""
+    with pytest.raises(TypeError):
+        class StreamingChecker(BaseChecker):  # pylint: disable=unused-variable
+            """streaming checker without feed"""
+            STREAMING = True
+
+            async def check(self, response: Response) -> CheckedProxy:
+                return CheckedProxy(url=URL('http://127.0.0.1:1080'), alive=True)
+
+@pytest.mark.parametrize(
+    'status_code, chunks, expect_consumed, expect_value',
+    [
+        (200, [b'<html>', b'fo', b'o', b'</html>'], 3, True),
+        (200, [b'<html>', b'bar', b'</html>'], 3, False),
+        (404, [b'<html>', b'foo', b'</html>'], 1, False),
+    ]
+)
+@pytest.mark.asyncio
+async def test_keyword_checker_streaming(status_code, chunks, expect_consumed, expect_value):
+    """test keyword checker stops reading once the verdict is known"""
+    spider = Foo(name='foo', start_urls=[])
+    checker = KeywordChecker.from_kwargs(spider, keywords=['foo'])
+    assert checker.STREAMING
+    response = Response(
+        status_code,
+        request=Request('GET', 'https://example.com', headers={'proxy': 'http://127.0.0.1:1080'}),
+    )
+    consumed = 0
+    for chunk in chunks:
+        consumed += 1
+        if checker.consume(response, chunk):
+            break
+    assert consumed == expect_consumed
+    checked = await checker.check(response)
+    assert checked.alive is expect_value
+
+
+@pytest.mark.asyncio
+async def test_keyword_checker_streaming_no_rescan(mocker):
+    """test keyword checker does not rescan the content after streaming read the whole response"""
+    checker = KeywordChecker.from_kwargs(Foo(name='foo', start_urls=[]), keywords=['foo'])
+    check_keywords = mocker.spy(checker, 'check_keywords')
+    request = Request('GET', 'https://example.com', headers={'proxy': 'http://127.0.0.1:1080'})
+    response = Response(200, content=b'<html>bar</html>', request=request)
+    assert not checker.consume(response, b'<html>bar</html>')
+    checked = await checker.check(response)
+    assert checked.alive is False
+    check_keywords.assert_not_called()
+    # 没有流式检查时检查完整的响应内容
+    checked = await checker.check(Response(200, content=b'<html>foo</html>', request=request))
+    assert checked.alive is True
+    check_keywords.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_validate_spider_streaming_request():
+    """test validate spider uses the checker as body consumer"""
+    spider = ValidateSpider(
+        name='foo',
+        start_urls=['http://127.0.0.1:1080'],
+        check_urls=['https://example.com'],
+        parser_kls=CheckParser('keyword', keywords=['foo']),
+        pipeline=None,
+    )
+    requests = [request async for request in spider.start_requests()]
+    assert requests[0].body_consumer == spider.parser.consume
+
+
+@pytest.mark.asyncio
+async def test_checker_elapsed():
+    """test checked proxy carries the request latency"""
+    spider = Foo(name='foo', start_urls=[])
+    checker = KeywordChecker.from_kwargs(spider, keywords=['foo'])
+    request = Request('GET', 'https://example.com', headers={'proxy': 'http://127.0.0.1:1080'})
+    response = Response(200, content=b'foo', request=request, extensions={'timing': Timing(total=0.5)})
+    checked = await checker.check(response)
+    assert checked.elapsed == 0.5
+    checked = await checker.check(Response(200, content=b'foo', request=request))
+    assert checked.elapsed is None
+
+
+STAGES = [
+    {'name': 'tcp', 'timeout': 2},
+    {'name': 'connect', 'target': 'example.com:443'},
+    {'name': 'keyword', 'keywords': ['foo']},
+    {'name': 'anonymous'},
+]
+
+
+def test_staged_checker_init():
+    """test network stages are converted to prefilter"""
+    spider = ValidateSpider(
+        name='foo',
+        start_urls=[],
+        check_urls=['https://example.com'],
+        parser_kls=CheckParser('staged', stages=STAGES),
+        pipeline=None,
+    )
+    checker = spider.parser
+    assert isinstance(checker, StagedChecker)
+    assert [type(i) for i in checker.stages] == [KeywordChecker, AnonymousChecker]
+    assert checker.prefilter.timeout == 2
+    assert checker.prefilter.connect_target == 'example.com:443'
+    assert spider.prefilter is checker.prefilter
+
+
+def test_staged_checker_prefilter_conflict(caplog):
+    """test task prefilter take precedence over network stages"""
+    prefilter = Prefilter()
+    spider = ValidateSpider(
+        name='foo',
+        start_urls=[],
+        check_urls=['https://example.com'],
+        parser_kls=CheckParser('staged', stages=STAGES),
+        pipeline=None,
+        prefilter=prefilter,
+    )
+    assert spider.prefilter is prefilter
+    assert 'ignore tcp/connect stages' in caplog.text
+
+
+@pytest.mark.parametrize(
+    'stages',
+    [
+        [{'name': 'keyword', 'keywords': ['foo']}, {'name': 'tcp'}],
+        [{'name': 'foo'}],
+        [{'name': 'staged', 'stages': [{'name': 'keyword', 'keywords': ['foo']}]}],
+    ]
+)
+def test_staged_checker_invalid(stages):
+    """test invalid stages"""
+    with pytest.raises(ValueError):
+        StagedChecker.from_kwargs(Foo(name='foo', start_urls=[]), stages=stages)
+
+
+@pytest.mark.asyncio
+async def test_staged_checker_check(mocker):
+    """test stages short circuit"""
+    checker = StagedChecker.from_kwargs(Foo(name='foo', start_urls=[]), stages=STAGES)
+    anonymous = mocker.patch.object(
+        AnonymousChecker, 'check', side_effect=lambda resp: CheckedProxy(url=None, alive=True)
+    )
+    keyword = mocker.spy(KeywordChecker, 'check')
+
+    def response_factory(proxy: str, content: bytes):
+        request = Request('GET', 'https://example.com', extensions={'proxy': URL(proxy)})
+        return Response(200, content=content, request=request)
+
+    checked = await checker.check(response_factory('http://127.0.0.1:1080', b'bar'))
+    assert not checked.alive
+    anonymous.assert_not_called()
+
+    checked = await checker.check(response_factory('http://127.0.0.2:1080', b'foo'))
+    assert checked.alive
+    assert checked.url == URL('http://127.0.0.2:1080')
+    assert keyword.call_count == 2
+    assert anonymous.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_staged_checker_merge_results(mocker):
+    """test staged checker merge results of all stages"""
+    stages = [{'name': 'anonymous'}, {'name': 'keyword', 'keywords': ['foo']}]
+    checker = StagedChecker.from_kwargs(Foo(name='foo', start_urls=[]), stages=stages)
+    mocker.patch.object(
+        AnonymousChecker,
+        'check',
+        return_value=CheckedProxy(url=None, alive=True, anonymity=AnonymityLevel.ELITE),
+    )
+    request = Request('GET', 'https://example.com', extensions={'proxy': URL('http://127.0.0.1:1080')})
+    checked = await checker.check(Response(200, content=b'foo', request=request))
+    assert checked.alive
+    assert checked.alive_status == 1
+    assert checked.anonymity == AnonymityLevel.ELITE
+    assert checked.url == URL('http://127.0.0.1:1080')
+
+
+@pytest.mark.asyncio
+async def test_staged_checker_failed_stage_anonymity(mocker):
+    """test staged checker keeps the anonymity of the failed stage"""
+    stages = [{'name': 'keyword', 'keywords': ['foo']}, {'name': 'anonymous'}]
+    checker = StagedChecker.from_kwargs(Foo(name='foo', start_urls=[]), stages=stages)
+    mocker.patch.object(
+        AnonymousChecker,
+        'check',
+        return_value=CheckedProxy(url=None, alive=False, anonymity=AnonymityLevel.TRANSPARENT),
+    )
+    request = Request('GET', 'https://example.com', extensions={'proxy': URL('http://127.0.0.1:1080')})
+    checked = await checker.check(Response(200, content=b'foo', request=request))
+    assert not checked.alive
+    assert checked.alive_status == -1
+    assert checked.anonymity == AnonymityLevel.TRANSPARENT
+    assert checked.url == URL('http://127.0.0.1:1080')
+
+@pytest.mark.parametrize(
+    'status_code, chunks, expect_value',
+    [
+        (404, [b'foo'], False),
+        (200, [b'f', b'oo'], None),
+    ]
+)
+def test_staged_checker_feed(status_code, chunks, expect_value):
+    """test staged streaming verdict"""
+    checker = StagedChecker.from_kwargs(Foo(name='foo', start_urls=[]), stages=STAGES)
+    response = Response(status_code, request=Request('GET', 'https://example.com'))
+    verdict = None
+    for chunk in chunks:
+        verdict = checker.feed(response, chunk)
+    assert verdict is expect_value
+    if status_code == 200:
+        # keyword 阶段已经通过，anonymous 阶段需要读取完整的响应
+        assert checker.stages[0].get_verdict(response) is True
+        assert checker.stages[1].get_verdict(response) is None
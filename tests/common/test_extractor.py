@@ -0,0 +1,58 @@
+"""test extractor"""
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from httpx import Response
+
+from crawlerstack_proxypool.aio_scrapy.spider import Spider
+from crawlerstack_proxypool.common.extractor import (HtmlExtractor,
+                                                     JsonExtractor)
+
+HTML = '''
+<table>
+<tr><th>IP</th><th>Port</th></tr>
+<tr><td>127.0.0.1</td><td>1080</td></tr>
+<tr><td>127.0.0.2</td><td>1081</td><td>Transparent</td></tr>
+<tr><td>foo</td><td>1082</td></tr>
+</table>
+'''
+
+
+class Foo(Spider):
+    """foo spider"""
+
+    async def parse(self, response: Response):
+        pass
+
+
+@pytest.fixture(params=[None, ThreadPoolExecutor, ProcessPoolExecutor])
+def executor(request):
+    """executor fixture"""
+    if request.param is None:
+        yield None
+        return
+    pool = request.param(1)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.parametrize(
+    'extractor_kls, content, expect_value',
+    [
+        (HtmlExtractor, HTML.encode(), ['http://127.0.0.1:1080', 'https://127.0.0.1:1080']),
+        (
+            JsonExtractor,
+            json.dumps([{'ip': '127.0.0.1', 'port': 1080}, {'ip': 'foo', 'port': 1}]).encode(),
+            ['http://127.0.0.1:1080', 'https://127.0.0.1:1080']
+        ),
+    ]
+)
+@pytest.mark.asyncio
+async def test_extractor_parse(executor, extractor_kls, content, expect_value):
+    """test extractor parse in executor"""
+    spider = Foo(name='foo', start_urls=[])
+    spider.executor = executor
+    extractor = extractor_kls.from_kwargs(spider)
+    result = await extractor.parse(Response(200, content=content))
+    assert result == expect_value
@@ -0,0 +1,138 @@
+"""test prefilter"""
+import asyncio
+import socket
+
+import pytest
+from httpx import URL, Response
+
+from crawlerstack_proxypool.common import BaseExtractor
+from crawlerstack_proxypool.common.checker import CheckedProxy
+from crawlerstack_proxypool.common.prefilter import Prefilter
+from crawlerstack_proxypool.spiders import ValidateSpider
+
+
+@pytest.fixture()
+async def proxy_server():
+    """proxy server reply CONNECT with 200"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 Connection established\r\n\r\n')
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    host, port = server.sockets[0].getsockname()[:2]
+    yield f'http://{host}:{port}'
+    server.close()
+    await server.wait_closed()
+
+
+@pytest.fixture()
+def closed_port_url():
+    """url of a closed port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+
+@pytest.mark.parametrize('connect_target', [None, 'example.com:443'])
+@pytest.mark.asyncio
+async def test_prefilter_check(proxy_server, closed_port_url, connect_target):
+    """test prefilter check"""
+    prefilter = Prefilter(timeout=1, connect_target=connect_target)
+    assert await prefilter.check(proxy_server)
+    assert not await prefilter.check(closed_port_url)
+
+
+@pytest.mark.parametrize(
+    'url, expect_value',
+    [
+        ('http://127.0.0.1', 80),
+        ('https://127.0.0.1', 443),
+        ('https://127.0.0.1:8443', 8443),
+    ]
+)
+@pytest.mark.asyncio
+async def test_prefilter_default_port(mocker, url, expect_value):
+    """test prefilter default port by scheme"""
+    prefilter = Prefilter()
+    check = mocker.patch.object(prefilter, '_check', return_value=True)
+    assert await prefilter.check(url)
+    check.assert_called_once_with('127.0.0.1', expect_value)
+
+
+@pytest.mark.asyncio
+async def test_prefilter_filter(mocker):
+    """test prefilter filter with bounded concurrency"""
+    running = 0
+    max_running = 0
+
+    async def check(url):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return url.endswith('0')
+
+    prefilter = Prefilter(concurrency=3)
+    mocker.patch.object(prefilter, 'check', side_effect=check)
+    result = dict([item async for item in prefilter.filter(f'http://127.0.0.1:{i}' for i in range(10, 20))])
+    assert len(result) == 10
+    assert [url for url, alive in result.items() if alive] == ['http://127.0.0.1:10']
+    assert max_running == 3
+
+
+class MockChecker(BaseExtractor):
+    """mock checker"""
+
+    async def parse(self, response: Response, **kwargs):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_validate_spider_prefilter(mocker):
+    """test validate spider save dead proxies and request alive proxies"""
+    pipeline = mocker.AsyncMock()
+    prefilter = Prefilter()
+    mocker.patch.object(prefilter, 'check', side_effect=lambda url: url.endswith('1'))
+    spider = ValidateSpider(
+        name='foo',
+        start_urls=['http://127.0.0.1:1', 'http://127.0.0.1:2'],
+        check_urls=['https://example.com'],
+        parser_kls=MockChecker,
+        pipeline=pipeline,
+        prefilter=prefilter,
+    )
+    requests = [request async for request in spider.start_requests()]
+    assert [request.proxy for request in requests] == ['http://127.0.0.1:1']
+    pipeline.assert_called_once_with([CheckedProxy(url=URL('http://127.0.0.1:2'), alive=False)])
+
+
+@pytest.mark.asyncio
+async def test_validate_spider_prefilter_dedupe(mocker):
+    """test validate spider dedupe seeds before prefilter and send dead proxies to item processor"""
+    pipeline = mocker.AsyncMock()
+    item_processor = mocker.AsyncMock()
+    prefilter = Prefilter()
+    check = mocker.patch.object(prefilter, 'check', side_effect=lambda url: url.endswith('1'))
+    spider = ValidateSpider(
+        name='foo',
+        start_urls=['http://127.0.0.1:1', 'http://127.0.0.1:2', 'http://127.0.0.1:1', 'http://127.0.0.1:2'],
+        check_urls=['https://example.com'],
+        parser_kls=MockChecker,
+        pipeline=pipeline,
+        prefilter=prefilter,
+    )
+    spider.item_processor = item_processor
+    requests = [request async for request in spider.start_requests()]
+    assert [request.proxy for request in requests] == ['http://127.0.0.1:1']
+    assert check.call_count == 2
+    item_processor.assert_called_once_with([CheckedProxy(url=URL('http://127.0.0.1:2'), alive=False)])
+    pipeline.assert_not_called()
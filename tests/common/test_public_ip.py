@@ -0,0 +1,159 @@
+"""test public ip"""
+import asyncio
+
+import httpx
+import pytest
+from httpx import Request, Response
+
+from crawlerstack_proxypool.aio_scrapy.downloader import DownloadHandler
+from crawlerstack_proxypool.aio_scrapy.spider import Spider
+from crawlerstack_proxypool.common.checker import AnonymousChecker
+from crawlerstack_proxypool.common.public_ip import (PublicIPService,
+                                                     get_public_ip_service,
+                                                     parse_public_ip)
+from crawlerstack_proxypool.exceptions import PublicIPError
+
+
+class Foo(Spider):
+    """foo spider"""
+
+    async def parse(self, response: Response):
+        pass
+
+
+@pytest.mark.parametrize(
+    'content, expect_value',
+    [
+        (b'{"origin": "100.247.100.254"}', '100.247.100.254'),
+        (b'{"origin": "139.227.236.141, 123.13.247.40"}', '139.227.236.141'),
+        (b'{"ip": "::1"}', '::1'),
+        (b'100.247.100.254\n', '100.247.100.254'),
+    ]
+)
+def test_parse_public_ip(content, expect_value):
+    """test parse public ip"""
+    assert parse_public_ip(content) == expect_value
+
+
+def test_parse_invalid_public_ip():
+    """test parse invalid public ip"""
+    with pytest.raises(ValueError):
+        parse_public_ip(b'<html></html>')
+
+
+@pytest.mark.asyncio
+async def test_public_ip_single_flight(mocker):
+    """test concurrent calls share one refresh"""
+    service = PublicIPService()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return '127.0.0.1'
+
+    fetch_mocker = mocker.patch.object(PublicIPService, 'fetch', side_effect=fetch)
+    result = await asyncio.gather(*[service.get() for _ in range(10)])
+    assert result == ['127.0.0.1'] * 10
+    fetch_mocker.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_public_ip_stale(mocker):
+    """test expired ip is returned immediately and refreshed in background"""
+    service = PublicIPService(ttl=0)
+    fetch_mocker = mocker.patch.object(PublicIPService, 'fetch', side_effect=['127.0.0.1', '127.0.0.2'])
+    assert await service.get() == '127.0.0.1'
+    assert await service.get() == '127.0.0.1'
+    await asyncio.sleep(0)
+    assert service.ip == '127.0.0.2'
+    assert fetch_mocker.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_public_ip_fallback(mocker):
+    """test fallback to next url"""
+    service = PublicIPService(urls=('https://foo.example/ip', 'https://bar.example/ip'))
+    download = mocker.patch.object(DownloadHandler, 'download', side_effect=[
+        httpx.ConnectError('error'),
+        Response(200, content=b'{"origin": "127.0.0.1"}', request=Request('GET', 'https://bar.example/ip')),
+    ])
+    assert await service.get() == '127.0.0.1'
+    assert download.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_public_ip_error(mocker):
+    """test error when no ip has been fetched"""
+    service = PublicIPService(ttl=0)
+    mocker.patch.object(DownloadHandler, 'download', side_effect=httpx.ConnectError('error'))
+    with pytest.raises(PublicIPError):
+        await service.get()
+    # 获取过IP后，刷新失败时继续使用旧的IP
+    mocker.patch.object(PublicIPService, 'fetch', return_value='127.0.0.1')
+    assert await service.refresh() == '127.0.0.1'
+    mocker.patch.object(PublicIPService, 'fetch', side_effect=PublicIPError())
+    assert await service.refresh() == '127.0.0.1'
+
+
+@pytest.mark.asyncio
+async def test_public_ip_subscribe(mocker):
+    """test background refresh runs while there are subscribers"""
+    service = PublicIPService(ttl=60)
+    fetch_mocker = mocker.patch.object(PublicIPService, 'fetch', return_value='127.0.0.1')
+    foo, bar = object(), object()
+    service.subscribe(foo)
+    service.subscribe(bar)
+    await asyncio.sleep(0.01)
+    assert service.ip == '127.0.0.1'
+    fetch_mocker.assert_called_once()
+    service.unsubscribe(foo)
+    assert service._refresh_loop is not None  # pylint: disable=protected-access
+    service.unsubscribe(bar)
+    assert service._refresh_loop is None  # pylint: disable=protected-access
+
+
+@pytest.mark.parametrize(
+    'content, expect_value',
+    [
+        (b'{"origin": "127.0.0.1"}', False),
+        (b'{"origin": "127.0.0.2"}', True),
+    ]
+)
+@pytest.mark.asyncio
+async def test_anonymous_checker_shared_service(mocker, content, expect_value):
+    """test anonymous checkers share one public ip service"""
+    fetch_mocker = mocker.patch.object(PublicIPService, 'fetch', return_value='127.0.0.1')
+    urls = ['https://foo.example/ip']
+    spider = Foo(name='foo', start_urls=[])
+    checkers = [AnonymousChecker.from_kwargs(spider, public_ip_urls=urls) for _ in range(2)]
+    assert checkers[0].public_ip_service is checkers[1].public_ip_service
+    assert checkers[0].public_ip_service is get_public_ip_service(tuple(urls), 15)
+
+    request = Request('GET', 'http://example.com', extensions={'proxy': httpx.URL('http://127.0.0.2:1080')})
+    checked = await asyncio.gather(*[
+        checker.check(Response(200, content=content, request=request)) for checker in checkers
+    ])
+    assert [i.alive for i in checked] == [expect_value] * 2
+    assert fetch_mocker.call_count <= 1
+    get_public_ip_service.cache_clear()
+
+
+@pytest.mark.parametrize(
+    'chunks, expect_value',
+    [
+        ([b'{"origin": "1.2.', b'3.4"}'], False),
+        ([b'{"origin": "1.2.3.4', b'"}'], False),
+        ([b'{"origin": "1.2.3.4', b'5"}'], None),
+        ([b'{"origin": "11.2.3.45"}'], None),
+    ]
+)
+def test_anonymous_checker_feed(mocker, chunks, expect_value):
+    """test anonymous checker streaming only match the whole public ip"""
+    mocker.patch.object(AnonymousChecker, '_public_ip', new_callable=mocker.PropertyMock, return_value='1.2.3.4')
+    checker = AnonymousChecker.from_kwargs(Foo(name='foo', start_urls=[]))
+    response = Response(200)
+    verdict = None
+    for chunk in chunks:
+        verdict = checker.feed(response, chunk)
+        if verdict is not None:
+            break
+    assert verdict is expect_value
@@ -0,0 +1,60 @@
+"""conf test"""
+import asyncio
+import dataclasses
+
+import pytest
+
+
+@dataclasses.dataclass
+class MockHttpServer:
+    """
+    本地 HTTP 服务，用于在不访问外网的情况下测试下载器。
+    支持 keep-alive ，每个请求返回相同的响应体。
+    """
+    body: bytes = b'ok'
+    delay: float = 0
+    headers: dict = dataclasses.field(default_factory=dict)
+    requests: int = 0
+    connections: int = 0
+    _server: asyncio.AbstractServer = dataclasses.field(default=None, init=False)
+
+    @property
+    def url(self) -> str:
+        """server url"""
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """handle connection"""
+        self.connections += 1
+        try:
+            while True:
+                await reader.readuntil(b'\r\n\r\n')
+                self.requests += 1
+                await asyncio.sleep(self.delay)
+                headers = {'Content-Length': len(self.body), **self.headers}
+                head = ''.join(f'{k}: {v}\r\n' for k, v in headers.items())
+                writer.write(f'HTTP/1.1 200 OK\r\n{head}\r\n'.encode() + self.body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """start server"""
+        self._server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+
+    async def stop(self):
+        """stop server"""
+        self._server.close()
+        await self._server.wait_closed()
+
+
+@pytest.fixture()
+async def http_server():
+    """local http server fixture"""
+    server = MockHttpServer()
+    await server.start()
+    yield server
+    await server.stop()
@@ -0,0 +1,83 @@
+"""Test dns cache"""
+import asyncio
+import socket
+
+import httpx
+import pytest
+
+from crawlerstack_proxypool.aio_scrapy.dns import DNSCache
+from crawlerstack_proxypool.aio_scrapy.downloader import DownloadHandler
+from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.stats import StatsCollector
+
+
+@pytest.mark.asyncio
+async def test_dns_cache_hit(mocker):
+    """test dns cache hit and single flight"""
+
+    async def getaddrinfo(*_):
+        await asyncio.sleep(0.01)
+        return ['127.0.0.1']
+
+    resolver = mocker.patch.object(DNSCache, '_getaddrinfo', side_effect=getaddrinfo)
+    cache = DNSCache()
+    stats = StatsCollector()
+    result = await asyncio.gather(*[cache.resolve('example.com', 80, stats) for _ in range(3)])
+    assert result == [['127.0.0.1']] * 3
+    assert await cache.resolve('example.com', 80, stats) == ['127.0.0.1']
+    assert resolver.call_count == 1
+    assert stats.get_value('dns/miss_count') == 1
+    assert stats.get_value('dns/wait_count') == 2
+    assert stats.get_value('dns/hit_count') == 1
+
+
+@pytest.mark.parametrize(
+    'ttl, expect_count',
+    [
+        (0, 2),
+        (10, 1),
+    ]
+)
+@pytest.mark.asyncio
+async def test_dns_negative_cache(mocker, ttl, expect_count):
+    """test dns cache resolve error"""
+    resolver = mocker.patch.object(DNSCache, '_getaddrinfo', side_effect=socket.gaierror('not found'))
+    cache = DNSCache(negative_ttl=ttl)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            await cache.resolve('example.com', 80)
+    assert resolver.call_count == expect_count
+
+
+@pytest.mark.asyncio
+async def test_dns_cache_max_size(mocker):
+    """test dns cache size limit"""
+    mocker.patch.object(DNSCache, '_getaddrinfo', return_value=['127.0.0.1'])
+    cache = DNSCache(max_size=2)
+    for i in range(3):
+        await cache.resolve(f'{i}.example.com', 80)
+    assert len(cache) == 2
+
+
+@pytest.mark.asyncio
+async def test_download_with_dns_cache(http_server):
+    """test direct download use dns cache"""
+    port = httpx.URL(http_server.url).port
+    stats = StatsCollector()
+    handler = DownloadHandler(dns_cache_ttl=300, max_connections_per_client=1, idle_timeout=0, stats=stats)
+    for _ in range(2):
+        response = await handler.download(RequestProxy('GET', f'http://localhost:{port}'))
+        assert response.status_code == 200
+    assert response.extensions['timing'].dns is not None
+    assert stats.get_value('dns/miss_count', 0) + stats.get_value('dns/hit_count', 0) == 2
+    await handler.close()
+
+
+@pytest.mark.asyncio
+async def test_download_resolve_error(mocker):
+    """test resolve error raise httpx.ConnectError"""
+    mocker.patch.object(DNSCache, '_getaddrinfo', side_effect=socket.gaierror('not found'))
+    handler = DownloadHandler(dns_cache_ttl=1, dns_cache_negative_ttl=0)
+    with pytest.raises(httpx.ConnectError):
+        await handler.download(RequestProxy('GET', 'http://not-found.example.com'))
+    await handler.close()
@@ -1,8 +1,14 @@
 """Test downloader"""
+import asyncio
+
+import httpx
 import pytest
 
 from crawlerstack_proxypool.aio_scrapy.downloader import (Downloader,
-                                                          DownloadHandler)
+                                                          DownloadHandler,
+                                                          Slots)
+from crawlerstack_proxypool.aio_scrapy.exceptions import (
+    DownloadTimeoutError, ResponseTooLargeError)
 from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
 from crawlerstack_proxypool.aio_scrapy.settings import Settings
 
@@ -35,3 +41,230 @@ async def test_download_handler(mocker, download_handler):
     request = RequestProxy('GET', 'https://httpbin.iclouds.work/ip')
     resp = await download_handler.download(request)
     assert resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_slots():
+    """test slots limit concurrency by key"""
+    slots = Slots(2)
+    running = 0
+    max_running = 0
+
+    async def acquire(key):
+        nonlocal running, max_running
+        async with slots.acquire(key):
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+    await asyncio.gather(*[acquire('foo') for _ in range(5)])
+    assert max_running == 2
+    assert len(slots) == 0
+
+
+@pytest.mark.parametrize(
+    'per_host, per_proxy, proxy, expect_value',
+    [
+        (0, 0, 'http://127.0.0.1:1080', (None, None)),
+        (1, 0, 'http://127.0.0.1:1080', ('example.com', None)),
+        (0, 1, 'http://127.0.0.1:1080', (None, 'http://127.0.0.1:1080')),
+        (1, 1, None, ('example.com', None)),
+    ]
+)
+@pytest.mark.asyncio
+async def test_slot_keys(per_host, per_proxy, proxy, expect_value):
+    """test slot keys"""
+    downloader = Downloader(Settings(concurrent_requests_per_host=per_host, concurrent_requests_per_proxy=per_proxy))
+    request = RequestProxy('GET', 'https://example.com/ip', proxy=proxy)
+    assert downloader.slot_keys(request) == expect_value
+
+
+@pytest.mark.asyncio
+async def test_download_handler_reuse_client(mocker):
+    """test download handler reuse client by proxy"""
+    mocker.patch('httpx.AsyncClient.send', side_effect=lambda *_, **__: httpx.Response(200))
+    handler = DownloadHandler()
+    proxies = ['http://127.0.0.1:1080', 'http://127.0.0.1:1080', None, 'http://127.0.0.2:1080', None]
+    for proxy in proxies:
+        await handler.download(RequestProxy('GET', 'https://example.com', proxy=proxy))
+    assert len(handler) == 3
+    await handler.close()
+    assert len(handler) == 0
+
+
+@pytest.mark.asyncio
+async def test_download_handler_evict(mocker):
+    """test download handler evict lru client"""
+    mocker.patch('httpx.AsyncClient.send', side_effect=lambda *_, **__: httpx.Response(200))
+    handler = DownloadHandler(max_clients=2)
+    for i in range(4):
+        await handler.download(RequestProxy('GET', 'https://example.com', proxy=f'http://127.0.0.{i}:1080'))
+    # 达到最大数量时，创建 client 前关闭最久未使用的 client
+    assert len(handler) == 2
+    assert list(handler._clients) == ['http://127.0.0.2:1080', 'http://127.0.0.3:1080']  # pylint: disable=protected-access
+    await handler.close()
+
+
+@pytest.mark.asyncio
+async def test_download_handler_max_clients():
+    """test download handler wait in use client before exceed max clients"""
+    handler = DownloadHandler(max_clients=1)
+    async with handler.client('http://127.0.0.1:1080'):
+        waiting = asyncio.create_task(handler.client('http://127.0.0.2:1080').__aenter__())
+        await asyncio.sleep(0.01)
+        # 正在使用的 client 不会被关闭，新的代理需要等待
+        assert not waiting.done()
+        assert len(handler) == 1
+    await asyncio.wait_for(waiting, 1)
+    assert list(handler._clients) == ['http://127.0.0.2:1080']  # pylint: disable=protected-access
+    await handler.close()
+
+
+@pytest.mark.asyncio
+async def test_download_handler_idle_timeout(mocker):
+    """test download handler close idle client"""
+    mocker.patch('httpx.AsyncClient.send', side_effect=lambda *_, **__: httpx.Response(200))
+    handler = DownloadHandler(idle_timeout=0)
+    await handler.download(RequestProxy('GET', 'https://example.com', proxy='http://127.0.0.1:1080'))
+    async with handler.client(None):
+        async with handler.client('http://127.0.0.2:1080'):
+            # 正在使用中的 client 不会被关闭
+            assert list(handler._clients) == ['', 'http://127.0.0.2:1080']  # pylint: disable=protected-access
+    await handler.close()
+
+
+@pytest.mark.asyncio
+async def test_download_timing(http_server):
+    """test download record timing and reuse connection"""
+    handler = DownloadHandler()
+    response = await handler.download(RequestProxy('GET', http_server.url))
+    timing = response.extensions['timing']
+    assert timing.connect is not None
+    assert timing.ttfb <= timing.total
+
+    response = await handler.download(RequestProxy('GET', http_server.url))
+    # 复用连接，没有建立连接的耗时
+    assert response.extensions['timing'].connect is None
+    assert http_server.connections == 1
+    await handler.close()
+
+
+@pytest.mark.parametrize(
+    'request_timeout, handler_timeout',
+    [
+        (0.01, None),
+        (None, 0.01),
+    ]
+)
+@pytest.mark.asyncio
+async def test_download_timeout(http_server, request_timeout, handler_timeout):
+    """test download total timeout"""
+    http_server.delay = 1
+    handler = DownloadHandler(timeout=handler_timeout)
+    with pytest.raises(DownloadTimeoutError):
+        await handler.download(RequestProxy('GET', http_server.url, timeout=request_timeout))
+    await handler.close()
+
+
+@pytest.mark.parametrize(
+    'request_kwargs, expect_value',
+    [
+        ({}, (5.0, 10.0)),
+        ({'connect_timeout': 1, 'read_timeout': 2}, (1, 2)),
+    ]
+)
+def test_download_handler_timeout_config(request_kwargs, expect_value):
+    """test download handler timeout config"""
+    handler = DownloadHandler(connect_timeout=5.0, read_timeout=10.0)
+    timeout = handler._timeout(RequestProxy('GET', 'https://example.com', **request_kwargs))  # pylint: disable=protected-access
+    assert (timeout.connect, timeout.read) == expect_value
+
+
+@pytest.mark.parametrize(
+    'samples, expect_value',
+    [
+        ([], None),
+        ([0.1] * 19, None),
+        ([i / 100 for i in range(100)], 0.95),
+    ]
+)
+@pytest.mark.asyncio
+async def test_hedge_delay(samples, expect_value):
+    """test hedge delay"""
+    downloader = Downloader(Settings(hedge_percentile=95))
+    downloader._latencies.extend(samples)  # pylint: disable=protected-access
+    assert downloader.hedge_delay() == expect_value
+
+
+@pytest.mark.asyncio
+async def test_hedged_download(mocker):
+    """test hedged download use the first response"""
+    response = mocker.MagicMock()
+
+    async def download(request):
+        if request.url == 'https://example.com/slow':
+            await asyncio.sleep(1)
+        return response
+
+    mocker.patch.object(DownloadHandler, 'download', side_effect=download)
+    downloader = Downloader(Settings(hedge_percentile=50, hedge_min_samples=1))
+    downloader._latencies.append(0.01)  # pylint: disable=protected-access
+    spider = mocker.MagicMock()
+    spider.alternate_request.return_value = RequestProxy('GET', 'https://example.com/fast')
+
+    task = await downloader.enqueue(RequestProxy('GET', 'https://example.com/slow'), spider)
+    assert await asyncio.wait_for(task, 0.5) is response
+    assert downloader.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_downloader_request_delay(mocker):
+    """test downloader request delay by rate limit middleware"""
+    downloader = Downloader(Settings(rate_limit_hosts={'slow.example.com': 1}))
+    spider = mocker.MagicMock()
+    assert downloader.request_delay(RequestProxy('GET', 'https://slow.example.com/1'), spider) == 0
+    assert downloader.request_delay(RequestProxy('GET', 'https://slow.example.com/2'), spider) > 0
+    assert downloader.request_delay(RequestProxy('GET', 'https://example.com/'), spider) == 0
+
+
+@pytest.mark.parametrize(
+    'request_max_size, raised',
+    [
+        (None, True),
+        (0, False),
+        (2048, False),
+    ]
+)
+@pytest.mark.asyncio
+async def test_download_max_body_size(http_server, request_max_size, raised):
+    """test download response body size limit"""
+    http_server.body = b'a' * 1024
+    handler = DownloadHandler(max_body_size=100)
+    request = RequestProxy('GET', http_server.url, max_body_size=request_max_size)
+    if raised:
+        with pytest.raises(ResponseTooLargeError):
+            await handler.download(request)
+    else:
+        response = await handler.download(request)
+        assert len(response.content) == 1024
+    await handler.close()
+
+
+@pytest.mark.asyncio
+async def test_download_body_consumer(http_server):
+    """test body consumer abort reading response"""
+    http_server.body = b'a' * 1024 * 1024
+    chunks = []
+
+    def consumer(_response, chunk):
+        chunks.append(chunk)
+        return True
+
+    handler = DownloadHandler()
+    response = await handler.download(RequestProxy('GET', http_server.url, body_consumer=consumer))
+    assert response.extensions['aborted']
+    assert len(chunks) == 1
+    assert response.content == chunks[0]
+    assert len(response.content) < len(http_server.body)
+    await handler.close()
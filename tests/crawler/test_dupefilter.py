@@ -0,0 +1,92 @@
+"""Test dupefilter"""
+import pytest
+
+from crawlerstack_proxypool.aio_scrapy.dupefilter import (BloomDupeFilter,
+                                                          BloomFilter,
+                                                          NoDupeFilter,
+                                                          SetDupeFilter,
+                                                          load_dupefilter,
+                                                          request_fingerprint)
+from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
+from crawlerstack_proxypool.aio_scrapy.stats import StatsCollector
+
+
+@pytest.mark.parametrize(
+    'left, right, expect_value',
+    [
+        (RequestProxy('GET', 'https://example.com'), RequestProxy('get', 'https://example.com'), True),
+        (RequestProxy('GET', 'https://example.com'), RequestProxy('POST', 'https://example.com'), False),
+        (
+            RequestProxy('GET', 'https://example.com', proxy='http://127.0.0.1:1080'),
+            RequestProxy('GET', 'https://example.com', proxy='http://127.0.0.1:1081'),
+            False
+        ),
+        (
+            RequestProxy('POST', 'https://example.com', content='a'),
+            RequestProxy('POST', 'https://example.com', content=b'a'),
+            True
+        ),
+        (
+            RequestProxy('GET', 'https://example.com/1', proxy='http://127.0.0.1:1080', fingerprint='a'),
+            RequestProxy('GET', 'https://example.com/2', proxy='http://127.0.0.1:1080', fingerprint='a'),
+            True
+        ),
+        (
+            RequestProxy('GET', 'https://example.com', fingerprint='a'),
+            RequestProxy('GET', 'https://example.com', fingerprint='b'),
+            False
+        ),
+    ]
+)
+def test_request_fingerprint(left, right, expect_value):
+    """test request fingerprint"""
+    assert (request_fingerprint(left) == request_fingerprint(right)) == expect_value
+
+
+def test_bloom_filter():
+    """test bloom filter false positive rate"""
+    bloom = BloomFilter(10000, 0.01)
+    values = [str(i).encode() for i in range(10000)]
+    assert sum(bloom.add(value) for value in values) < 100
+    assert all(value in bloom for value in values)
+    false_positives = sum(str(i).encode() in bloom for i in range(10000, 20000))
+    assert false_positives < 200
+
+
+async def make_requests(urls):
+    """make requests"""
+    for url in urls:
+        yield RequestProxy('GET', url, proxy='http://127.0.0.1:1080', dont_filter=url.endswith('/keep'))
+
+
+@pytest.mark.parametrize(
+    'dupefilter_kls, expect_count',
+    [
+        (NoDupeFilter, 5),
+        (SetDupeFilter, 4),
+        (BloomDupeFilter, 4),
+    ]
+)
+@pytest.mark.asyncio
+async def test_filter(dupefilter_kls, expect_count):
+    """test filter duplicate requests"""
+    stats = StatsCollector()
+    dupefilter = dupefilter_kls(stats=stats)
+    urls = ['https://example.com/1', 'https://example.com/1', 'https://example.com/2', '/keep', '/keep']
+    result = [request async for request in dupefilter.filter(make_requests(urls))]
+    assert len(result) == expect_count
+    assert stats.get_value('dupefilter/filtered', 0) == 5 - expect_count
+
+
+@pytest.mark.parametrize(
+    'crawler_settings, expect_value',
+    [
+        ({}, SetDupeFilter),
+        ({'dupefilter': 'none'}, NoDupeFilter),
+        ({'dupefilter': 'bloom', 'dupefilter_capacity': 100}, BloomDupeFilter),
+    ]
+)
+def test_load_dupefilter(crawler_settings, expect_value):
+    """test load dupefilter"""
+    assert isinstance(load_dupefilter(Settings(**crawler_settings), StatsCollector()), expect_value)
@@ -8,9 +8,11 @@ import pytest
 from httpx import Response
 
 from crawlerstack_proxypool.aio_scrapy.crawler import Crawler
-from crawlerstack_proxypool.aio_scrapy.downloader import Downloader
+from crawlerstack_proxypool.aio_scrapy.downloader import (Downloader,
+                                                          DownloadHandler)
 from crawlerstack_proxypool.aio_scrapy.engine import ExecuteEngine
 from crawlerstack_proxypool.aio_scrapy.scraper import Scraper
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
 from crawlerstack_proxypool.aio_scrapy.spider import Spider
 
 
@@ -37,6 +39,7 @@ async def execute_engine(foo_spider):
 @pytest.fixture()
 async def engine_with_spider(mocker, execute_engine):
     """engine with spider fixture"""
+    execute_engine.crawler.settings.engine_mode = 'polling'
     await execute_engine.open_spider(spider=mocker.MagicMock())
     yield execute_engine
     await execute_engine.close()
@@ -93,6 +96,7 @@ async def test_next_request(mocker, execute_engine, start_urls, should_pass, cra
 
     mocker.patch.object(ExecuteEngine, 'spider_idle')
     mocker.patch.object(ExecuteEngine, 'should_pass', return_value=should_pass)
+    mocker.patch.object(ExecuteEngine, 'defer', return_value=False)
     crawl = mocker.patch.object(ExecuteEngine, 'crawl')
     execute_engine._start_requests = start_urls if start_urls is None else mock_start_requests()    # pylint: disable=protected-access
     await execute_engine.next_request()
@@ -167,6 +171,7 @@ async def test_spider_is_idle(
 @pytest.mark.asyncio
 async def test_open_spider(mocker, execute_engine):
     """test spider run"""
+    execute_engine.crawler.settings.engine_mode = 'polling'
     loop_call = mocker.patch.object(execute_engine, 'loop_call')
     open_spider = mocker.patch.object(Foo, 'open_spider')
     # 注意：这里不能使用 foo_spider 的 fixture 。因为它会先将 open_spider 绑定到事件上，
@@ -198,3 +203,110 @@ async def test_spider_run(mocker, execute_engine, foo_spider):
     await execute_engine.open_spider(foo_spider)
     await execute_engine.start()
     parse.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_open_spider_with_worker_mode(mocker, execute_engine, foo_spider):
+    """test open spider with worker mode"""
+    execute_engine.crawler.settings.concurrent_requests = 3
+    worker = mocker.patch.object(ExecuteEngine, 'worker')
+    await execute_engine.open_spider(foo_spider)
+    await asyncio.gather(*execute_engine._workers)  # pylint: disable=protected-access
+    assert worker.call_count == 3
+
+
+@pytest.mark.parametrize(
+    'concurrent_requests, url_count',
+    [
+        (1, 3),
+        (3, 10),
+        (5, 0),
+    ]
+)
+@pytest.mark.asyncio
+async def test_worker_mode_run(mocker, concurrent_requests, url_count):
+    """test crawl with worker mode"""
+    mocker.patch.object(DownloadHandler, 'download')
+    parse = mocker.patch.object(Foo, 'parse')
+    spider = Foo(name='test', start_urls=[f'https://example.com/{i}' for i in range(url_count)])
+    crawler = Crawler(Foo, Settings(engine_mode='worker', concurrent_requests=concurrent_requests))
+    await crawler.engine.open_spider(spider)
+    await asyncio.wait_for(crawler.engine.start(), 1)
+    assert parse.call_count == url_count
+
+
+@pytest.mark.asyncio
+async def test_worker_download_error(mocker):
+    """test worker continue when download error"""
+    mocker.patch.object(DownloadHandler, 'download', side_effect=Exception('download error'))
+    parse = mocker.patch.object(Foo, 'parse')
+    spider = Foo(name='test', start_urls=['https://example.com/1', 'https://example.com/2'])
+    crawler = Crawler(Foo, Settings(concurrent_requests=1))
+    await crawler.engine.open_spider(spider)
+    await asyncio.wait_for(crawler.engine.start(), 1)
+    parse.assert_not_called()
+    stats = crawler.stats
+    assert stats.get_value('downloader/exception_count') == 2
+    assert stats.get_value('downloader/exception_type_count/Exception') == 2
+    assert stats.get_value('finish_reason') == 'finished'
+
+
+@pytest.mark.asyncio
+async def test_crawl_stats(mocker):
+    """test crawl return stats"""
+    response = mocker.MagicMock(status_code=200, extensions={})
+    mocker.patch.object(DownloadHandler, 'download', return_value=response)
+    mocker.patch.object(Foo, 'parse', return_value=['a', 'b'])
+    crawler = Crawler(Foo, Settings(concurrent_requests=2))
+    stats = await asyncio.wait_for(
+        crawler.crawl(name='test', start_urls=['https://example.com/1', 'https://example.com/2']),
+        1
+    )
+    assert stats is crawler.stats
+    assert stats.get_value('downloader/request_count') == 2
+    assert stats.get_value('downloader/response_status_count/200') == 2
+    assert stats.get_value('scraper/item_scraped_count') == 4
+    assert stats.get_histogram('downloader/slot_wait').count == 2
+    assert stats.get_value('elapsed_time_seconds') >= 0
+
+
+@pytest.mark.parametrize(
+    'keep_alive, expect_connections',
+    [
+        (False, 2),
+        (True, 1),
+    ]
+)
+@pytest.mark.asyncio
+async def test_crawler_keep_alive(mocker, http_server, keep_alive, expect_connections):
+    """test crawler reuse connections across crawls"""
+    mocker.patch.object(Foo, 'parse', return_value=None)
+    crawler = Crawler(Foo, Settings(concurrent_requests=1, keep_alive=keep_alive))
+    for _ in range(2):
+        stats = await asyncio.wait_for(crawler.crawl(name='test', start_urls=[http_server.url]), 1)
+        assert stats.get_value('downloader/response_count') == 1
+    await crawler.close()
+    assert http_server.connections == expect_connections
+
+
+@pytest.mark.asyncio
+async def test_worker_mode_rate_limit(mocker):
+    """test throttled host does not slow down other hosts in worker mode"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    downloaded = {}
+
+    async def download(request):
+        downloaded[str(request.url)] = loop.time() - start
+        return mocker.MagicMock(status_code=200, extensions={})
+
+    mocker.patch.object(DownloadHandler, 'download', side_effect=download)
+    mocker.patch.object(Foo, 'parse', return_value=None)
+    urls = [f'https://slow.example/{i}' for i in range(6)] + [f'https://fast.example/{i}' for i in range(2)]
+    crawler = Crawler(Foo, Settings(concurrent_requests=4, rate_limit_hosts={'slow.example': 5}))
+    stats = await asyncio.wait_for(crawler.crawl(name='test', start_urls=urls), 3)
+    assert len(downloaded) == 8
+    # 限速的 host 按 5 次/秒下载，不占用工作协程，其他 host 不需要等待
+    assert all(downloaded[f'https://fast.example/{i}'] < 0.15 for i in range(2))
+    assert downloaded['https://slow.example/5'] == pytest.approx(1, abs=0.2)
+    assert stats.get_value('engine/deferred_count') == 5
@@ -0,0 +1,132 @@
+"""test middlewares"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from crawlerstack_proxypool.aio_scrapy.middlewares import (
+    DownloadMiddlewareManager, RateLimitMiddleware, RetryMiddleware,
+    TokenBucket)
+from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
+
+
+@pytest.mark.asyncio
+async def test_token_bucket():
+    """test token bucket"""
+    bucket = TokenBucket(rate=100, burst=2)
+    start = time.monotonic()
+    await asyncio.gather(*[bucket.acquire() for _ in range(4)])
+    elapsed = time.monotonic() - start
+    # 前两个令牌直接获取，后两个需要等待 0.02 秒
+    assert 0.015 <= elapsed < 0.5
+
+
+@pytest.mark.parametrize(
+    'crawler_settings, enabled',
+    [
+        (Settings(), False),
+        (Settings(rate_limit=1), True),
+        (Settings(rate_limit_hosts={'example.com': 1}), True),
+    ]
+)
+def test_rate_limit_middleware_from_settings(crawler_settings, enabled):
+    """test rate limit middleware enabled by settings"""
+    manager = DownloadMiddlewareManager.from_settings(crawler_settings)
+    assert bool(manager.methods['request_delay']) == enabled
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_middleware(mocker):
+    """test rate limit middleware only limit the same host"""
+    middleware = RateLimitMiddleware(rate=1, hosts={'fast.example.com': 1000})
+    spider = mocker.MagicMock()
+    assert middleware.request_delay(RequestProxy('GET', 'https://example.com/1'), spider) == 0
+    for i in range(3):
+        assert middleware.request_delay(RequestProxy('GET', f'https://other{i}.example.com/'), spider) == 0
+    assert middleware.request_delay(RequestProxy('GET', 'https://fast.example.com/'), spider) == 0
+
+    # example.com 已经没有令牌，预约之后的令牌
+    assert middleware.request_delay(RequestProxy('GET', 'https://example.com/2'), spider) == pytest.approx(1, abs=0.1)
+    assert middleware.request_delay(RequestProxy('GET', 'https://example.com/3'), spider) == pytest.approx(2, abs=0.1)
+
+    # 首次请求已经预约了令牌，下载时不再等待，重试的请求需要等待
+    start = time.monotonic()
+    await middleware.process_request(RequestProxy('GET', 'https://example.com/1'), spider)
+    assert time.monotonic() - start < 0.5
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(
+            middleware.process_request(RequestProxy('GET', 'https://example.com/4', retry_times=1), spider),
+            0.1
+        )
+
+
+@pytest.mark.asyncio
+async def test_download_middleware_manager_keep_response(mocker):
+    """test middleware without process_response keep response"""
+    manager = DownloadMiddlewareManager.from_settings(Settings(rate_limit=100))
+    response = mocker.MagicMock()
+    download_func = mocker.AsyncMock(return_value=response)
+    result = await manager.download(download_func, RequestProxy('GET', 'https://example.com'), mocker.MagicMock())
+    assert result is response
+
+
+@pytest.mark.asyncio
+async def test_retry_middleware(mocker):
+    """test retry middleware retry transport error"""
+    manager = DownloadMiddlewareManager.from_settings(Settings(retry_times=2, retry_backoff_base=0))
+    response = mocker.MagicMock()
+    download_func = mocker.AsyncMock(side_effect=[httpx.ConnectError('error'), httpx.ReadTimeout('error'), response])
+    result = await manager.download(download_func, RequestProxy('GET', 'https://example.com'), mocker.MagicMock())
+    assert result is response
+    assert download_func.call_args.kwargs['request'].retry_times == 2
+
+
+@pytest.mark.parametrize(
+    'exception, retry_times',
+    [
+        (httpx.ConnectError('error'), 1),
+        (ValueError('error'), 0),
+    ]
+)
+@pytest.mark.asyncio
+async def test_retry_middleware_give_up(mocker, exception, retry_times):
+    """test retry middleware give up"""
+    manager = DownloadMiddlewareManager.from_settings(Settings(retry_times=1, retry_backoff_base=0))
+    download_func = mocker.AsyncMock(side_effect=exception)
+    with pytest.raises(exception.__class__):
+        await manager.download(download_func, RequestProxy('GET', 'https://example.com'), mocker.MagicMock())
+    assert download_func.call_count == retry_times + 1
+
+
+@pytest.mark.asyncio
+async def test_retry_middleware_budget(mocker):
+    """test retry budget"""
+    middleware = RetryMiddleware(max_retry_times=3, backoff_base=0, budget_ratio=0.5, budget_min=1)
+    spider = mocker.MagicMock()
+    exception = httpx.ConnectError('error')
+    for i in range(2):
+        await middleware.process_request(RequestProxy('GET', f'https://example.com/{i}'), spider)
+    # 预算为 2 * 0.5 + 1 = 2
+    results = [
+        await middleware.process_exception(exception, RequestProxy('GET', f'https://example.com/{i}'), spider)
+        for i in range(3)
+    ]
+    assert [isinstance(i, RequestProxy) for i in results] == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_retry_middleware_budget_reset(mocker):
+    """test retry budget reset when spider opened"""
+    middleware = RetryMiddleware(max_retry_times=3, backoff_base=0, budget_ratio=0, budget_min=1)
+    manager = DownloadMiddlewareManager([middleware])
+    spider = mocker.MagicMock()
+    request = RequestProxy('GET', 'https://example.com')
+    await middleware.process_request(request, spider)
+    assert isinstance(await middleware.process_exception(httpx.ConnectError('error'), request, spider), RequestProxy)
+    assert not middleware.has_budget()
+
+    manager.open_spider(spider)
+    assert middleware.requests == 0
+    assert middleware.has_budget()
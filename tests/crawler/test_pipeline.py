@@ -0,0 +1,82 @@
+"""Test item pipeline"""
+import asyncio
+
+import pytest
+
+from crawlerstack_proxypool.aio_scrapy.pipeline import ItemPipeline
+
+
+@pytest.mark.parametrize(
+    'batch_size, item_count, expect_value',
+    [
+        (2, 0, []),
+        (2, 5, [2, 2, 1]),
+        (10, 5, [5]),
+    ]
+)
+@pytest.mark.asyncio
+async def test_pipeline_batch_size(mocker, batch_size, item_count, expect_value):
+    """test pipeline flush by batch size and on close"""
+    handler = mocker.AsyncMock()
+    pipeline = ItemPipeline(handler, batch_size=batch_size, flush_interval=10)
+    pipeline.open()
+    for i in range(item_count):
+        await pipeline.process_item(i)
+    await pipeline.close()
+    assert [len(call.args[0]) for call in handler.call_args_list] == expect_value
+    assert pipeline.stats.get_value('pipeline/item_count', 0) == item_count
+
+
+@pytest.mark.asyncio
+async def test_pipeline_flush_interval(mocker):
+    """test pipeline flush by interval"""
+    handler = mocker.AsyncMock()
+    pipeline = ItemPipeline(handler, batch_size=100, flush_interval=0.01)
+    pipeline.open()
+    await pipeline.process_item(1)
+    await asyncio.sleep(0.05)
+    handler.assert_called_once_with([1])
+    await pipeline.close()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_backpressure(mocker):
+    """test process item wait when queue is full"""
+    pipeline = ItemPipeline(mocker.AsyncMock(), queue_size=1)
+    await pipeline.process_item(1)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(pipeline.process_item(2), 0.01)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_handler_error(mocker):
+    """test pipeline continue when handler raise error"""
+    handler = mocker.AsyncMock(side_effect=[Exception('save error'), None])
+    pipeline = ItemPipeline(handler, batch_size=1)
+    pipeline.open()
+    await pipeline.process_item(1)
+    await pipeline.process_item(2)
+    await pipeline.close()
+    assert handler.call_count == 2
+    assert pipeline.stats.get_value('pipeline/exception_count') == 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline_item_error(mocker):
+    """test one failed item does not drop the rest of the batch"""
+    saved = []
+
+    async def handler(batch):
+        if 2 in batch:
+            raise Exception('proxy deleted')
+        saved.extend(batch)
+
+    pipeline = ItemPipeline(mocker.AsyncMock(side_effect=handler), batch_size=4, flush_interval=10)
+    pipeline.open()
+    for i in range(4):
+        await pipeline.process_item(i)
+    await pipeline.close()
+    assert saved == [0, 1, 3]
+    assert pipeline.stats.get_value('pipeline/batch_retry_count') == 1
+    assert pipeline.stats.get_value('pipeline/exception_count') == 1
+    assert pipeline.stats.get_value('pipeline/item_count') == 3
@@ -0,0 +1,50 @@
+"""Test scheduler"""
+import pytest
+
+from crawlerstack_proxypool.aio_scrapy.req_resp import RequestProxy
+from crawlerstack_proxypool.aio_scrapy.scheduler import (FifoScheduler,
+                                                         PriorityScheduler,
+                                                         load_scheduler)
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
+
+
+async def make_requests(priorities):
+    """make requests with priorities"""
+    for index, priority in enumerate(priorities):
+        yield RequestProxy('GET', f'https://example.com/{index}', priority=priority)
+
+
+@pytest.mark.parametrize(
+    'scheduler, priorities, expect_value',
+    [
+        (FifoScheduler(), [1, 3, 2], [0, 1, 2]),
+        (PriorityScheduler(), [], []),
+        (PriorityScheduler(), [1, 3, 2], [1, 2, 0]),
+        (PriorityScheduler(), [1, 1, 2, 1], [2, 0, 1, 3]),
+        (PriorityScheduler(lookahead=2), [1, 3, 2, 5, 4], [1, 2, 3, 4, 0]),
+    ]
+)
+@pytest.mark.asyncio
+async def test_schedule(scheduler, priorities, expect_value):
+    """test schedule order"""
+    result = [str(request.url) async for request in scheduler.schedule(make_requests(priorities))]
+    assert result == [f'https://example.com/{i}' for i in expect_value]
+
+
+@pytest.mark.parametrize(
+    'crawler_settings, expect_value',
+    [
+        ({}, FifoScheduler),
+        ({'scheduler': 'priority'}, PriorityScheduler),
+        ({'scheduler': PriorityScheduler}, PriorityScheduler),
+    ]
+)
+def test_load_scheduler(crawler_settings, expect_value):
+    """test load scheduler"""
+    assert isinstance(load_scheduler(Settings(**crawler_settings)), expect_value)
+
+
+def test_invalid_scheduler():
+    """test invalid scheduler"""
+    with pytest.raises(ValueError):
+        Settings(scheduler='foo')
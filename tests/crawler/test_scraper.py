@@ -1,7 +1,10 @@
 """test scraper"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import pytest
 
 from crawlerstack_proxypool.aio_scrapy.scraper import Scraper
+from crawlerstack_proxypool.aio_scrapy.settings import Settings
 
 
 @pytest.fixture()
@@ -18,3 +21,58 @@ async def test_scrape(mocker, scraper):
     await scrap_task
     assert scraper.queue.empty()
     spider.parse.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    'executor, expect_value',
+    [
+        ('inline', type(None)),
+        ('thread', ThreadPoolExecutor),
+        ('process', ProcessPoolExecutor),
+    ]
+)
+@pytest.mark.asyncio
+async def test_scraper_executor(mocker, executor, expect_value):
+    """test scraper executor bind to spider"""
+    scraper = Scraper(Settings(scraper_executor=executor, scraper_executor_workers=1))
+    spider = mocker.MagicMock()
+    scraper.open_spider(spider)
+    assert isinstance(spider.executor, expect_value)
+    await scraper.close()
+    assert scraper.executor is None
+
+
+@pytest.mark.parametrize(
+    'result, expect_value',
+    [
+        (None, []),
+        ([], []),
+        ('a', ['a']),
+        (['a', 'b'], ['a', 'b']),
+    ]
+)
+@pytest.mark.asyncio
+async def test_scrape_process_items(mocker, result, expect_value):
+    """test scraper send parse result to spider.process_items"""
+    scraper = Scraper()
+    spider = mocker.AsyncMock()
+    spider.parse.return_value = result
+    scraper.open_spider(spider)
+    await (await scraper.enqueue(mocker.MagicMock(), spider))
+    await scraper.close()
+    items = [item for call in spider.process_items.call_args_list for item in call.args[0]]
+    assert items == expect_value
+
+
+@pytest.mark.asyncio
+async def test_scrape_send_items(mocker):
+    """test items sent by spider are batched with parse results"""
+    scraper = Scraper()
+    spider = mocker.AsyncMock()
+    spider.parse.return_value = 'a'
+    scraper.open_spider(spider)
+    await spider.item_processor(['b'])
+    await (await scraper.enqueue(mocker.MagicMock(), spider))
+    await scraper.close()
+    items = [item for call in spider.process_items.call_args_list for item in call.args[0]]
+    assert items == ['b', 'a']
@@ -0,0 +1,44 @@
+"""Test stats"""
+import pytest
+
+from crawlerstack_proxypool.aio_scrapy.stats import Histogram, StatsCollector
+
+
+@pytest.mark.parametrize(
+    'samples, percentile, expect_value',
+    [
+        ([], 50, None),
+        ([0.001], 50, 0.001),
+        ([0.02, 0.03, 0.2, 0.3], 50, 0.05),
+        ([0.02, 0.03, 0.2, 0.3], 100, 0.3),
+        ([1, 100], 99, 100),
+    ]
+)
+def test_histogram_percentile(samples, percentile, expect_value):
+    """test histogram percentile"""
+    histogram = Histogram()
+    for sample in samples:
+        histogram.observe(sample)
+    assert histogram.percentile(percentile) == expect_value
+    assert histogram.count == len(samples)
+
+
+def test_stats_collector():
+    """test stats collector"""
+    stats = StatsCollector()
+    stats.open_spider('foo')
+    stats.inc_value('downloader/request_count')
+    stats.inc_value('downloader/request_count', 2)
+    stats.observe('downloader/latency', 0.1)
+    stats.observe('downloader/latency', 0.3)
+    stats.close_spider()
+
+    result = stats.get_stats()
+    assert result['spider_name'] == 'foo'
+    assert result['downloader/request_count'] == 3
+    assert result['downloader/latency']['count'] == 2
+    assert result['downloader/latency']['mean'] == pytest.approx(0.2)
+    assert result['finish_reason'] == 'finished'
+
+    stats.clear()
+    assert not stats.get_stats()
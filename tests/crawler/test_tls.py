@@ -0,0 +1,21 @@
+"""test tls"""
+import pytest
+
+from crawlerstack_proxypool.aio_scrapy.downloader import DownloadHandler
+from crawlerstack_proxypool.aio_scrapy.tls import get_ssl_context
+
+
+def test_get_ssl_context():
+    """test get ssl context"""
+    assert get_ssl_context() is get_ssl_context(True)
+    assert get_ssl_context(False) is not get_ssl_context(True)
+
+
+@pytest.mark.asyncio
+async def test_download_handler_shared_ssl_context():
+    """test download handler use shared ssl context"""
+    handler = DownloadHandler()
+    async with handler.client(None) as client:
+        transport = client._transport  # pylint: disable=protected-access
+        assert transport._pool._ssl_context is get_ssl_context()  # pylint: disable=protected-access
+    await handler.close()
@@ -1,6 +1,7 @@
 """test repository"""
 import pytest
 
+from crawlerstack_proxypool.common.anonymity import AnonymityLevel
 from crawlerstack_proxypool.repositories import SceneProxyRepository
 
 
@@ -44,3 +45,55 @@ async def test_get(scene_proxy_repo, init_scene_proxy, name, limit, offset, expe
 
     res = await scene_proxy_repo.get_with_ip(**kwargs)
     assert len(res) == expect_value
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'order_by, max_latency, expect_value',
+    [
+        ('alive', None, [('127.0.0.1', 500.0), ('127.0.0.3', 50.0)]),
+        ('latency', None, [('127.0.0.3', 50.0), ('127.0.0.1', 500.0)]),
+        ('latency', 100, [('127.0.0.3', 50.0)]),
+        ('alive', 1000, [('127.0.0.1', 500.0), ('127.0.0.3', 50.0)]),
+    ]
+)
+async def test_get_with_ip_latency(scene_proxy_repo, init_scene_proxy, order_by, max_latency, expect_value):
+    """test order and filter by latency"""
+    objs = await scene_proxy_repo.get(name='alibaba')
+    for obj, latency in zip(sorted(objs, key=lambda x: x.proxy_id), [500, 50]):
+        await scene_proxy_repo.update(obj.id, latency_ewma=latency)
+
+    res = await scene_proxy_repo.get_with_ip(name='alibaba', order_by=order_by, max_latency=max_latency)
+    assert [(i.ip, i.latency) for i in res] == expect_value
+
+
+@pytest.mark.asyncio
+async def test_get_with_ip_latency_nulls_last(scene_proxy_repo, init_scene_proxy):
+    """test proxies without latency are ordered last"""
+    objs = await scene_proxy_repo.get(name='alibaba')
+    obj = max(objs, key=lambda x: x.proxy_id)
+    await scene_proxy_repo.update(obj.id, latency_ewma=900)
+    res = await scene_proxy_repo.get_with_ip(name='alibaba', order_by='latency')
+    assert [i.latency for i in res] == [900, None]
+    with pytest.raises(ValueError):
+        await scene_proxy_repo.get_with_ip(name='alibaba', order_by='foo')
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'min_anonymity, expect_value',
+    [
+        (None, ['elite', 'anonymous']),
+        (AnonymityLevel.TRANSPARENT, ['elite', 'anonymous']),
+        (AnonymityLevel.ANONYMOUS, ['elite', 'anonymous']),
+        (AnonymityLevel.ELITE, ['elite']),
+    ]
+)
+async def test_get_with_ip_anonymity(scene_proxy_repo, init_scene_proxy, min_anonymity, expect_value):
+    """test filter by minimum anonymity level"""
+    objs = await scene_proxy_repo.get(name='alibaba')
+    for obj, anonymity in zip(sorted(objs, key=lambda x: x.proxy_id), [3, 2]):
+        await scene_proxy_repo.update(obj.id, anonymity=anonymity)
+
+    res = await scene_proxy_repo.get_with_ip(name='alibaba', min_anonymity=min_anonymity)
+    assert [i.anonymity for i in res] == expect_value
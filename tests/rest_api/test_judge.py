@@ -0,0 +1,55 @@
+"""test judge"""
+import httpx
+import pytest
+
+from crawlerstack_proxypool.aio_scrapy.spider import Spider
+from crawlerstack_proxypool.common.anonymity import AnonymityLevel
+from crawlerstack_proxypool.common.checker import AnonymousChecker
+from crawlerstack_proxypool.common.public_ip import (PublicIPService,
+                                                     get_public_ip_service)
+
+
+class Foo(Spider):
+    """foo spider"""
+
+    async def parse(self, response: httpx.Response):
+        pass
+
+
+@pytest.mark.parametrize('path', ['/judge', '/judge/'])
+def test_judge(rest_api_client, api_url_factory, path):
+    """test judge echoes client ip and proxy headers"""
+    response = rest_api_client.get(
+        api_url_factory(path),
+        headers={'Via': '1.1 squid', 'X-Forwarded-For': '1.2.3.4', 'User-Agent': 'foo'},
+        allow_redirects=False,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data['origin'] == 'testclient'
+    assert data['headers'] == {'via': '1.1 squid', 'x-forwarded-for': '1.2.3.4'}
+
+
+@pytest.mark.parametrize(
+    'headers, expect_value, expect_anonymity',
+    [
+        ({}, True, AnonymityLevel.ELITE),
+        ({'Via': '1.1 squid'}, True, AnonymityLevel.ANONYMOUS),
+        ({'X-Forwarded-For': '1.2.3.4'}, False, AnonymityLevel.TRANSPARENT),
+    ]
+)
+@pytest.mark.asyncio
+async def test_anonymous_checker_with_judge(
+        mocker, rest_api_client, api_url_factory, headers, expect_value, expect_anonymity
+):
+    """test anonymous checker against the judge endpoint"""
+    mocker.patch.object(PublicIPService, 'fetch', return_value='1.2.3.4')
+    judge_response = rest_api_client.get(api_url_factory('/judge'), headers=headers)
+    assert judge_response.json()['origin'] == 'testclient'
+
+    checker = AnonymousChecker.from_kwargs(Foo(name='foo', start_urls=[]), public_ip_urls=['http://judge/ip'])
+    request = httpx.Request('GET', 'http://judge/ip', extensions={'proxy': httpx.URL('http://127.0.0.2:1080')})
+    checked = await checker.check(httpx.Response(200, content=judge_response.content, request=request))
+    assert checked.alive is expect_value
+    assert checked.anonymity == expect_anonymity
+    get_public_ip_service.cache_clear()
@@ -41,3 +41,19 @@ async def test_put(rest_api_client, api_url_factory, init_scene_proxy, session):
     )
     scene_obj = await session.scalar(stmt)
     assert scene_obj.alive_count == 9
+
+
+@pytest.mark.parametrize(
+    'params, status_code',
+    [
+        ({'name': 'alibaba', 'order_by': 'latency', 'limit': 2}, 200),
+        ({'name': 'alibaba', 'max_latency': 100}, 200),
+        ({'name': 'alibaba', 'order_by': 'foo'}, 422),
+        ({'name': 'alibaba', 'min_anonymity': 'elite'}, 200),
+        ({'name': 'alibaba', 'min_anonymity': 'foo'}, 422),
+    ]
+)
+def test_get_order_by_latency(rest_api_client, api_url_factory, init_scene_proxy, params, status_code):
+    """test scene get with latency params"""
+    response = rest_api_client.get(api_url_factory('/scenes'), params=params)
+    assert response.status_code == status_code
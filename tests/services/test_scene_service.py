@@ -3,6 +3,7 @@
 import pytest
 from httpx import URL
 
+from crawlerstack_proxypool.common.anonymity import AnonymityLevel
 from crawlerstack_proxypool.common.checker import CheckedProxy
 from crawlerstack_proxypool.models import SceneProxyModel
 from crawlerstack_proxypool.service import IpProxyService, SceneProxyService
@@ -92,3 +93,46 @@ async def test_decrease(session, scene_service, ip_proxy_service, init_scene_pro
         assert expect_value == scene_objs[0].alive_count
     else:
         assert len(objs) == expect_value
+
+
+@pytest.mark.asyncio
+async def test_update_proxy_latency(scene_service, init_scene_proxy):
+    """test latency ewma and p95 are updated only when the proxy is alive"""
+    await scene_service.update_proxy_status(1, 1, 0.1)
+    obj = await scene_service.update_proxy_status(1, 1, 0.2)
+    assert obj.latency_ewma == 130
+    assert obj.latency_p95 == 200
+    assert obj.latency_samples == '100,200'
+
+    obj = await scene_service.update_proxy_status(1, -1, 5)
+    assert obj.latency_ewma == 130
+    assert obj.latency_samples == '100,200'
+
+
+def test_compute_latency_window():
+    """test only the last samples are kept for p95"""
+    service = SceneProxyService(None)
+    obj = SceneProxyModel(latency_samples=','.join(['100'] * 18 + ['5000'] * 2), latency_ewma=100)
+    latency = service.compute_latency(obj, 0.1)
+    assert len(latency['latency_samples'].split(',')) == service.LATENCY_SAMPLE_SIZE
+    # 20 个样本中有 2 个超过 p95
+    assert latency['latency_p95'] == 5000
+    # 最早的一个样本被移出窗口，只剩 1 个超过 p95
+    obj.latency_samples = ','.join(['5000'] + ['100'] * 18 + ['5000'])
+    assert service.compute_latency(obj, 0.1)['latency_p95'] == 100
+
+
+@pytest.mark.asyncio
+async def test_save_scene_proxy_anonymity(scene_service, init_scene_proxy):
+    """test anonymity level is stored, transparent proxies are stored until they are deleted"""
+    url = URL('http://127.0.0.1:1081')
+    await scene_service.save_scene_proxy(CheckedProxy(url=url, alive=True, anonymity=AnonymityLevel.ELITE), 'http')
+    # 请求异常时没有匿名等级，保留之前的值
+    await scene_service.save_scene_proxy(CheckedProxy(url=url, alive=False), 'http')
+    objs = await scene_service.get(name='http')
+    assert objs[0].anonymity == AnonymityLevel.ELITE
+    await scene_service.save_scene_proxy(
+        CheckedProxy(url=url, alive=False, anonymity=AnonymityLevel.TRANSPARENT), 'http'
+    )
+    objs = await scene_service.get(name='http')
+    assert objs[0].anonymity == AnonymityLevel.TRANSPARENT
@@ -80,3 +80,32 @@ async def test_get_from_message(validate_spider_service, message_factory, mocker
             assert len(data) == expect_value
         else:
             assert expect_value in caplog.text
+
+
+@pytest.mark.parametrize(
+    'sources, expect_value',
+    [
+        (['foo'], {}),
+        (['https'], {'http://127.0.0.1:1081': 10}),
+    ]
+)
+@pytest.mark.asyncio
+async def test_get_priorities(validate_spider_service, init_scene_proxy, sources, expect_value):
+    """test get priorities"""
+    result = await validate_spider_service.get_priorities(sources)
+    assert result.keys() == expect_value.keys()
+    for key, value in expect_value.items():
+        assert result[key] == pytest.approx(value, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_get_seeds(mocker, validate_spider_service, init_scene_proxy):
+    """test get seeds and priorities from the same query"""
+    get_by_names = mocker.spy(validate_spider_service.scene_proxy_repo, 'get_by_names')
+    seeds, priorities = await validate_spider_service.get_seeds('https', ['https'])
+    assert [str(seed) for seed in seeds] == list(priorities)
+    get_by_names.assert_called_once()
+
+    seeds, priorities = await validate_spider_service.get_seeds('https')
+    assert isinstance(seeds, AsyncIterable)
+    assert priorities == {}
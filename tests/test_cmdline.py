@@ -1,7 +1,7 @@
 """test cmdline"""
 import pytest
 
-from crawlerstack_proxypool import __version__
+from crawlerstack_proxypool import __version__, cmdline
 from crawlerstack_proxypool.main import main
 
 
@@ -18,3 +18,18 @@ def test_cmdline(cli_runner, args, exit_code, contained_value):
     result = cli_runner.invoke(main, args=args)
     assert result.exit_code == exit_code
     assert contained_value in result.stdout
+
+
+@pytest.mark.parametrize(
+    'args, exit_code, contained_value',
+    [
+        (['worker', '--help'], 0, '--processes'),
+        (['worker', '--processes', '0'], 2, 'Invalid value'),
+        (['worker', '--processes', '2'], 2, 'sqlite does not support multiple processes'),
+    ]
+)
+def test_worker_cmdline(cli_runner, args, exit_code, contained_value):
+    """test worker cmdline"""
+    result = cli_runner.invoke(cmdline.main, args=args)
+    assert result.exit_code == exit_code
+    assert contained_value in result.output
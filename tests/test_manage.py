@@ -0,0 +1,14 @@
+"""test manage"""
+from crawlerstack_proxypool.manage import WorkerProcesses
+
+
+def test_worker_processes_check(mocker, caplog):
+    """test dead worker processes are logged with exit code and removed"""
+    workers = WorkerProcesses(processes=2)
+    alive = mocker.MagicMock(is_alive=mocker.MagicMock(return_value=True))
+    dead = mocker.MagicMock(is_alive=mocker.MagicMock(return_value=False), exitcode=-9)
+    dead.name = 'proxypool-worker-1'
+    workers.children.extend([alive, dead])
+    assert workers.check() == [dead]
+    assert workers.children == [alive]
+    assert 'proxypool-worker-1 exited unexpectedly with code -9' in caplog.text
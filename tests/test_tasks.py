@@ -1,12 +1,21 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from httpx import URL, Response
 
+from crawlerstack_proxypool.aio_scrapy.crawler import Crawler
 from crawlerstack_proxypool.aio_scrapy.downloader import DownloadHandler
 from crawlerstack_proxypool.common import BaseExtractor
 from crawlerstack_proxypool.common.checker import CheckedProxy
+from crawlerstack_proxypool.message import Message
 from crawlerstack_proxypool.service import (FetchSpiderService,
                                             ValidateSpiderService)
-from crawlerstack_proxypool.task import FetchSpiderTask, ValidateSpiderTask
+from crawlerstack_proxypool.spiders import Spider
+from crawlerstack_proxypool.task import (FetchSpiderTask, TaskManager,
+                                         ValidateSpiderTask,
+                                         load_prefilter_config,
+                                         merge_crawler_settings)
 
 
 class MockExtractor(BaseExtractor):
@@ -49,7 +58,7 @@ async def test_validate_spider_task(mocker):
     mocker.patch.object(MockExtractor, 'parse', return_value=checked_data)
     download_mocker = mocker.patch.object(DownloadHandler, 'download')
     save_mocker = mocker.patch.object(ValidateSpiderService, 'save')
-    mocker.patch.object(ValidateSpiderService, 'start_urls', return_value=exist_proxies)
+    mocker.patch.object(ValidateSpiderService, 'get_seeds', return_value=(exist_proxies, {}))
 
     task = ValidateSpiderTask(
         name=name,
@@ -62,3 +71,174 @@ async def test_validate_spider_task(mocker):
 
     save_mocker.assert_called_once_with(checked_data, dest)
     download_mocker.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    'global_config, task_config, expect_value',
+    [
+        (None, {}, {}),
+        ({'concurrent_requests': 16}, {}, {'concurrent_requests': 16}),
+        (
+                {'concurrent_requests': 16, 'concurrent_requests_per_host': 2},
+                {'crawler': {'CONCURRENT_REQUESTS': 300}},
+                {'concurrent_requests': 300, 'concurrent_requests_per_host': 2}
+        ),
+    ]
+)
+def test_merge_crawler_settings(settings, global_config, task_config, expect_value):
+    """test merge crawler settings"""
+    origin_config = settings.get('crawler')
+    settings.set('crawler', global_config)
+    try:
+        assert merge_crawler_settings(task_config) == expect_value
+    finally:
+        settings.set('crawler', origin_config)
+
+
+@pytest.mark.parametrize(
+    'config, expect_value',
+    [
+        ({}, None),
+        ({'prefilter': False}, None),
+        ({'prefilter': True}, {}),
+        ({'prefilter': {'TIMEOUT': 2}}, {'timeout': 2}),
+    ]
+)
+def test_load_prefilter_config(config, expect_value):
+    """test load prefilter config"""
+    assert load_prefilter_config(config) == expect_value
+
+
+@pytest.mark.parametrize(
+    'keep_alive, expect_count',
+    [
+        (False, 2),
+        (True, 1),
+    ]
+)
+@pytest.mark.asyncio
+async def test_task_reuse_crawler(mocker, keep_alive, expect_count):
+    """test task reuse crawler when keep_alive"""
+    mocker.patch.object(DownloadHandler, 'download')
+    mocker.patch.object(FetchSpiderService, 'save')
+    close = mocker.patch.object(DownloadHandler, 'close')
+    task = FetchSpiderTask(
+        'foo',
+        urls=['https://example.com'],
+        dest=['http'],
+        parser_kls=MockExtractor,
+        crawler_settings={'keep_alive': keep_alive},
+    )
+    for _ in range(2):
+        await task.start()
+    assert close.call_count == (0 if keep_alive else 2)
+    await task.close()
+    assert close.call_count == expect_count
+
+
+@pytest.mark.asyncio
+async def test_task_share_executor():
+    """test task share scraper executor between runs without keep_alive"""
+    task = FetchSpiderTask(
+        'foo',
+        urls=['https://example.com'],
+        dest=['http'],
+        parser_kls=MockExtractor,
+        crawler_settings={'scraper_executor': 'thread', 'scraper_executor_workers': 1},
+    )
+    crawlers = [task.get_crawler(Spider, task.crawler_settings) for _ in range(2)]
+    assert crawlers[0] is not crawlers[1]
+    executor = crawlers[0].executor
+    assert isinstance(executor, ThreadPoolExecutor)
+    assert crawlers[1].executor is executor
+
+    # crawler 关闭时不关闭共用的执行器
+    await crawlers[0].close()
+    assert executor.submit(int).result() == 0
+    await task.close()
+    with pytest.raises(RuntimeError):
+        executor.submit(int)
+
+
+@pytest.mark.parametrize(
+    'shard_index, shard_count, expect_value',
+    [
+        (0, 1, ['a', 'b', 'c']),
+        (0, 2, ['a', 'c']),
+        (1, 2, ['b']),
+    ]
+)
+def test_load_fetch_task_shard(shard_index, shard_count, expect_value):
+    """test fetch tasks are assigned to shards"""
+    manager = TaskManager(shard_index=shard_index, shard_count=shard_count)
+    manager.load_fetch_task([
+        {
+            'name': name,
+            'urls': ['https://example.com'],
+            'extractor': {'name': 'html'},
+            'dest': ['http'],
+            'schedule': {'trigger': 'interval', 'seconds': 60},
+        }
+        for name in ['a', 'b', 'c']
+    ])
+    assert [name for name, _ in manager.fetch_jobs] == expect_value
+
+
+@pytest.mark.asyncio
+async def test_validate_spider_task_shard(mocker):
+    """test validate spider task only checks seeds in its shard"""
+    exist_proxies = [URL(f'http://127.0.0.1:{port}') for port in range(1080, 1100)]
+    mocker.patch.object(ValidateSpiderService, 'get_seeds', return_value=(exist_proxies, {}))
+    crawl = mocker.patch.object(Crawler, 'crawl')
+
+    seeds = []
+    for index in range(3):
+        task = ValidateSpiderTask(
+            name='foo',
+            dest='bar',
+            check_urls=['https://example.com'],
+            parser_kls=MockExtractor,
+            sources=['http'],
+            shard_index=index,
+            shard_count=3,
+        )
+        await task.start()
+        seeds.append(crawl.call_args.kwargs['start_urls'])
+    assert sorted(str(seed) for shard in seeds for seed in shard) == sorted(map(str, exist_proxies))
+    assert all(len(shard) < len(exist_proxies) for shard in seeds)
+
+
+@pytest.mark.parametrize(
+    'message, fetch_called, validate_sources',
+    [
+        ('{"event": "fetch"}', True, None),
+        ('{"event": "validate", "sources": ["http"]}', False, ['http']),
+        ('{"event": "foo"}', False, None),
+    ]
+)
+def test_dispatch_trigger(mocker, message, fetch_called, validate_sources):
+    """test broadcast trigger message triggers jobs in current process"""
+    manager = TaskManager(shard_index=0, shard_count=2)
+    trigger_fetch_job = mocker.patch.object(manager, 'trigger_fetch_job')
+    trigger_validate_job = mocker.patch.object(manager, 'trigger_validate_job')
+    manager.dispatch_trigger(message)
+    assert trigger_fetch_job.called == fetch_called
+    if validate_sources:
+        trigger_validate_job.assert_called_once_with(sources=validate_sources)
+    else:
+        trigger_validate_job.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_trigger_broadcast(mocker):
+    """test multi-process task manager broadcast trigger events via message"""
+    publish = mocker.patch.object(Message, 'publish')
+    manager = TaskManager(shard_index=0, shard_count=2)
+    trigger_fetch_job = mocker.patch.object(manager, 'trigger_fetch_job')
+    await manager.publish_fetch_trigger()
+    await manager.publish_validate_trigger(sources=['http'])
+    assert [json.loads(call.args[1]) for call in publish.call_args_list] == [
+        {'event': 'fetch'},
+        {'event': 'validate', 'sources': ['http']},
+    ]
+    trigger_fetch_job.assert_not_called()
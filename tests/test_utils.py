@@ -0,0 +1,45 @@
+"""test utils"""
+import asyncio
+import sys
+
+import pytest
+
+from crawlerstack_proxypool.utils import in_shard, setup_event_loop
+
+
+@pytest.fixture()
+def restore_loop_policy():
+    """restore event loop policy"""
+    yield
+    asyncio.set_event_loop_policy(None)
+
+
+@pytest.mark.parametrize(
+    'loop, installed, expect_value',
+    [
+        ('asyncio', True, 'asyncio'),
+        ('auto', False, 'asyncio'),
+        ('uvloop', False, 'asyncio'),
+        ('auto', True, 'uvloop'),
+        ('uvloop', True, 'uvloop'),
+    ]
+)
+def test_setup_event_loop(mocker, restore_loop_policy, loop, installed, expect_value):  # pylint: disable=unused-argument
+    """test setup event loop with fallback"""
+    uvloop = mocker.MagicMock(EventLoopPolicy=asyncio.DefaultEventLoopPolicy) if installed else None
+    mocker.patch.dict(sys.modules, {'uvloop': uvloop})
+    assert setup_event_loop(loop) == expect_value
+
+
+def test_setup_invalid_event_loop():
+    """test invalid event loop"""
+    with pytest.raises(ValueError):
+        setup_event_loop('foo')
+
+
+@pytest.mark.parametrize('count', [1, 2, 5])
+def test_in_shard(count):
+    """test each key belongs to exactly one shard"""
+    for port in range(1000, 1100):
+        key = f'http://127.0.0.1:{port}'
+        assert sum(in_shard(key, index, count) for index in range(count)) == 1